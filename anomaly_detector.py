@@ -0,0 +1,159 @@
+import polars as pl
+from datetime import date
+from typing import Dict, List, Optional
+
+from rollup_store import RollupStore, with_rates
+
+# Sàn của độ lệch chuẩn khi tính z-score: lịch sử phẳng (std = 0) vẫn phát hiện được thay đổi đột ngột.
+# Sàn tương đối theo baseline và sàn tuyệt đối theo đơn vị của metric (số giao dịch, VND, điểm %)
+MIN_RELATIVE_STD = 0.01
+MIN_ABSOLUTE_STD = {
+    'transaction_count': 1.0,
+    'total_amount': 1.0,
+    'match_rate': 0.5,
+    'discrepancy_rate': 0.5
+}
+
+class AnomalyDetector:
+    """
+    Phát hiện bất thường thống kê trên rollup theo ngày (RollupStore):
+    so sánh giá trị mỗi ngày của từng (dimension, key) với baseline của các ngày trước đó
+    bằng z-score trên cửa sổ trượt hoặc EWMA. Chỉ đọc các bảng tổng hợp nhỏ, không đọc lại CSV.
+    """
+
+    def __init__(self, store: RollupStore):
+        self.store = store
+        self.metrics = ['transaction_count', 'total_amount', 'match_rate', 'discrepancy_rate']
+        self.metric_labels = {
+            'transaction_count': 'Số giao dịch',
+            'total_amount': 'Tổng tiền',
+            'match_rate': 'Tỷ lệ khớp',
+            'discrepancy_rate': 'Tỷ lệ sai lệch'
+        }
+        self.dimension_labels = {
+            'total': 'Toàn bộ',
+            'merchant': 'Merchant',
+            'service_type': 'Service type',
+            'reconcile_status': 'Reconcile status',
+            'insurance_status': 'Insurance status'
+        }
+
+    def _baseline_exprs(self, metric: str, method: str, window: int, span: int, min_history: int) -> List[pl.Expr]:
+        """Biểu thức baseline/std của metric, tính theo từng nhóm (dimension, key)"""
+        previous = pl.col(metric).cast(pl.Float64).shift(1)
+        if method == 'ewma':
+            baseline = previous.ewm_mean(span=span, min_periods=min_history)
+            spread = previous.ewm_std(span=span, min_periods=min_history)
+        elif method == 'zscore':
+            baseline = previous.rolling_mean(window_size=window, min_periods=min_history)
+            spread = previous.rolling_std(window_size=window, min_periods=min_history)
+        else:
+            raise ValueError(f"Unsupported method: {method}")
+
+        return [
+            baseline.over('group_id').alias(f"baseline_{metric}"),
+            spread.over('group_id').alias(f"std_{metric}")
+        ]
+
+    def score(self, history: pl.DataFrame, metrics: Optional[List[str]] = None, method: str = 'zscore',
+              window: int = 14, span: int = 7, min_history: int = 7) -> pl.DataFrame:
+        """
+        Tính baseline, độ lệch chuẩn và z-score của các metric cho mỗi (dimension, key, DATE).
+        Baseline chỉ dùng các ngày trước (shift 1) để ngày hiện tại không tự che bất thường của nó.
+        z-score chia cho max(std, MIN_RELATIVE_STD * |baseline|, MIN_ABSOLUTE_STD của metric):
+        baseline không đổi (vd tỷ lệ sai lệch luôn 0%) rồi nhảy lên 50% vẫn có z rất lớn.
+        Kết quả dạng long: một dòng cho mỗi (dimension, key, DATE, metric).
+        """
+        if history.is_empty():
+            return pl.DataFrame()
+
+        metrics = metrics or self.metrics
+        for metric in metrics:
+            if metric not in self.metrics:
+                raise ValueError(f"Unsupported metric: {metric}")
+
+        # Mã hóa (dimension, key) thành số nguyên để sort/window nhanh hơn sort theo chuỗi
+        base = with_rates(history).with_columns([
+            pl.concat_str(['dimension', 'key'], separator='|').cast(pl.Categorical).to_physical().alias('group_id')
+        ]).sort(['group_id', 'DATE'])
+
+        exprs = []
+        for metric in metrics:
+            exprs.extend(self._baseline_exprs(metric, method, window, span, min_history))
+        wide = base.with_columns(exprs)
+
+        frames = []
+        for metric in metrics:
+            frames.append(wide.select([
+                'dimension', 'key', 'DATE', 'transaction_count',
+                pl.lit(metric).alias('metric'),
+                pl.col(metric).cast(pl.Float64).alias('value'),
+                pl.col(f"baseline_{metric}").alias('baseline'),
+                pl.col(f"std_{metric}").alias('std'),
+                pl.max_horizontal([
+                    pl.col(f"std_{metric}").fill_nan(0),
+                    pl.col(f"baseline_{metric}").abs() * MIN_RELATIVE_STD,
+                    pl.lit(MIN_ABSOLUTE_STD[metric])
+                ]).alias('spread')
+            ]))
+
+        # std null (chưa đủ min_history ngày) thì z_score null
+        return pl.concat(frames).with_columns([
+            pl.when(pl.col('std').is_not_null())
+            .then((pl.col('value') - pl.col('baseline')) / pl.col('spread'))
+            .otherwise(None)
+            .alias('z_score')
+        ]).drop('spread')
+
+    def detect(self, history: pl.DataFrame, metrics: Optional[List[str]] = None, method: str = 'zscore',
+               z_threshold: float = 3.0, window: int = 14, span: int = 7, min_history: int = 7,
+               min_transactions: int = 20) -> pl.DataFrame:
+        """
+        Các điểm bất thường (|z| >= z_threshold), sắp xếp theo |z| giảm dần.
+        Bỏ qua các nhóm quá nhỏ (< min_transactions giao dịch trong ngày) vì tỷ lệ dao động mạnh.
+        """
+        scored = self.score(history, metrics, method, window, span, min_history)
+        if scored.is_empty():
+            return scored
+
+        return scored.filter(
+            (pl.col('z_score').abs() >= z_threshold) &
+            (pl.col('transaction_count') >= min_transactions)
+        ).sort(pl.col('z_score').abs(), descending=True)
+
+    def detect_range(self, start_date: date, end_date: date, **kwargs) -> pl.DataFrame:
+        """Đọc rollup của khoảng ngày từ store rồi phát hiện bất thường"""
+        return self.detect(self.store.history(start_date, end_date), **kwargs)
+
+    def anomalies_on(self, anomalies: pl.DataFrame, day: date) -> pl.DataFrame:
+        """Các bất thường của một ngày cụ thể"""
+        if anomalies.is_empty():
+            return anomalies
+        return anomalies.filter(pl.col('DATE') == day)
+
+    def to_recommendations(self, anomalies: pl.DataFrame, limit: int = 5) -> List[str]:
+        """Chuyển các bất thường mạnh nhất thành khuyến nghị dạng text"""
+        recommendations = []
+        if anomalies.is_empty():
+            return recommendations
+
+        for row in anomalies.head(limit).iter_rows(named=True):
+            direction = 'tăng' if row['z_score'] > 0 else 'giảm'
+            dimension = self.dimension_labels.get(row['dimension'], row['dimension'])
+            metric = self.metric_labels.get(row['metric'], row['metric'])
+            recommendations.append(
+                f"📈 {row['DATE']}: {metric} của {dimension} '{row['key']}' {direction} bất thường "
+                f"({row['value']:,.1f} so với baseline {row['baseline']:,.1f}, z={row['z_score']:.1f})."
+            )
+
+        return recommendations
+
+    def summarize(self, anomalies: pl.DataFrame) -> Dict:
+        """Đếm số bất thường theo dimension và metric"""
+        if anomalies.is_empty():
+            return {}
+
+        summary = {}
+        for row in anomalies.group_by(['dimension', 'metric']).agg(pl.count().alias('count')).iter_rows(named=True):
+            summary.setdefault(row['dimension'], {})[row['metric']] = row['count']
+        return summary
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Tổng hợp dữ liệu cả năm bằng process pool: mỗi task tính rollup của đúng một ngày
+(chỉ đọc các cột cần, bộ nhớ mỗi worker giới hạn trong một file), sau đó gộp các partial.
+"""
+
+import os
+import argparse
+import multiprocessing
+import polars as pl
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+from rollup_store import ROLLUP_MEASURES, RollupStore, merge_rollups, with_rates
+
+
+def _aggregate_day(task: Tuple[str, str, str]) -> Tuple[str, Optional[pl.DataFrame]]:
+    """Task chạy trong worker: rollup của một ngày (dùng DayCache nếu đã có)"""
+    from csv_reader import CSVDataReader
+
+    base_path, date_str, file_type = task
+    store = RollupStore(CSVDataReader(base_path), file_type)
+    return date_str, store.get_day(date_str)
+
+
+@contextmanager
+def _worker_threads(threads: int):
+    """Giới hạn số thread Polars của worker (worker spawn kế thừa biến môi trường của process cha)"""
+    previous = os.environ.get('POLARS_MAX_THREADS')
+    os.environ['POLARS_MAX_THREADS'] = str(threads)
+    try:
+        yield
+    finally:
+        if previous is None:
+            os.environ.pop('POLARS_MAX_THREADS', None)
+        else:
+            os.environ['POLARS_MAX_THREADS'] = previous
+
+
+class BatchEngine:
+    """Fan-out tổng hợp theo ngày ra process pool và gộp kết quả thành báo cáo năm"""
+
+    def __init__(self, reader, file_type: str = 'reconciled', max_workers: Optional[int] = None):
+        self.reader = reader
+        self.file_type = file_type
+        self.max_workers = max_workers or os.cpu_count() or 1
+
+    def list_days(self, start_date: date, end_date: date) -> List[str]:
+        """Các ngày trong khoảng có file dữ liệu"""
+        return [date_str for date_str, _ in self.reader.iter_day_files(start_date, end_date, self.file_type)]
+
+    def aggregate_days(self, date_strs: List[str]) -> pl.DataFrame:
+        """
+        Rollup của từng ngày (mỗi ngày một task), ghép lại kèm cột DATE.
+        Chạy tuần tự khi chỉ có 1 worker hoặc 1 ngày để tránh chi phí khởi tạo process.
+        """
+        tasks = [(self.reader.base_path, date_str, self.file_type) for date_str in date_strs]
+        workers = min(self.max_workers, len(tasks))
+
+        if workers <= 1:
+            results = [_aggregate_day(task) for task in tasks]
+        else:
+            threads = max(1, (os.cpu_count() or 1) // workers)
+            with _worker_threads(threads):
+                # spawn thay vì fork: an toàn với thread pool của Polars và chạy được trên Windows
+                with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+                    results = list(executor.map(_aggregate_day, tasks, chunksize=1))
+
+        frames = [
+            rollup.with_columns([pl.lit(datetime.strptime(date_str, '%Y%m%d').date()).alias('DATE')])
+            for date_str, rollup in results
+            if rollup is not None and not rollup.is_empty()
+        ]
+        if not frames:
+            return pl.DataFrame()
+
+        return pl.concat(frames)
+
+    @staticmethod
+    def merge_partials(partials: pl.DataFrame) -> pl.DataFrame:
+        """Gộp các partial theo (dimension, key): các measure đều cộng dồn được"""
+        if partials.is_empty():
+            return partials
+
+        return with_rates(merge_rollups(partials))
+
+    def summarize(self, partials: pl.DataFrame, top_merchants: int = 20) -> Dict:
+        """Báo cáo tổng hợp: tổng quan, reconcile, insurance, merchant, amount theo service type / tháng"""
+        if partials.is_empty():
+            return {}
+
+        merged = self.merge_partials(partials)
+
+        def dimension_rows(dimension: str, sort_by: str = 'transaction_count') -> List[Dict]:
+            return merged.filter(pl.col('dimension') == dimension).sort(sort_by, descending=True).drop('dimension').to_dicts()
+
+        total = merged.filter(pl.col('dimension') == 'total')
+        total_row = total.to_dicts()[0] if not total.is_empty() else {}
+
+        merchants = merged.filter(pl.col('dimension') == 'merchant')
+        monthly = (
+            partials.filter(pl.col('dimension') == 'total')
+            .group_by(pl.col('DATE').dt.strftime('%Y-%m').alias('month'))
+            .agg([pl.col(col).sum() for col in ROLLUP_MEASURES] + [pl.count().alias('days')])
+            .sort('month')
+        )
+
+        return {
+            'days': partials['DATE'].n_unique(),
+            'total': total_row,
+            'reconcile': dimension_rows('reconcile_status'),
+            'insurance': dimension_rows('insurance_status'),
+            'merchants': {
+                'count': merchants.height,
+                'top_by_volume': merchants.sort('transaction_count', descending=True).head(top_merchants).drop('dimension').to_dicts(),
+                'top_by_discrepancy': merchants.filter(pl.col('transaction_count') >= 100)
+                    .sort('discrepancy_rate', descending=True).head(top_merchants).drop('dimension').to_dicts()
+            },
+            'amount': {
+                'total_amount': total_row.get('total_amount', 0),
+                'avg_amount': (total_row['total_amount'] / total_row['transaction_count'])
+                    if total_row.get('transaction_count') else 0,
+                'by_service_type': dimension_rows('service_type', 'total_amount'),
+                'by_month': with_rates(monthly).to_dicts()
+            }
+        }
+
+    def aggregate_range(self, start_date: date, end_date: date, top_merchants: int = 20) -> Dict:
+        """Báo cáo tổng hợp cho khoảng ngày"""
+        return self.summarize(self.aggregate_days(self.list_days(start_date, end_date)), top_merchants)
+
+    def aggregate_year(self, year: int, top_merchants: int = 20) -> Dict:
+        """Báo cáo tổng hợp cả năm"""
+        return self.aggregate_range(date(year, 1, 1), date(year, 12, 31), top_merchants)
+
+
+def main():
+    from csv_reader import CSVDataReader
+
+    parser = argparse.ArgumentParser(description="Tổng hợp reconcile / insurance / merchant / amount cả năm")
+    parser.add_argument('--base', default="F:/powerbi/gsm_data/out", help="Thư mục dữ liệu (YYYY/MM/DD)")
+    parser.add_argument('--year', type=int, default=datetime.now().year, help="Năm cần tổng hợp")
+    parser.add_argument('--workers', type=int, default=None, help="Số process (mặc định = số CPU)")
+    parser.add_argument('--file-type', default='reconciled', choices=['reconciled', 'taixe'])
+    args = parser.parse_args()
+
+    engine = BatchEngine(CSVDataReader(args.base), args.file_type, args.workers)
+    started = datetime.now()
+    report = engine.aggregate_year(args.year)
+    elapsed = (datetime.now() - started).total_seconds()
+
+    if not report:
+        print(f"⚠️ Không có dữ liệu năm {args.year}")
+        return
+
+    total = report['total']
+    print(f"📅 Năm {args.year}: {report['days']} ngày, {elapsed:.1f}s với {engine.max_workers} process")
+    print(f"📝 Giao dịch: {total['transaction_count']:,} | ✅ Match: {total['match_rate']:.1f}% | "
+          f"❌ Sai lệch: {total['discrepancy_rate']:.1f}% | 💰 Tổng tiền: {total['total_amount']:,.0f}")
+
+    print("\n🔄 Reconcile status:")
+    for row in report['reconcile']:
+        print(f"   {row['key']}: {row['transaction_count']:,}")
+
+    print("\n🛡️ Insurance status:")
+    for row in report['insurance']:
+        print(f"   {row['key']}: {row['transaction_count']:,}")
+
+    print(f"\n🏪 Merchant ({report['merchants']['count']:,}) - top theo số giao dịch:")
+    for row in report['merchants']['top_by_volume'][:10]:
+        print(f"   {row['key']}: {row['transaction_count']:,} ({row['discrepancy_rate']:.1f}% sai lệch)")
+
+    print("\n💰 Amount theo tháng:")
+    for row in report['amount']['by_month']:
+        print(f"   {row['month']}: {row['total_amount']:,.0f} ({row['days']} ngày)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import io
+import os
+import pandas as pd
+import polars as pl
+from datetime import date, timedelta
+from typing import Dict, Optional, Tuple
+
+from order_ulid import ULID_ROUTE_DAYS_AFTER, decode_ulid_times
+
+# Định dạng file danh sách Order ID được chấp nhận (.xls cần xlrd, không có trong requirements)
+ORDER_ID_FILE_TYPES = ['csv', 'txt', 'xlsx']
+
+
+def _order_id_column(columns) -> Optional[str]:
+    """Cột ORDER_ID trong file upload (chấp nhận 'Order ID', 'order_id', ...)"""
+    return next((col for col in columns if col.strip().upper().replace(' ', '_') == 'ORDER_ID'), None)
+
+
+def _drop_header_row(ids: pl.Series) -> pl.Series:
+    """
+    Cột đầu tiên của file không có cột ORDER_ID: dòng đầu là header (vd 'id', 'Mã đơn') nếu nó
+    không có chữ số trong khi các ID phía sau có (Order ID luôn chứa chữ số)
+    """
+    if ids.len() < 2 or ids[0] is None:
+        return ids
+    has_digit = ids.str.contains(r'\d')
+    if not has_digit[0] and has_digit.slice(1).any():
+        return ids.slice(1)
+    return ids
+
+
+def parse_order_id_file(data: bytes, file_name: str) -> pl.DataFrame:
+    """
+    Đọc file danh sách Order ID (CSV / TXT / XLSX) thành DataFrame một cột ORDER_ID (Utf8, unique).
+    - CSV / XLSX: dùng cột ORDER_ID nếu có, không thì cột đầu tiên (file không có header vẫn đọc được,
+      header khác ORDER_ID không bị tính là một ID)
+    - TXT: các ID cách nhau bởi xuống dòng, dấu phẩy, chấm phẩy hoặc khoảng trắng
+    """
+    ext = os.path.splitext(file_name)[1].lower().lstrip('.')
+
+    if ext == 'xlsx':
+        sheet = pd.read_excel(io.BytesIO(data), dtype=str)
+        column = _order_id_column(sheet.columns.astype(str))
+        if column is None:
+            sheet = pd.read_excel(io.BytesIO(data), dtype=str, header=None)
+            ids = _drop_header_row(pl.Series('ORDER_ID', sheet[sheet.columns[0]].tolist(), dtype=pl.Utf8))
+        else:
+            ids = pl.Series('ORDER_ID', sheet[column].tolist(), dtype=pl.Utf8)
+    elif ext == 'csv':
+        # infer_schema_length=0: đọc tất cả cột dạng chuỗi, không làm mất số 0 ở đầu ID
+        table = pl.read_csv(io.BytesIO(data), infer_schema_length=0, truncate_ragged_lines=True)
+        column = _order_id_column(table.columns)
+        if column is None:
+            table = pl.read_csv(io.BytesIO(data), infer_schema_length=0, has_header=False, truncate_ragged_lines=True)
+            ids = _drop_header_row(table[table.columns[0]]).alias('ORDER_ID')
+        else:
+            ids = table[column].alias('ORDER_ID')
+    else:
+        text = data.decode('utf-8-sig', errors='ignore')
+        ids = pl.Series('ORDER_ID', [text]).str.replace_all(r'[\s,;]+', '\n').str.split('\n').explode()
+
+    return (
+        ids.to_frame()
+        .select(pl.col('ORDER_ID').str.strip_chars().str.strip_chars('"\''))
+        .filter(pl.col('ORDER_ID').is_not_null() & (pl.col('ORDER_ID') != ''))
+        .unique(maintain_order=True)
+    )
+
+
+class BulkOrderSearch:
+    """
+    Tìm hàng loạt Order ID (hàng chục nghìn ID từ file upload) bằng semi-join / anti-join
+    trên dữ liệu đã load hoặc streaming trên các file trong khoảng ngày.
+    """
+
+    def __init__(self, reader, file_type: str = 'reconciled'):
+        self.reader = reader
+        self.file_type = file_type
+
+    @staticmethod
+    def match(source: pl.LazyFrame, order_ids: pl.DataFrame, streaming: bool = False) -> Dict:
+        """
+        Semi-join lấy các dòng có ORDER_ID trong danh sách, anti-join lấy các ID không có trong dữ liệu.
+        Hai query chạy chung một lần scan (collect_all); chế độ streaming không dùng chung scan được
+        nên query anti-join chỉ đọc cột ORDER_ID.
+        """
+        if 'ORDER_ID' not in source.columns:
+            return {}
+
+        if source.schema['ORDER_ID'] != pl.Utf8:
+            source = source.with_columns(pl.col('ORDER_ID').cast(pl.Utf8))
+        keys = order_ids.lazy()
+
+        found, not_found = pl.collect_all([
+            source.join(keys, on='ORDER_ID', how='semi'),
+            keys.join(source.select('ORDER_ID'), on='ORDER_ID', how='anti')
+        ], streaming=streaming, comm_subplan_elim=not streaming)
+
+        return {
+            'requested': order_ids.height,
+            'found': found,
+            'found_ids': found['ORDER_ID'].n_unique() if not found.is_empty() else 0,
+            'not_found': not_found
+        }
+
+    def search_frame(self, df: pl.DataFrame, order_ids: pl.DataFrame) -> Dict:
+        """Tìm trong dữ liệu đã load (một ngày hoặc khoảng ngày)"""
+        return self.match(df.lazy(), order_ids)
+
+    def search_range(self, start_date: date, end_date: date, order_ids: pl.DataFrame) -> Dict:
+        """Tìm trong các file của khoảng ngày bằng một streaming query (không load toàn bộ dữ liệu)"""
+        lf = self.reader.scan_date_range(start_date, end_date, self.file_type)
+        if lf is None:
+            return {}
+        return self.match(lf, order_ids, streaming=True)
+
+    @staticmethod
+    def ulid_date_range(order_ids: pl.DataFrame) -> Optional[Tuple[date, date]]:
+        """Khoảng ngày chứa các đơn theo thời điểm tạo trong ULID (None nếu không có ID nào là ULID)"""
+        created = decode_ulid_times(order_ids['ORDER_ID'].to_list()).drop_nulls()
+        if created.is_empty():
+            return None
+        return created.min().date(), created.max().date() + timedelta(days=ULID_ROUTE_DAYS_AFTER)
@@ -0,0 +1,181 @@
+import hashlib
+import json
+import threading
+import numpy as np
+import polars as pl
+import plotly.graph_objects as go
+from collections import OrderedDict
+from plotly.colors import qualitative
+from plotly.subplots import make_subplots
+from typing import Callable, Dict, Optional, Sequence
+
+# Số figure (JSON) giữ trong cache của process, bỏ figure ít dùng nhất khi đầy
+FIGURE_CACHE_SIZE = 256
+# Từ số điểm này trở lên dùng trace WebGL (Scattergl) thay cho SVG
+WEBGL_MIN_POINTS = 5000
+# Số chữ số thập phân giữ lại cho giá trị float (payload gửi lên trình duyệt nhỏ hơn)
+FLOAT_DECIMALS = 2
+CHART_HEIGHT = 400
+# Template rỗng: st.plotly_chart tự áp theme Streamlit, template mặc định của Plotly thêm ~6KB vào mỗi figure
+CHART_TEMPLATE = 'none'
+
+# Cache dùng chung cho mọi phiên trong process (script Streamlit chạy lại mỗi lần rerun, module thì không)
+_FIGURE_CACHE: 'OrderedDict[str, str]' = OrderedDict()
+_FIGURE_CACHE_LOCK = threading.Lock()
+
+
+def to_array(values) -> np.ndarray:
+    """Dữ liệu của chart (Series / list / ndarray) thành ndarray gọn: chuỗi dạng unicode, float làm tròn"""
+    if isinstance(values, pl.Series):
+        values = values.to_numpy()
+    array = np.asarray(values)
+    if array.dtype == object:
+        array = array.astype(str)
+    elif array.dtype.kind == 'f':
+        array = np.round(array, FLOAT_DECIMALS)
+    return array
+
+
+def aggregate_key(kind: str, arrays: Sequence[np.ndarray], spec: Dict) -> str:
+    """Hash của dữ liệu đã tổng hợp + cấu hình chart (khóa cache figure)"""
+    digest = hashlib.sha1(kind.encode('utf-8'))
+    digest.update(json.dumps(spec, sort_keys=True, default=str).encode('utf-8'))
+    for array in arrays:
+        digest.update(array.dtype.str.encode('utf-8'))
+        digest.update(np.ascontiguousarray(array).tobytes())
+    return digest.hexdigest()
+
+
+class ChartBuilder:
+    """
+    Tạo figure Plotly trực tiếp từ mảng NumPy của dữ liệu đã tổng hợp (không qua pandas / Plotly Express):
+    - mỗi chart là một trace graph_objects gọn (px thêm hovertemplate, legendgroup, customdata cho từng nhóm)
+    - figure được serialize một lần và cache theo hash dữ liệu + cấu hình, rerun chỉ đọc lại JSON
+    - chart theo từng điểm (scatter / line) dùng Scattergl khi nhiều điểm
+    Trả về figure dạng dict để truyền thẳng vào st.plotly_chart.
+    """
+
+    def _cached(self, kind: str, arrays: Sequence[np.ndarray], spec: Dict, build: Callable[[], go.Figure]) -> Dict:
+        key = aggregate_key(kind, arrays, spec)
+        with _FIGURE_CACHE_LOCK:
+            figure_json = _FIGURE_CACHE.get(key)
+            if figure_json is not None:
+                _FIGURE_CACHE.move_to_end(key)
+
+        if figure_json is None:
+            fig = build()
+            fig.update_layout(template=CHART_TEMPLATE)
+            figure_json = fig.to_json()
+            with _FIGURE_CACHE_LOCK:
+                _FIGURE_CACHE[key] = figure_json
+                while len(_FIGURE_CACHE) > FIGURE_CACHE_SIZE:
+                    _FIGURE_CACHE.popitem(last=False)
+
+        return json.loads(figure_json)
+
+    @staticmethod
+    def _layout(fig: go.Figure, title: str, height: int, x_title: Optional[str], y_title: Optional[str],
+                tick_format: Optional[str] = None, tick_angle: Optional[int] = None):
+        fig.update_layout(title=title, height=height, margin=dict(l=40, r=20, t=60, b=40))
+        fig.update_xaxes(title_text=x_title, tickangle=tick_angle)
+        fig.update_yaxes(title_text=y_title, tickformat=tick_format)
+
+    def bar(self, x, y, title: str, x_title: Optional[str] = None, y_title: Optional[str] = None,
+            color_scale: Optional[str] = None, height: int = CHART_HEIGHT,
+            tick_format: Optional[str] = None, tick_angle: Optional[int] = None) -> Dict:
+        """Bar chart một series (color_scale: tô màu cột theo giá trị)"""
+        x, y = to_array(x), to_array(y)
+        spec = dict(title=title, x_title=x_title, y_title=y_title, color_scale=color_scale,
+                    height=height, tick_format=tick_format, tick_angle=tick_angle)
+
+        def build() -> go.Figure:
+            marker = dict(color=y, colorscale=color_scale, showscale=True) if color_scale else None
+            fig = go.Figure(go.Bar(x=x, y=y, marker=marker))
+            self._layout(fig, title, height, x_title, y_title, tick_format, tick_angle)
+            return fig
+
+        return self._cached('bar', [x, y], spec, build)
+
+    def grouped_bar(self, x, series: Dict[str, Sequence], title: str, x_title: Optional[str] = None,
+                    y_title: Optional[str] = None, height: int = CHART_HEIGHT,
+                    tick_format: Optional[str] = None, tick_angle: Optional[int] = None) -> Dict:
+        """Bar chart nhiều series cạnh nhau (mỗi series một trace)"""
+        x = to_array(x)
+        values = {name: to_array(y) for name, y in series.items()}
+        spec = dict(title=title, names=list(values), x_title=x_title, y_title=y_title,
+                    height=height, tick_format=tick_format, tick_angle=tick_angle)
+
+        def build() -> go.Figure:
+            fig = go.Figure([go.Bar(x=x, y=y, name=name) for name, y in values.items()])
+            fig.update_layout(barmode='group')
+            self._layout(fig, title, height, x_title, y_title, tick_format, tick_angle)
+            return fig
+
+        return self._cached('grouped_bar', [x] + list(values.values()), spec, build)
+
+    def pie(self, names, values, title: str, colors: Optional[Sequence[str]] = None,
+            color_map: Optional[Dict[str, str]] = None, height: int = CHART_HEIGHT) -> Dict:
+        """Pie chart, nhãn + phần trăm bên trong (color_map: màu theo tên, colors: bảng màu theo thứ tự)"""
+        names, values = to_array(names), to_array(values)
+        palette = list(colors or qualitative.Plotly)
+        spec = dict(title=title, colors=palette, color_map=color_map, height=height)
+
+        def build() -> go.Figure:
+            slice_colors = [
+                (color_map or {}).get(name, palette[i % len(palette)]) for i, name in enumerate(names.tolist())
+            ]
+            fig = go.Figure(go.Pie(
+                labels=names, values=values, marker=dict(colors=slice_colors),
+                textposition='inside', textinfo='percent+label', sort=False
+            ))
+            fig.update_layout(title=title, height=height, margin=dict(l=20, r=20, t=60, b=20))
+            return fig
+
+        return self._cached('pie', [names, values], spec, build)
+
+    def heatmap(self, z, x, y, title: str, x_title: Optional[str] = None, y_title: Optional[str] = None,
+                color_scale: str = 'Blues', height: int = CHART_HEIGHT) -> Dict:
+        """Heatmap ma trận z (hàng theo y, cột theo x), hiện giá trị trong từng ô"""
+        z, x, y = to_array(z), to_array(x), to_array(y)
+        spec = dict(title=title, x_title=x_title, y_title=y_title, color_scale=color_scale, height=height)
+
+        def build() -> go.Figure:
+            fig = go.Figure(go.Heatmap(z=z, x=x, y=y, colorscale=color_scale, texttemplate='%{z}'))
+            self._layout(fig, title, height, x_title, y_title)
+            fig.update_yaxes(autorange='reversed')
+            return fig
+
+        return self._cached('heatmap', [z, x, y], spec, build)
+
+    def scatter(self, x, y, title: str, name: Optional[str] = None, mode: str = 'markers',
+                x_title: Optional[str] = None, y_title: Optional[str] = None, height: int = CHART_HEIGHT) -> Dict:
+        """Chart theo từng điểm; từ WEBGL_MIN_POINTS điểm dùng Scattergl"""
+        x, y = to_array(x), to_array(y)
+        spec = dict(title=title, name=name, mode=mode, x_title=x_title, y_title=y_title, height=height)
+
+        def build() -> go.Figure:
+            trace = go.Scattergl if len(x) >= WEBGL_MIN_POINTS else go.Scatter
+            fig = go.Figure(trace(x=x, y=y, name=name, mode=mode))
+            self._layout(fig, title, height, x_title, y_title)
+            return fig
+
+        return self._cached('scatter', [x, y], spec, build)
+
+    def bar_with_line(self, x, bar_y, line_y, title: str, bar_name: str, line_name: str,
+                      line_range: Optional[Sequence[float]] = None, height: int = CHART_HEIGHT) -> Dict:
+        """Bar (trục trái) + line (trục phải) trên cùng trục x"""
+        x, bar_y, line_y = to_array(x), to_array(bar_y), to_array(line_y)
+        spec = dict(title=title, bar_name=bar_name, line_name=line_name,
+                    line_range=list(line_range) if line_range else None, height=height)
+
+        def build() -> go.Figure:
+            line_trace = go.Scattergl if len(x) >= WEBGL_MIN_POINTS else go.Scatter
+            fig = make_subplots(specs=[[{"secondary_y": True}]])
+            fig.add_trace(go.Bar(x=x, y=bar_y, name=bar_name, opacity=0.4), secondary_y=False)
+            fig.add_trace(line_trace(x=x, y=line_y, name=line_name, mode='lines'), secondary_y=True)
+            fig.update_layout(height=height, title=title)
+            fig.update_yaxes(title_text=bar_name, secondary_y=False)
+            fig.update_yaxes(title_text=line_name, range=line_range, secondary_y=True)
+            return fig
+
+        return self._cached('bar_with_line', [x, bar_y, line_y], spec, build)
@@ -0,0 +1,96 @@
+import polars as pl
+from typing import Dict, List, Optional
+
+# Số giá trị phổ biến nhất giữ cho mỗi cột
+PROFILE_TOP_VALUES = 3
+# Đổi khi cách tính / schema của profile thay đổi để không đọc nhầm artifact cũ
+PROFILE_VERSION = 'v1'
+# Kiểu dữ liệu được profile min / max / distinct / top (bỏ qua list, struct, ...)
+ORDERED_DTYPES = (
+    pl.Int8, pl.Int16, pl.Int32, pl.Int64, pl.UInt8, pl.UInt16, pl.UInt32, pl.UInt64,
+    pl.Float32, pl.Float64, pl.Date, pl.Datetime, pl.Duration, pl.Time, pl.Utf8, pl.Boolean
+)
+
+
+def profile_name(file_type: str) -> str:
+    """Tên artifact column profile của ngày trong DayCache"""
+    return f"column_profile_{file_type}_{PROFILE_VERSION}"
+
+
+def _is_ordered(dtype: pl.DataType) -> bool:
+    return any(dtype == ordered for ordered in ORDERED_DTYPES)
+
+
+def _format_value(value) -> Optional[str]:
+    """Giá trị min / max / top dạng chuỗi (profile lưu một kiểu cho mọi cột)"""
+    if value is None:
+        return None
+    if isinstance(value, float):
+        return f"{value:,.2f}"
+    return str(value)
+
+
+def profile_frame(df: pl.DataFrame, top_values: int = PROFILE_TOP_VALUES) -> pl.DataFrame:
+    """
+    Profile tất cả các cột trong một lần select (Polars chạy song song các expression):
+    null, ước lượng số giá trị khác nhau (HyperLogLog), min / max và các giá trị phổ biến nhất.
+    Trả về mỗi cột một dòng: column, dtype, null_count, null_pct, distinct_estimate, min, max, top_values.
+    """
+    schema = df.schema
+    exprs = []
+    for col in df.columns:
+        exprs.append(pl.col(col).null_count().alias(f"{col}__nulls"))
+        if _is_ordered(schema[col]):
+            exprs.append(pl.col(col).drop_nulls().approx_n_unique().alias(f"{col}__distinct"))
+            exprs.append(pl.col(col).min().alias(f"{col}__min"))
+            exprs.append(pl.col(col).max().alias(f"{col}__max"))
+            exprs.append(
+                pl.col(col).drop_nulls().alias('value').value_counts(sort=True).head(top_values)
+                .implode().alias(f"{col}__top")
+            )
+
+    stats: Dict = df.select(exprs).row(0, named=True) if exprs else {}
+
+    rows: List[Dict] = []
+    for col in df.columns:
+        null_count = stats.get(f"{col}__nulls", 0)
+        top = stats.get(f"{col}__top") or []
+        rows.append({
+            'column': col,
+            'dtype': str(schema[col]),
+            'null_count': null_count,
+            'null_pct': null_count / df.height * 100 if df.height else 0.0,
+            'distinct_estimate': stats.get(f"{col}__distinct"),
+            'min': _format_value(stats.get(f"{col}__min")),
+            'max': _format_value(stats.get(f"{col}__max")),
+            'top_values': ', '.join(f"{_format_value(item['value'])} ({item['count']:,})" for item in top)
+        })
+
+    return pl.DataFrame(rows, schema={
+        'column': pl.Utf8, 'dtype': pl.Utf8, 'null_count': pl.Int64, 'null_pct': pl.Float64,
+        'distinct_estimate': pl.Int64, 'min': pl.Utf8, 'max': pl.Utf8, 'top_values': pl.Utf8
+    })
+
+
+class ColumnProfiler:
+    """
+    Column profile cho các view chất lượng dữ liệu:
+    - dữ liệu một ngày: lưu trong DayCache theo fingerprint file nguồn, rerun / mở lại chỉ đọc một file Parquet nhỏ
+    - dữ liệu khoảng ngày: tính trực tiếp trên DataFrame đã load (caller tự giữ kết quả)
+    """
+
+    def __init__(self, reader, file_type: str = 'reconciled'):
+        self.reader = reader
+        self.file_type = file_type
+
+    def get_profile(self, df: pl.DataFrame, date_str: Optional[str] = None,
+                    file_path: Optional[str] = None) -> pl.DataFrame:
+        """Profile của df; có date_str + file_path (file đã đọc ra df) thì đọc / ghi DayCache"""
+        if not date_str or not file_path:
+            return profile_frame(df)
+
+        cache = self.reader.get_day_cache()
+        return cache.get_or_compute(
+            date_str, profile_name(self.file_type), cache.file_fingerprint(file_path),
+            lambda: profile_frame(df)
+        )
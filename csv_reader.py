@@ -1,10 +1,17 @@
 import os
 import pandas as pd
 import polars as pl
-from datetime import datetime
-from typing import Dict, List, Optional, Tuple
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
 import glob
 import re
+from day_cache import DayCache
+from parquet_mirror import ParquetMirror
+from order_ulid import ORDER_ID_TIME_COLUMN, ulid_time_expr
+from order_index import OrderRowIndex
+
+# Tổng dung lượng CSV tối đa của một lần tải khoảng ngày (toàn bộ khoảng được nạp vào bộ nhớ)
+MAX_RANGE_SIZE_MB = 2048
 
 class CSVDataReader:
     """
@@ -20,6 +27,13 @@ class CSVDataReader:
             'reconciled': 'pvi_transaction_reconciled_',
             'taixe': 'pvi_transaction_reconciled_taixe_'
         }
+        # Các tên cột amount có thể có dùng để phân loại Bike/Car
+        self.vehicle_amount_columns = {
+            'gsm': ['GSM Amount', 'GSM_AMOUNT', 'GSM_AMO', 'GSM_AMOUNT_MERCHANT', 'GSM_AMO_MERCHANT', 'GSM_AMOUNT_MERCH', 'GSM_AMO_MERCH'],
+            'merchant': ['Merchant Amount', 'MERCHANT_AMOUNT', 'MERCHANT_AMO']
+        }
+        # Index ORDER_ID -> vị trí dòng theo loại file (giữ index đã đọc trong phiên)
+        self._order_row_indexes: Dict[str, OrderRowIndex] = {}
         
     def get_date_folders(self, year: int = 2025) -> List[str]:
         """Lấy danh sách các thư mục theo ngày"""
@@ -72,11 +86,131 @@ class CSVDataReader:
                 null_values=['', 'NULL', 'null'],
                 ignore_errors=True
             )
-            return df
+            return self.with_order_id_time(df)
         except Exception as e:
             print(f"Error reading {file_path}: {e}")
             return pl.DataFrame()
     
+    def with_order_id_time(self, frame):
+        """Thêm cột ORDER_ID_TIME (thời điểm tạo giải mã từ ORDER_ID dạng ULID) cho DataFrame / LazyFrame"""
+        if 'ORDER_ID' not in frame.columns or ORDER_ID_TIME_COLUMN in frame.columns:
+            return frame
+        return frame.with_columns(ulid_time_expr('ORDER_ID').alias(ORDER_ID_TIME_COLUMN))
+    
+    def scan_csv_polars(self, file_path: str) -> pl.LazyFrame:
+        """Scan CSV dạng lazy (cùng option với read_csv_polars) để projection/filter được đẩy xuống lúc đọc"""
+        return pl.scan_csv(
+            file_path,
+            separator=',',
+            quote_char='"',
+            null_values=['', 'NULL', 'null'],
+            ignore_errors=True
+        )
+    
+    def get_day_folder(self, date_str: str) -> str:
+        """Đường dẫn thư mục của ngày YYYYMMDD: base_path/YYYY/MM/DD"""
+        return os.path.join(self.base_path, date_str[:4], date_str[4:6], date_str[6:8])
+    
+    def iter_day_files(self, start_date: date, end_date: date, file_type: str = 'reconciled') -> Iterator[Tuple[str, str]]:
+        """Duyệt (date_str, file_path) cho các ngày trong khoảng có file (ưu tiên file _2)"""
+        current = start_date
+        while current <= end_date:
+            date_str = current.strftime('%Y%m%d')
+            file_path = self.find_best_file(self.get_day_folder(date_str), date_str, file_type)
+            if file_path:
+                yield date_str, file_path
+            current += timedelta(days=1)
+
+    @property
+    def parquet_path(self) -> str:
+        """Thư mục Parquet mirror (GSM_PARQUET_PATH hoặc base_path/_parquet)"""
+        return os.environ.get('GSM_PARQUET_PATH') or os.path.join(self.base_path, '_parquet')
+
+    def get_parquet_mirror(self) -> Optional[ParquetMirror]:
+        """ParquetMirror nếu đã có mirror (đã chạy parquet_mirror.py ít nhất một lần)"""
+        mirror = ParquetMirror(self)
+        return mirror if os.path.exists(mirror.manifest_path) else None
+
+    def scan_day_file(self, date_str: str, file_path: str, file_type: str = 'reconciled',
+                      mirror: Optional[ParquetMirror] = None) -> pl.LazyFrame:
+        """
+        Scan lazy file của một ngày, thêm cột partition DATE và ORDER_ID_TIME (chỉ tính khi được select).
+        Dùng partition Parquet nếu mirror còn khớp với file CSV nguồn.
+        """
+        parquet_file = mirror.partition_file(date_str, file_type, file_path) if mirror else None
+        lf = pl.scan_parquet(parquet_file, hive_partitioning=False) if parquet_file else self.scan_csv_polars(file_path)
+
+        return self.with_order_id_time(lf).with_columns([
+            pl.lit(datetime.strptime(date_str, '%Y%m%d').date()).alias('DATE')
+        ])
+
+    def scan_date_range(self, start_date: date, end_date: date, file_type: str = 'reconciled') -> Optional[pl.LazyFrame]:
+        """
+        Ghép lazy các file theo ngày trong khoảng (ưu tiên file _2) thành một LazyFrame có cột DATE.
+        Ngày có partition Parquet còn khớp file nguồn được đọc bằng một scan Hive-partitioned
+        (ParquetMirror.scan_range), các ngày còn lại đọc từ CSV.
+        Các ngày có schema khác nhau được ghép theo tên cột (diagonal_relaxed).
+        """
+        mirror = self.get_parquet_mirror()
+        files = list(self.iter_day_files(start_date, end_date, file_type))
+        mirrored = {date_str for date_str, file_path in files
+                    if mirror and mirror.partition_file(date_str, file_type, file_path)}
+
+        scans = [(first_day, self.with_order_id_time(lf)) for first_day, lf in mirror.scan_range(sorted(mirrored), file_type)] \
+            if mirrored else []
+        scans.extend(
+            (date_str, self.scan_day_file(date_str, file_path, file_type))
+            for date_str, file_path in files if date_str not in mirrored
+        )
+
+        if not scans:
+            return None
+
+        return pl.concat([lf for _, lf in sorted(scans, key=lambda scan: scan[0])], how='diagonal_relaxed')
+
+    def load_date_range(self, start_date: date, end_date: date, file_type: str = 'reconciled',
+                        columns: Optional[List[str]] = None) -> pl.DataFrame:
+        """
+        Đọc dữ liệu nhiều ngày bằng một streaming query (chỉ đọc các cột cần nếu truyền columns).
+        Kết quả nằm hết trong bộ nhớ: kiểm tra get_range_info()['too_large'] trước khi gọi.
+        """
+        try:
+            lf = self.scan_date_range(start_date, end_date, file_type)
+            if lf is None:
+                return pl.DataFrame()
+
+            if columns:
+                lf = lf.select([col for col in columns if col in lf.columns])
+
+            return lf.collect(streaming=True)
+        except Exception as e:
+            print(f"Error reading range {start_date} - {end_date}: {e}")
+            return pl.DataFrame()
+
+    def get_range_info(self, start_date: date, end_date: date, file_type: str = 'reconciled') -> Dict:
+        """Thông tin các file trong khoảng ngày: số ngày, tổng dung lượng, số ngày có file _2, vượt MAX_RANGE_SIZE_MB"""
+        files = list(self.iter_day_files(start_date, end_date, file_type))
+        size_mb = sum(os.path.getsize(file_path) for _, file_path in files) / (1024 * 1024)
+
+        return {
+            'start_date': start_date.strftime('%Y%m%d'),
+            'end_date': end_date.strftime('%Y%m%d'),
+            'days': [date_str for date_str, _ in files],
+            'files': [file_path for _, file_path in files],
+            'size_mb': size_mb,
+            'version_2_days': sum(1 for _, file_path in files if file_path.endswith('_2.csv')),
+            'too_large': size_mb > MAX_RANGE_SIZE_MB
+        }
+
+    @property
+    def cache_path(self) -> str:
+        """Thư mục cache tổng hợp theo ngày (GSM_CACHE_PATH hoặc base_path/_cache)"""
+        return os.environ.get('GSM_CACHE_PATH') or os.path.join(self.base_path, '_cache')
+    
+    def get_day_cache(self) -> DayCache:
+        """DayCache gắn với base_path hiện tại"""
+        return DayCache(self.cache_path)
+    
     def read_csv_pandas(self, file_path: str, chunk_size: int = 10000) -> pd.DataFrame:
         """Đọc CSV với pandas (fallback option)"""
         try:
@@ -157,11 +291,27 @@ class CSVDataReader:
         
         return analysis
     
-    def find_special_orders(self, df: pl.DataFrame, order_ids: List[str]) -> pl.DataFrame:
-        """Tìm các order ID đặc biệt"""
+    def get_order_row_index(self, file_type: str = 'reconciled') -> OrderRowIndex:
+        """OrderRowIndex của loại file (tạo một lần cho mỗi reader)"""
+        if file_type not in self._order_row_indexes:
+            self._order_row_indexes[file_type] = OrderRowIndex(self, file_type)
+        return self._order_row_indexes[file_type]
+    
+    def find_special_orders(self, df: pl.DataFrame, order_ids: List[str], date_str: Optional[str] = None,
+                            file_type: str = 'reconciled') -> pl.DataFrame:
+        """
+        Tìm các order ID đặc biệt.
+        Nếu df là dữ liệu của ngày date_str (đọc từ file được ưu tiên) thì tra index ORDER_ID -> vị trí dòng,
+        không phải lọc toàn bộ DataFrame.
+        """
         if df.is_empty() or 'ORDER_ID' not in df.columns:
             return pl.DataFrame()
         
+        if date_str:
+            found = self.get_order_row_index(file_type).find_in_frame(df, date_str, order_ids)
+            if found is not None:
+                return found
+        
         return df.filter(pl.col('ORDER_ID').is_in(order_ids))
     
     def analyze_business_orders(self, df: pl.DataFrame) -> Dict:
@@ -251,6 +401,71 @@ class CSVDataReader:
         
         return analysis
 
+    def find_column(self, df: pl.DataFrame, candidates: List[str]) -> Optional[str]:
+        """Tìm cột đầu tiên có trong DataFrame theo danh sách tên có thể có"""
+        for col in candidates:
+            if col in df.columns:
+                return col
+        return None
+
+    def vehicle_type_expr(self, amount_col: str) -> pl.Expr:
+        """Phân loại xe theo amount: 100 = Bike, 200 = Car, còn lại = Khác (null giữ nguyên null)"""
+        return (
+            pl.when(pl.col(amount_col) == 100).then(pl.lit('Bike'))
+            .when(pl.col(amount_col) == 200).then(pl.lit('Car'))
+            .when(pl.col(amount_col).is_not_null()).then(pl.lit('Khác'))
+            .otherwise(pl.lit(None))
+        )
+
+    def analyze_vehicle_types(self, df: pl.DataFrame, gsm_col: str, merchant_col: Optional[str] = None) -> pl.DataFrame:
+        """
+        Thống kê Bike vs Car bằng một group_by duy nhất theo (loại xe GSM, loại xe Merchant).
+        Kết quả chỉ có tối đa vài dòng, mọi count/tổng tiền đều suy ra từ đây.
+        """
+        if df.is_empty() or gsm_col not in df.columns:
+            return pl.DataFrame()
+
+        keys = [self.vehicle_type_expr(gsm_col).alias('GSM_VEHICLE')]
+        aggs = [
+            pl.count().alias('count'),
+            pl.col(gsm_col).sum().alias('gsm_total')
+        ]
+
+        if merchant_col and merchant_col in df.columns:
+            keys.append(self.vehicle_type_expr(merchant_col).alias('MERCHANT_VEHICLE'))
+            aggs.append(pl.col(merchant_col).sum().alias('merchant_total'))
+
+        return df.group_by(keys).agg(aggs)
+
+    def summarize_vehicle_types(self, vehicle_stats: pl.DataFrame) -> Dict:
+        """
+        Chuyển kết quả analyze_vehicle_types sang dict {'gsm': {...}, 'merchant': {...}}.
+        'gsm' luôn có đủ Bike / Car / Khác (0 khi không có dữ liệu), 'merchant' chỉ có khi có cột Merchant Amount.
+        """
+        summary = {'gsm': {vehicle: {'count': 0, 'total': 0} for vehicle in ['Bike', 'Car', 'Khác']}}
+        if vehicle_stats.is_empty():
+            return summary
+
+        sides = [('gsm', 'GSM_VEHICLE', 'gsm_total')]
+        if 'MERCHANT_VEHICLE' in vehicle_stats.columns:
+            sides.append(('merchant', 'MERCHANT_VEHICLE', 'merchant_total'))
+
+        for side, key_col, total_col in sides:
+            side_stats = vehicle_stats.group_by(key_col).agg([
+                pl.col('count').sum(),
+                pl.col(total_col).sum().alias('total')
+            ])
+
+            summary[side] = {vehicle: {'count': 0, 'total': 0} for vehicle in ['Bike', 'Car', 'Khác']}
+            for row in side_stats.iter_rows(named=True):
+                if row[key_col] is not None:
+                    summary[side][row[key_col]] = {
+                        'count': row['count'],
+                        'total': row['total'] or 0
+                    }
+
+        return summary
+
     def get_summary_stats(self, df: pl.DataFrame) -> Dict:
         """Lấy thống kê tổng quan"""
         if df.is_empty():
@@ -2,12 +2,29 @@ import streamlit as st
 import pandas as pd
 import polars as pl
 import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
 from datetime import datetime, date, timedelta
 import os
+import calendar
 from csv_reader import CSVDataReader
-from typing import Dict, List
+from data_analyzer import DataAnalyzer
+from rollup_store import RollupStore
+from anomaly_detector import AnomalyDetector
+from transition_tracker import TransitionTracker
+from version_diff import VersionDiff
+from order_index import OrderIndex
+from bulk_search import ORDER_ID_FILE_TYPES, BulkOrderSearch
+from merchant_index import MerchantIndex
+from data_pager import PAGE_SIZES, DataPager
+from facet_index import FacetIndex
+from ui_components import (
+    range_too_large_message, read_order_id_file, render_bulk_results, render_export, render_pager_navigation
+)
+from data_export import EXPORT_CHUNK_ROWS, SearchResult, frame_chunks
+from column_profile import ColumnProfiler
+from panel_cache import PanelInputCache
+from chart_builder import ChartBuilder
+from downsample import DOWNSAMPLE_METHODS, MAX_CHART_POINTS, bucket_counts, downsample_points, window
+from typing import Callable, Dict, List
 
 # Cấu hình trang - chỉ set nếu chưa được set
 if 'page_config_set' not in st.session_state:
@@ -117,6 +134,14 @@ div[data-testid="metric-container"] label {
 class DashboardApp:
     def __init__(self):
         self.reader = CSVDataReader()
+        self.analyzer = DataAnalyzer()
+        self.anomaly_detector = AnomalyDetector(RollupStore(self.reader))
+        self.transition_tracker = TransitionTracker(self.reader)
+        self.version_diff = VersionDiff(self.reader)
+        self.order_index = OrderIndex(self.reader)
+        self.bulk_search = BulkOrderSearch(self.reader)
+        self.column_profiler = ColumnProfiler(self.reader)
+        self.charts = ChartBuilder()
         self.init_session_state()
     
     def init_session_state(self):
@@ -252,6 +277,22 @@ class DashboardApp:
                 if 'load_message_type' in st.session_state:
                     del st.session_state.load_message_type
         
+        # Chế độ khoảng ngày
+        st.sidebar.markdown("---")
+        st.sidebar.markdown("### 📆 Phân tích nhiều ngày")
+        date_range = st.sidebar.date_input(
+            "Khoảng ngày:",
+            value=(date(year, month, 1), date(year, month, 7)),
+            format="DD/MM/YYYY",
+            key="range_selector"
+        )
+        if st.sidebar.button("📥 Tải khoảng ngày", key="load_range_btn"):
+            if isinstance(date_range, (list, tuple)) and len(date_range) == 2:
+                self.load_range_data(date_range[0], date_range[1])
+                st.rerun()
+            else:
+                st.sidebar.warning("⚠️ Chọn đủ ngày bắt đầu và ngày kết thúc")
+        
         # Debug section
         st.sidebar.markdown("---")
         st.sidebar.markdown("### 🐛 Debug Tools")
@@ -441,6 +482,49 @@ class DashboardApp:
             st.session_state.load_message = f"❌ Lỗi khi tải dữ liệu ngày {day}: {e}"
             st.session_state.load_message_type = 'error'
     
+    def load_range_data(self, start_date: date, end_date: date):
+        """Load dữ liệu nhiều ngày (ưu tiên file _2 mỗi ngày) thành một DataFrame có cột DATE"""
+        try:
+            range_info = self.reader.get_range_info(start_date, end_date)
+            if not range_info['days']:
+                st.session_state.load_message = f"❌ Không có dữ liệu từ {start_date:%d/%m/%Y} đến {end_date:%d/%m/%Y}"
+                st.session_state.load_message_type = 'error'
+                return
+            
+            if range_info['too_large']:
+                st.session_state.load_message = range_too_large_message(range_info)
+                st.session_state.load_message_type = 'error'
+                return
+            
+            st.session_state.current_data = None
+            st.session_state.file_info = None
+            st.session_state.selected_date = None
+            
+            with st.spinner(f"🔄 Đang tải {len(range_info['days'])} ngày..."):
+                df = self.reader.load_date_range(start_date, end_date)
+            
+            if df.is_empty():
+                st.session_state.load_message = "❌ Không thể đọc dữ liệu khoảng ngày đã chọn"
+                st.session_state.load_message_type = 'error'
+                return
+            
+            st.session_state.current_data = df
+            st.session_state.file_info = {
+                'folder': self.reader.base_path,
+                'date': range_info['start_date'],
+                'date_end': range_info['end_date'],
+                'days': range_info['days'],
+                'reconciled_size_mb': range_info['size_mb'],
+                'has_version_2': range_info['version_2_days'] > 0,
+                'version_2_days': range_info['version_2_days']
+            }
+            
+            st.session_state.load_message = f"✅ Đã tải {df.height:,} bản ghi từ {len(range_info['days'])} ngày"
+            st.session_state.load_message_type = 'success'
+        except Exception as e:
+            st.session_state.load_message = f"❌ Lỗi khi tải khoảng ngày: {e}"
+            st.session_state.load_message_type = 'error'
+    
     def load_daily_data(self, folder_path: str):
         """Tải và phân tích dữ liệu theo ngày"""
         try:
@@ -504,6 +588,10 @@ class DashboardApp:
         if st.session_state.file_info:
             info = st.session_state.file_info
             
+            if info.get('date_end'):
+                self.render_range_info(info)
+                return
+            
             # Format ngày đẹp hơn
             date_formatted = f"{info['date'][:4]}/{info['date'][4:6]}/{info['date'][6:8]}"
             
@@ -532,6 +620,111 @@ class DashboardApp:
                     filename = info['reconciled_file'].split('\\')[-1]
                     st.metric("📂 File", filename[:25] + "..." if len(filename) > 25 else filename)
     
+    def get_panel_inputs(self) -> PanelInputCache:
+        """Cache đầu vào các panel của dataset đang xem (tạo mới khi đổi dữ liệu)"""
+        df = st.session_state.current_data
+        cache = st.session_state.get('panel_inputs')
+        if cache is None or cache.data is not df:
+            cache = PanelInputCache(df)
+            st.session_state.panel_inputs = cache
+        return cache
+    
+    def panel_input_tasks(self, df: pl.DataFrame) -> Dict[str, Callable]:
+        """Các kết quả tổng hợp đầu vào của từng panel (tên -> hàm tính), tính khi panel cần lần đầu"""
+        info = st.session_state.file_info or {}
+        profile_args = () if info.get('date_end') else (info.get('date'), info.get('reconciled_file'))
+        
+        return {
+            'reconcile_stats': lambda: self.reader.analyze_reconcile_status(df),
+            'amount_by_service_type': lambda: self.reader.analyze_amount_by_service_type(df),
+            'insurance_stats': lambda: self.reader.analyze_insurance_status(df),
+            'business_stats': lambda: self.reader.analyze_business_orders(df),
+            'service_stats': lambda: self.reader.analyze_service_type(df),
+            'column_profile': lambda: self.column_profiler.get_profile(df, *profile_args),
+            'order_time_series': lambda: self.analyzer.order_time_series(df),
+            'facet_index': lambda: FacetIndex(df)
+        }
+    
+    def get_panel_input(self, name: str):
+        """
+        Kết quả tổng hợp đầu vào của một panel, tính một lần cho dataset đang xem và giữ trong session
+        (rerun của fragment / của trang không tính lại)
+        """
+        df = st.session_state.current_data
+        return self.get_panel_inputs().get(name, self.panel_input_tasks(df)[name])
+    
+    @st.fragment
+    def render_version_diff(self):
+        """So sánh file gốc và file _2 của ngày đang xem (chỉ hiện khi ngày có file _2)"""
+        info = st.session_state.file_info or {}
+        if not info.get('has_version_2') or info.get('date_end'):
+            return
+        
+        with st.expander("⭐ So sánh file gốc và file _2", expanded=False):
+            # Kết quả giữ trong session theo ngày: đổi bộ lọc loại thay đổi (rerun) vẫn hiện kết quả
+            result = st.session_state.get('version_diff_result')
+            if result is not None and result[0] != info['date']:
+                result = st.session_state.version_diff_result = None
+            
+            if st.button("🔎 So sánh 2 phiên bản", key="version_diff_run"):
+                with st.spinner("Đang so sánh theo ORDER_ID..."):
+                    result = st.session_state.version_diff_result = (info['date'], self.version_diff.get_diff(info['date']))
+            
+            if result is None:
+                st.caption("Đang hiển thị dữ liệu file _2. Kết quả so sánh được cache, các lần sau mở ngay.")
+                return
+            
+            diff = result[1]
+            if not diff:
+                st.info("ℹ️ Không tìm thấy đủ file gốc và file _2 để so sánh")
+                return
+            
+            summary = diff['summary']
+            col1, col2, col3, col4, col5 = st.columns(5)
+            with col1:
+                st.metric("📄 Gốc → _2", f"{summary['rows_original']:,} → {summary['rows_version_2']:,}")
+            with col2:
+                st.metric("➕ Thêm mới", f"{summary['added']:,}")
+            with col3:
+                st.metric("➖ Bị xóa", f"{summary['removed']:,}")
+            with col4:
+                st.metric("🔄 Đổi trạng thái", f"{summary['status_changed']:,}")
+            with col5:
+                st.metric("💰 Đổi amount", f"{summary['amount_changed']:,}")
+            
+            deltas = {key[:-len('_delta')]: value for key, value in summary.items() if key.endswith('_delta')}
+            if deltas:
+                st.markdown("**💰 Chênh lệch amount (_2 - gốc):** " + " | ".join(
+                    f"{col}: {value:+,.0f}" for col, value in deltas.items()
+                ))
+            
+            if not diff['status_changes'].is_empty():
+                st.markdown("**🔄 Thay đổi RECONCILE_STATUS:**")
+                st.dataframe(diff['status_changes'].to_pandas(), use_container_width=True, hide_index=True)
+            
+            details = diff['details']
+            if not details.is_empty():
+                change_types = details['change_type'].unique().sort().to_list()
+                selected_types = st.multiselect("Loại thay đổi:", options=change_types, default=change_types, key="version_diff_types")
+                filtered = details.filter(pl.col('change_type').is_in(selected_types))
+                st.markdown(f"**📋 Chi tiết:** {filtered.height:,} đơn")
+                st.dataframe(filtered.head(1000).to_pandas(), use_container_width=True, hide_index=True)
+    
+    def render_range_info(self, info: Dict):
+        """Hiển thị thông tin khi đang xem nhiều ngày"""
+        start_formatted = f"{info['date'][6:8]}/{info['date'][4:6]}/{info['date'][:4]}"
+        end_formatted = f"{info['date_end'][6:8]}/{info['date_end'][4:6]}/{info['date_end'][:4]}"
+        
+        col1, col2, col3, col4 = st.columns([2, 1, 1, 1])
+        with col1:
+            st.metric("📆 Khoảng ngày", f"{start_formatted} - {end_formatted}")
+        with col2:
+            st.metric("📂 Số ngày có dữ liệu", len(info.get('days', [])))
+        with col3:
+            st.metric("📄 Reconciled", f"{info.get('reconciled_size_mb', 0):.1f}MB")
+        with col4:
+            st.metric("⭐ Ngày có V2", info.get('version_2_days', 0))
+    
     def render_summary_stats(self):
         """Hiển thị thống kê tổng quan"""
         if st.session_state.current_data is not None and not st.session_state.current_data.is_empty():
@@ -554,13 +747,14 @@ class DashboardApp:
                                 max(stats.get('total_records', 1), 1) * 100)
                 st.metric("📊 Duplicate %", f"{duplicate_rate:.1f}%")
     
+    @st.fragment
     def render_reconcile_analysis(self):
         """Phân tích RECONCILE_STATUS"""
         if st.session_state.current_data is not None and not st.session_state.current_data.is_empty():
             st.markdown("### 🔄 Phân tích Đối soát")
             
             df = st.session_state.current_data
-            reconcile_stats = self.reader.analyze_reconcile_status(df)
+            reconcile_stats = self.get_panel_input('reconcile_stats')
             
             if reconcile_stats:
                 col1, col2 = st.columns([1, 1])
@@ -604,12 +798,9 @@ class DashboardApp:
                                 """, unsafe_allow_html=True)
                             
                             with col_info:
-                                # Chỉ hiển thị button drill-down cho non-match status có ít records
-                                if status != 'match' and count < 10000:  # Chỉ cho phép drill-down nếu < 10k records
+                                # Drill-down cho các status non-match (không giới hạn số records: chi tiết được phân trang phía server)
+                                if status != 'match':
                                     if st.button(f"🔍 Chi tiết", key=f"drill_{status}", type=button_type, help=f"Xem chi tiết {count} records"):
-                                        # Store drill-down data in session state
-                                        filtered_df = df.filter(pl.col('RECONCILE_STATUS') == status)
-                                        st.session_state.drill_down_data = filtered_df
                                         st.session_state.drill_down_status = status
                                         st.session_state.drill_down_count = count
                                         st.rerun()
@@ -618,23 +809,236 @@ class DashboardApp:
                 
                 with col2:
                     # Biểu đồ pie chart
-                    fig = px.pie(
-                        values=list(reconcile_stats.values()),
-                        names=list(reconcile_stats.keys()),
-                        title="Phân bố Trạng thái Đối soát",
-                        color_discrete_sequence=px.colors.qualitative.Set3
+                    fig = self.charts.pie(
+                        list(reconcile_stats.keys()),
+                        list(reconcile_stats.values()),
+                        "Phân bố Trạng thái Đối soát",
+                        colors=px.colors.qualitative.Set3
                     )
-                    fig.update_traces(textposition='inside', textinfo='percent+label')
-                    fig.update_layout(height=400)
                     st.plotly_chart(fig, use_container_width=True)
                     
-        # Hiển thị drill-down data nếu có
-        if st.session_state.get('drill_down_data') is not None:
-            self.render_drill_down_analysis()
+    
+    @st.fragment
+    def render_time_window_analysis(self):
+        """Match rate / volume / amount theo cửa sổ thời gian trong ngày"""
+        if st.session_state.current_data is None or st.session_state.current_data.is_empty():
+            return
+        
+        df = st.session_state.current_data
+        info = st.session_state.file_info or {}
+        
+        st.markdown("### ⏱️ Đối soát theo cửa sổ thời gian")
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            every = st.selectbox(
+                "Bước thời gian:",
+                options=['5m', '15m', '60m'],
+                index=1,
+                format_func=lambda x: f"{x[:-1]} phút",
+                key="time_window_every"
+            )
+        with col2:
+            period = st.selectbox(
+                "Độ dài cửa sổ (rolling):",
+                options=['5m', '15m', '60m'],
+                index=2,
+                format_func=lambda x: f"{x[:-1]} phút",
+                key="time_window_period"
+            )
+        
+        if info.get('date') and not info.get('date_end'):
+            windows = self.analyzer.load_day_time_windows(self.reader, info['date'], every, period, df=df)
+        else:
+            windows = self.analyzer.analyze_time_windows(df, every, period)
+        
+        if windows.is_empty():
+            st.info("ℹ️ Không có cột thời gian (ORDER_TIME) để phân tích")
+            return
+        
+        fig = self.charts.bar_with_line(
+            windows['window_start'], windows['transaction_count'], windows['match_rate'],
+            f"Match rate theo cửa sổ {period} (bước {every})",
+            bar_name="Số giao dịch", line_name="Match rate %", line_range=[0, 100]
+        )
+        st.plotly_chart(fig, use_container_width=True)
+        
+        # Cửa sổ có match rate thấp nhất
+        worst = windows.filter(pl.col('transaction_count') >= 10).sort('match_rate').head(5)
+        if not worst.is_empty():
+            st.markdown("**📉 Các cửa sổ có match rate thấp nhất:**")
+            st.dataframe(worst.to_pandas(), use_container_width=True, hide_index=True)
+    
+    @st.fragment
+    def render_order_time_series(self):
+        """
+        Amount từng đơn / số đơn theo thời gian của dữ liệu đang xem (ngày hoặc khoảng ngày).
+        Downsample phía server (LTTB hoặc min / max mỗi bucket), zoom vào khoảng thời gian thì truy vấn lại
+        với đủ số điểm trong khoảng đó.
+        """
+        if st.session_state.current_data is None or st.session_state.current_data.is_empty():
+            return
+        
+        series = self.get_panel_input('order_time_series')
+        if series.is_empty():
+            return
+        
+        st.markdown("### 📈 Chuỗi thời gian theo từng đơn")
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            metric = st.radio(
+                "Chỉ số:", ['amount', 'volume'],
+                format_func=lambda x: "Amount từng đơn" if x == 'amount' else "Số đơn",
+                horizontal=True, key="order_series_metric"
+            )
+        with col2:
+            method = st.radio(
+                "Downsample:", DOWNSAMPLE_METHODS,
+                format_func=lambda x: "LTTB" if x == 'lttb' else "Min / max mỗi bucket",
+                horizontal=True, key="order_series_method", disabled=metric == 'volume'
+            )
+        
+        first, last = series['time'][0], series['time'][-1]
+        # Khoảng zoom của dataset cũ không còn hợp lệ khi đổi dữ liệu
+        if st.session_state.get('order_series_span') != (first, last):
+            st.session_state.order_series_span = (first, last)
+            st.session_state.pop('order_series_zoom', None)
+        
+        start, end = first, last
+        if last > first:
+            start, end = st.slider(
+                "🔍 Zoom khoảng thời gian:",
+                min_value=first, max_value=last, value=(first, last),
+                step=timedelta(minutes=1), format="DD/MM HH:mm", key="order_series_zoom"
+            )
+        
+        visible = window(series, start, end)
+        if visible.is_empty():
+            st.info("ℹ️ Không có đơn nào trong khoảng thời gian đã chọn")
+            return
+        
+        if metric == 'volume':
+            counts = bucket_counts(visible, start, end, MAX_CHART_POINTS // 4)
+            fig = self.charts.scatter(
+                counts['time'], counts['count'], "Số đơn theo thời gian",
+                mode='lines', x_title='Thời gian', y_title='Số đơn'
+            )
+            shown = counts.height
+        else:
+            points = downsample_points(visible, 'amount', MAX_CHART_POINTS, method)
+            fig = self.charts.scatter(
+                points['time'], points['amount'], "Amount từng đơn theo thời gian",
+                mode='markers', x_title='Thời gian', y_title='Amount (VND)'
+            )
+            shown = points.height
+        
+        st.plotly_chart(fig, use_container_width=True)
+        st.caption(f"{visible.height:,} đơn trong khoảng, hiển thị {shown:,} điểm")
+    
+    @st.fragment
+    def render_anomaly_analysis(self):
+        """Bất thường thống kê so với lịch sử các ngày trước (z-score / EWMA trên rollup ngày)"""
+        info = st.session_state.file_info or {}
+        if not info.get('date'):
+            return
+        
+        current_day = datetime.strptime(info.get('date_end') or info['date'], '%Y%m%d').date()
+        
+        with st.expander("📈 Bất thường so với lịch sử", expanded=False):
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                lookback_days = st.selectbox("Số ngày lịch sử:", options=[30, 90, 365], index=0, key="anomaly_lookback")
+            with col2:
+                method = st.selectbox(
+                    "Phương pháp:",
+                    options=['zscore', 'ewma'],
+                    format_func=lambda x: "Z-score (cửa sổ 14 ngày)" if x == 'zscore' else "EWMA (span 7 ngày)",
+                    key="anomaly_method"
+                )
+            with col3:
+                z_threshold = st.slider("Ngưỡng |z|:", min_value=2.0, max_value=6.0, value=3.0, step=0.5, key="anomaly_z")
+            
+            if not st.button("🔎 Phân tích bất thường", key="anomaly_run"):
+                st.caption("Lần đầu sẽ tính rollup cho các ngày chưa có cache, các lần sau chỉ đọc rollup đã lưu.")
+                return
+            
+            with st.spinner("Đang đọc rollup các ngày..."):
+                anomalies = self.anomaly_detector.detect_range(
+                    current_day - timedelta(days=lookback_days), current_day,
+                    method=method, z_threshold=z_threshold
+                )
+            
+            today_anomalies = self.anomaly_detector.anomalies_on(anomalies, current_day)
+            if today_anomalies.is_empty():
+                st.success(f"✅ Không có bất thường trong ngày {current_day} (|z| ≥ {z_threshold})")
+            else:
+                for recommendation in self.anomaly_detector.to_recommendations(today_anomalies, limit=10):
+                    st.markdown(f"- {recommendation}")
+            
+            if not anomalies.is_empty():
+                st.markdown(f"**Tất cả bất thường trong {lookback_days} ngày:** {anomalies.height:,}")
+                st.dataframe(anomalies.head(200).to_pandas(), use_container_width=True, hide_index=True)
+    
+    @st.fragment
+    def render_transition_analysis(self):
+        """Chuyển trạng thái RECONCILE_STATUS của cùng ORDER_ID qua các ngày / từ file gốc sang file _2"""
+        info = st.session_state.file_info or {}
+        if not info.get('date'):
+            return
         
-        # Thêm phân tích amount theo service type
-        self.render_amount_analysis_by_service_type()
+        with st.expander("🔁 Chuyển trạng thái qua các ngày", expanded=False):
+            if info.get('date_end'):
+                start_date = datetime.strptime(info['date'], '%Y%m%d').date()
+                end_date = datetime.strptime(info['date_end'], '%Y%m%d').date()
+            else:
+                end_date = datetime.strptime(info['date'], '%Y%m%d').date()
+                lookback_days = st.selectbox("Số ngày trước ngày đang xem:", options=[1, 3, 7, 14, 30], index=2, key="transition_lookback")
+                start_date = end_date - timedelta(days=lookback_days)
+            
+            include_versions = st.checkbox("Tính cả bước file gốc → file _2", value=True, key="transition_versions")
+            
+            if not st.button("🔎 Phân tích chuyển trạng thái", key="transition_run"):
+                st.caption(f"Khoảng: {start_date:%d/%m/%Y} - {end_date:%d/%m/%Y}. Mỗi file chỉ đọc ORDER_ID và RECONCILE_STATUS, index được cache theo ngày.")
+                return
+            
+            with st.spinner("Đang đối chiếu ORDER_ID qua các ngày..."):
+                result = self.transition_tracker.track(start_date, end_date, include_versions)
+            
+            if len(result['steps']) < 2:
+                st.info("ℹ️ Cần ít nhất 2 file trong khoảng ngày để so sánh")
+                return
+            
+            summary = self.transition_tracker.summarize(result)
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                st.metric("📂 Số bước", summary['steps'])
+            with col2:
+                st.metric("✅ Sai lệch tạm thời (→ match)", f"{summary['resolved_transitions']:,}")
+            with col3:
+                st.metric("❌ Chưa giải quyết", f"{summary['unresolved']:,}")
+            with col4:
+                st.metric("⚠️ match → sai lệch", f"{summary['regressed_transitions']:,}")
+            
+            matrix = self.transition_tracker.transition_matrix(result['transitions'])
+            if not matrix.is_empty():
+                to_cols = [col for col in matrix.columns if col != 'from_status']
+                fig = self.charts.heatmap(
+                    matrix.select(to_cols).to_numpy(),
+                    to_cols,
+                    matrix['from_status'],
+                    "Ma trận chuyển trạng thái",
+                    x_title='Trạng thái sau',
+                    y_title='Trạng thái trước'
+                )
+                st.plotly_chart(fig, use_container_width=True)
+            
+            unresolved = self.transition_tracker.unresolved_orders(result['state'])
+            if not unresolved.is_empty():
+                st.markdown(f"**❌ Đơn chưa match ở lần xuất hiện cuối:** {unresolved.height:,}")
+                st.dataframe(unresolved.head(1000).to_pandas(), use_container_width=True, hide_index=True)
     
+    @st.fragment
     def render_amount_analysis_by_service_type(self):
         """Phân tích amount theo service type"""
         if st.session_state.current_data is not None and not st.session_state.current_data.is_empty():
@@ -643,7 +1047,7 @@ class DashboardApp:
             if 'SERVICE_TYPE' in df.columns:
                 st.markdown("### 💰 Phân tích Phí theo Service Type")
                 
-                amount_analysis = self.reader.analyze_amount_by_service_type(df)
+                amount_analysis = self.get_panel_input('amount_by_service_type')
                 
                 if amount_analysis:
                     # Tìm các cột amount có sẵn
@@ -662,18 +1066,15 @@ class DashboardApp:
                                     service_types = list(amount_analysis[amount_col].keys())
                                     total_amounts = [amount_analysis[amount_col][st]['total'] for st in service_types]
                                     
-                                    fig_total = px.bar(
-                                        x=service_types,
-                                        y=total_amounts,
-                                        title=f"Tổng {amount_col.replace('_', ' ').title()} theo Service Type",
-                                        labels={'x': 'Service Type', 'y': 'Tổng Amount (VND)'},
-                                        color=total_amounts,
-                                        color_continuous_scale='viridis'
-                                    )
-                                    fig_total.update_layout(
-                                        height=400,
-                                        xaxis_tickangle=45,
-                                        yaxis_tickformat=',.0f'
+                                    fig_total = self.charts.bar(
+                                        service_types,
+                                        total_amounts,
+                                        f"Tổng {amount_col.replace('_', ' ').title()} theo Service Type",
+                                        x_title='Service Type',
+                                        y_title='Tổng Amount (VND)',
+                                        color_scale='Viridis',
+                                        tick_format=',.0f',
+                                        tick_angle=45
                                     )
                                     st.plotly_chart(fig_total, use_container_width=True)
                                 
@@ -681,18 +1082,15 @@ class DashboardApp:
                                     # Bar chart cho average amount
                                     avg_amounts = [amount_analysis[amount_col][st]['average'] for st in service_types]
                                     
-                                    fig_avg = px.bar(
-                                        x=service_types,
-                                        y=avg_amounts,
-                                        title=f"Trung bình {amount_col.replace('_', ' ').title()} theo Service Type",
-                                        labels={'x': 'Service Type', 'y': 'Trung bình Amount (VND)'},
-                                        color=avg_amounts,
-                                        color_continuous_scale='plasma'
-                                    )
-                                    fig_avg.update_layout(
-                                        height=400,
-                                        xaxis_tickangle=45,
-                                        yaxis_tickformat=',.0f'
+                                    fig_avg = self.charts.bar(
+                                        service_types,
+                                        avg_amounts,
+                                        f"Trung bình {amount_col.replace('_', ' ').title()} theo Service Type",
+                                        x_title='Service Type',
+                                        y_title='Trung bình Amount (VND)',
+                                        color_scale='Plasma',
+                                        tick_format=',.0f',
+                                        tick_angle=45
                                     )
                                     st.plotly_chart(fig_avg, use_container_width=True)
                                 
@@ -732,41 +1130,28 @@ class DashboardApp:
                         if len(available_amount_cols) > 1:
                             st.markdown("### 🔍 So sánh tổng quan giữa các loại Amount")
                             
-                            # Tạo dữ liệu so sánh
-                            comparison_data = []
-                            service_types_all = set()
-                            
-                            # Collect all service types
-                            for amount_col in available_amount_cols:
-                                service_types_all.update(amount_analysis[amount_col].keys())
-                            
-                            service_types_all = list(service_types_all)
-                            
-                            for service_type in service_types_all:
-                                row = {'Service Type': service_type}
-                                for amount_col in available_amount_cols:
-                                    if service_type in amount_analysis[amount_col]:
-                                        row[f'{amount_col.replace("_", " ").title()}'] = amount_analysis[amount_col][service_type]['total']
-                                    else:
-                                        row[f'{amount_col.replace("_", " ").title()}'] = 0
-                                comparison_data.append(row)
+                            # Tổng amount theo service type cho từng loại amount (0 nếu service type không có)
+                            service_types_all = sorted({
+                                service_type for amount_col in available_amount_cols
+                                for service_type in amount_analysis[amount_col].keys()
+                            })
                             
-                            # Create grouped bar chart
-                            comparison_df = pd.DataFrame(comparison_data)
-                            
-                            if not comparison_df.empty:
-                                fig_comparison = px.bar(
-                                    comparison_df,
-                                    x='Service Type',
-                                    y=[col for col in comparison_df.columns if col != 'Service Type'],
-                                    title="So sánh tổng Amount giữa các loại theo Service Type",
-                                    barmode='group',
-                                    labels={'value': 'Amount (VND)', 'variable': 'Amount Type'}
-                                )
-                                fig_comparison.update_layout(
+                            if service_types_all:
+                                fig_comparison = self.charts.grouped_bar(
+                                    service_types_all,
+                                    {
+                                        amount_col.replace('_', ' ').title(): [
+                                            amount_analysis[amount_col].get(service_type, {}).get('total', 0)
+                                            for service_type in service_types_all
+                                        ]
+                                        for amount_col in available_amount_cols
+                                    },
+                                    "So sánh tổng Amount giữa các loại theo Service Type",
+                                    x_title='Service Type',
+                                    y_title='Amount (VND)',
                                     height=500,
-                                    xaxis_tickangle=45,
-                                    yaxis_tickformat=',.0f'
+                                    tick_format=',.0f',
+                                    tick_angle=45
                                 )
                                 st.plotly_chart(fig_comparison, use_container_width=True)
                     
@@ -777,168 +1162,255 @@ class DashboardApp:
             else:
                 st.info("ℹ️ Không có cột SERVICE_TYPE để phân tích")
 
+    def get_merchant_index(self) -> MerchantIndex:
+        """Từ điển merchant + trigram index của dataset đang xem (build một lần cho mỗi dataset)"""
+        df = st.session_state.current_data
+        info = st.session_state.file_info or {}
+        dataset_key = (info.get('date'), info.get('date_end'), df.height)
+        
+        cached = st.session_state.get('merchant_index')
+        if cached is None or cached[0] != dataset_key:
+            cached = (dataset_key, MerchantIndex.from_frame(df))
+            st.session_state.merchant_index = cached
+            st.session_state.merchant_filter_selected = []
+        return cached[1]
+    
+    def render_merchant_filter(self) -> List[str]:
+        """Ô tìm merchant (substring / gần đúng) + chọn nhiều merchant. Trả về ['All'] nếu chưa chọn."""
+        index = self.get_merchant_index()
+        query = st.text_input(
+            f"🏪 Tìm merchant ({len(index):,}):",
+            placeholder="Nhập tên merchant, không cần dấu",
+            key="merchant_search"
+        )
+        
+        selected = st.session_state.get('merchant_filter_selected', [])
+        matches = index.search(query)
+        # Giữ các merchant đã chọn trong options khi đổi từ khóa tìm kiếm
+        options = matches + [name for name in selected if name not in matches]
+        
+        def save_selection():
+            st.session_state.merchant_filter_selected = st.session_state.merchant_filter
+        
+        # Lựa chọn lưu ngoài widget: options đổi theo từ khóa thì widget được tạo lại với đúng các merchant đã chọn
+        st.session_state.merchant_filter = selected
+        st.multiselect(
+            "Merchant:",
+            options=options,
+            placeholder="Tất cả merchant",
+            key="merchant_filter",
+            on_change=save_selection
+        )
+        
+        return selected or ['All']
+    
+    def get_drill_down_stats(self, status: str) -> Dict:
+        """Số liệu nhanh của một status (một lần group trên dữ liệu đang xem, giữ cùng đầu vào các panel)"""
+        df = st.session_state.current_data
+        
+        def compute() -> Dict:
+            exprs = [pl.count().alias('records')]
+            if 'ORDER_ID' in df.columns:
+                exprs.append(pl.col('ORDER_ID').n_unique().alias('orders'))
+            if 'MERCHANT' in df.columns:
+                exprs.append(pl.col('MERCHANT').n_unique().alias('merchants'))
+            if 'AMOUNT' in df.columns:
+                exprs.append(pl.col('AMOUNT').sum().alias('amount'))
+            if 'SERVICE_TYPE' in df.columns:
+                exprs.append(pl.col('SERVICE_TYPE').n_unique().alias('service_types'))
+            return df.lazy().filter(pl.col('RECONCILE_STATUS') == status).select(exprs).collect().row(0, named=True)
+        
+        return self.get_panel_inputs().get(f"drill_down_stats_{status}", compute)
+    
+    def render_facet_counts(self, facets: FacetIndex, selections: Dict[str, List]):
+        """
+        Số records của từng giá trị facet theo các bộ lọc đang chọn (giao bitmap, không đọc dữ liệu dòng):
+        mỗi cột đếm trên bộ lọc của các cột còn lại, merchant chỉ hiện các merchant đã chọn hoặc nhiều records nhất
+        """
+        labels = {
+            'RECONCILE_STATUS': '🔄 Status', 'INSURANCE_STATUS': '🛡️ Insurance', 'SERVICE_TYPE': '🚗 Service Type',
+            'IS_BUSINESS_ORDER': '🏢 Business', 'MERCHANT': '🏪 Merchant'
+        }
+        lines = [f"**🎯 Khớp bộ lọc:** {facets.count(selections):,} records"]
+        for column, counts in facets.all_facet_counts(selections).items():
+            if column == 'MERCHANT' and selections.get('MERCHANT'):
+                items = [(value, counts.get(value, 0)) for value in selections['MERCHANT']]
+            else:
+                items = sorted(((v, c) for v, c in counts.items() if c > 0), key=lambda item: -item[1])[:5]
+            parts = ' · '.join(f"{value}: {count:,}" for value, count in items) or '—'
+            lines.append(f"**{labels[column]}:** {parts}")
+        st.caption('  \n'.join(lines))
+    
+    @st.fragment
     def render_drill_down_analysis(self):
-        """Hiển thị phân tích chi tiết cho status được chọn"""
-        if st.session_state.get('drill_down_data') is None:
+        """
+        Chi tiết các records của status được chọn: view phân trang phía server trên dữ liệu đang xem
+        (lọc status / merchant / service type và sort chạy trong DataPager, chỉ gửi trang đang xem).
+        """
+        status = st.session_state.get('drill_down_status')
+        if status is None or st.session_state.current_data is None:
             return
-            
-        drill_df = st.session_state.drill_down_data
-        status = st.session_state.get('drill_down_status', 'Unknown')
+        
+        df = st.session_state.current_data
         count = st.session_state.get('drill_down_count', 0)
         
         st.markdown("---")
         st.markdown(f"### 🔍 Chi tiết: {status}")
         st.markdown(f"**📊 Tổng số records:** {count:,}")
         
+        pager = st.session_state.get('drill_down_pager')
+        if pager is None or pager.source is not df:
+            pager = DataPager(df)
+            st.session_state.drill_down_pager = pager
+        
         # Header với buttons
         col1, col2, col3 = st.columns([2, 1, 1])
         with col1:
             st.markdown(f"#### Danh sách Order IDs và thông tin chi tiết")
         with col2:
             if st.button("🔙 Quay lại", key="back_to_overview"):
-                # Clear drill-down data
-                del st.session_state.drill_down_data
-                del st.session_state.drill_down_status  
-                del st.session_state.drill_down_count
+                # Clear drill-down state
+                for key in ['drill_down_status', 'drill_down_count', 'drill_down_pager']:
+                    st.session_state.pop(key, None)
                 st.rerun()
+        
+        if count == 0:
+            st.warning("⚠️ Không có dữ liệu để hiển thị")
+            return
+        
+        # Quick stats
+        stats = self.get_drill_down_stats(status)
+        col1, col2, col3, col4 = st.columns(4)
+        
+        with col1:
+            st.metric("🆔 Unique Orders", f"{stats.get('orders', 0):,}")
+        
+        with col2:
+            st.metric("🏪 Merchants", f"{stats.get('merchants', 0):,}")
+        
         with col3:
-            # Export button
-            if not drill_df.is_empty():
-                export_df = drill_df.to_pandas()
-                csv_data = export_df.to_csv(index=False)
-                st.download_button(
-                    label="📥 Export CSV",
-                    data=csv_data,
-                    file_name=f"{status}_details_{st.session_state.selected_date}.csv",
-                    mime="text/csv",
-                    key="export_drill_down"
-                )
+            if stats.get('amount') is not None:
+                st.metric("💰 Total Amount", f"{stats['amount']:,.0f}")
+            else:
+                st.metric("💰 Amount", "N/A")
         
-        if not drill_df.is_empty():
-            # Quick stats
-            col1, col2, col3, col4 = st.columns(4)
-            
-            with col1:
-                unique_orders = drill_df.select('ORDER_ID').n_unique() if 'ORDER_ID' in drill_df.columns else 0
-                st.metric("🆔 Unique Orders", f"{unique_orders:,}")
-            
-            with col2:
-                unique_merchants = drill_df.select('MERCHANT').n_unique() if 'MERCHANT' in drill_df.columns else 0
-                st.metric("🏪 Merchants", f"{unique_merchants:,}")
-            
-            with col3:
-                if 'AMOUNT' in drill_df.columns:
-                    total_amount = drill_df.select(pl.col('AMOUNT').sum()).item()
-                    st.metric("💰 Total Amount", f"{total_amount:,.0f}")
-                else:
-                    st.metric("💰 Amount", "N/A")
-            
-            with col4:
-                if 'SERVICE_TYPE' in drill_df.columns:
-                    service_counts = drill_df.group_by('SERVICE_TYPE').agg(pl.count()).height
-                    st.metric("🚗 Service Types", f"{service_counts}")
-                else:
-                    st.metric("🚗 Service Types", "N/A")
-            
-            # Filters
-            st.markdown("#### 🔧 Bộ lọc")
-            filter_col1, filter_col2, filter_col3 = st.columns(3)
-            
-            # Initialize filter variables
-            selected_merchants = ['All']
-            selected_services = ['All']
-            
-            with filter_col1:
-                # Merchant filter
-                if 'MERCHANT' in drill_df.columns:
-                    merchants = drill_df.select('MERCHANT').unique().to_pandas()['MERCHANT'].tolist()
-                    selected_merchants = st.multiselect(
-                        "🏪 Merchant:",
-                        options=['All'] + merchants,
-                        default=['All'],
-                        key="merchant_filter"
-                    )
-            
-            with filter_col2:
-                # Service type filter
-                if 'SERVICE_TYPE' in drill_df.columns:
-                    service_types = drill_df.select('SERVICE_TYPE').unique().to_pandas()['SERVICE_TYPE'].tolist()
-                    selected_services = st.multiselect(
-                        "🚗 Service Type:",
-                        options=['All'] + service_types,
-                        default=['All'],
-                        key="service_filter"
-                    )
-            
-            with filter_col3:
-                # Show top N records
-                max_records = min(1000, drill_df.height)
-                show_records = st.number_input(
-                    "📊 Hiển thị records:",
-                    min_value=10,
-                    max_value=max_records,
-                    value=min(100, max_records),
-                    step=10,
-                    key="show_records_filter"
+        with col4:
+            st.metric("🚗 Service Types", f"{stats['service_types']}" if 'service_types' in stats else "N/A")
+        
+        # Filters
+        st.markdown("#### 🔧 Bộ lọc")
+        filter_col1, filter_col2, filter_col3 = st.columns(3)
+        
+        # Initialize filter variables
+        facets = self.get_panel_input('facet_index')
+        selected_merchants = ['All']
+        selected_services = ['All']
+        
+        with filter_col1:
+            # Merchant filter: tìm qua trigram index thay vì liệt kê toàn bộ merchant
+            if 'MERCHANT' in df.columns:
+                selected_merchants = self.render_merchant_filter()
+        
+        with filter_col2:
+            # Service type filter
+            if 'SERVICE_TYPE' in df.columns:
+                selected_services = st.multiselect(
+                    "🚗 Service Type:",
+                    options=['All'] + facets.values('SERVICE_TYPE'),
+                    default=['All'],
+                    key="service_filter"
                 )
-            
-            # Apply filters
-            filtered_df = drill_df
-            
-            if 'MERCHANT' in drill_df.columns and 'All' not in selected_merchants:
-                filtered_df = filtered_df.filter(pl.col('MERCHANT').is_in(selected_merchants))
-            
-            if 'SERVICE_TYPE' in drill_df.columns and 'All' not in selected_services:
-                filtered_df = filtered_df.filter(pl.col('SERVICE_TYPE').is_in(selected_services))
-            
-            # Display filtered data
-            if not filtered_df.is_empty():
-                st.markdown(f"#### 📋 Dữ liệu chi tiết ({filtered_df.height:,} records)")
-                
-                # Convert to pandas for display
-                display_df = filtered_df.head(show_records).to_pandas()
-                
-                # Select important columns for display
-                important_cols = []
-                available_cols = display_df.columns.tolist()
-                
-                # Priority columns
-                priority_cols = ['ORDER_ID', 'MERCHANT', 'AMOUNT', 'SERVICE_TYPE', 'RECONCILE_STATUS', 
-                               'INSURANCE_STATUS', 'IS_BUSINESS_ORDER', 'ORDER_TIME', 'CREATED_TIME']
-                
-                for col in priority_cols:
-                    if col in available_cols:
-                        important_cols.append(col)
-                
-                # Add remaining columns
-                for col in available_cols:
-                    if col not in important_cols:
-                        important_cols.append(col)
-                
-                # Reorder dataframe
-                display_df = display_df[important_cols]
-                
-                # Display with pagination-like behavior
-                st.dataframe(
-                    display_df,
-                    use_container_width=True,
-                    height=400,
-                    column_config={
-                        "ORDER_ID": st.column_config.TextColumn("Order ID", width="medium"),
-                        "AMOUNT": st.column_config.NumberColumn("Amount", format="%.0f"),
-                        "ORDER_TIME": st.column_config.DatetimeColumn("Order Time"),
-                        "CREATED_TIME": st.column_config.DatetimeColumn("Created Time"),
-                    }
+        
+        with filter_col3:
+            page_size = st.selectbox("📊 Số records mỗi trang:", PAGE_SIZES, key="drill_down_page_size")
+        
+        filter_col4, filter_col5 = st.columns(2)
+        with filter_col4:
+            selected_insurance = st.multiselect(
+                "🛡️ Insurance Status:",
+                options=facets.values('INSURANCE_STATUS'),
+                placeholder="Tất cả",
+                key="insurance_filter"
+            ) if 'INSURANCE_STATUS' in facets.columns else []
+        with filter_col5:
+            selected_business = st.multiselect(
+                "🏢 Business Order:",
+                options=facets.values('IS_BUSINESS_ORDER'),
+                placeholder="Tất cả",
+                key="business_filter"
+            ) if 'IS_BUSINESS_ORDER' in facets.columns else []
+        
+        sort_col1, sort_col2 = st.columns([3, 1])
+        with sort_col1:
+            sort_by = st.selectbox("Sắp xếp theo:", ['(Thứ tự gốc)'] + df.columns, key="drill_down_sort")
+        with sort_col2:
+            descending = st.checkbox("Giảm dần", key="drill_down_descending")
+        
+        # Lọc + sort phía server, chỉ tính lại khi status / bộ lọc / sort thay đổi
+        where = {'RECONCILE_STATUS': [status]}
+        if selected_merchants and 'All' not in selected_merchants:
+            where['MERCHANT'] = selected_merchants
+        if selected_services and 'All' not in selected_services:
+            where['SERVICE_TYPE'] = selected_services
+        if selected_insurance:
+            where['INSURANCE_STATUS'] = selected_insurance
+        if selected_business:
+            where['IS_BUSINESS_ORDER'] = selected_business
+        
+        self.render_facet_counts(facets, where)
+        
+        total_rows = pager.set_view(None if sort_by == '(Thứ tự gốc)' else sort_by, descending, where=where)
+        
+        view_key = (id(df), pager.view_key)
+        if st.session_state.get('drill_down_view') != view_key:
+            st.session_state.drill_down_view = view_key
+            st.session_state.drill_down_row = 1
+        
+        with col3:
+            # Export toàn bộ view (đã lọc / sort) theo từng cửa sổ của pager
+            if total_rows > 0:
+                render_export(
+                    lambda: pager.chunks(EXPORT_CHUNK_ROWS),
+                    f"{status}_details_{st.session_state.selected_date}",
+                    "export_drill_down",
+                    version=view_key
                 )
-                
-                # Summary info
-                st.info(f"📝 Hiển thị {len(display_df):,} trong tổng số {filtered_df.height:,} records (sau khi lọc)")
-                
-            else:
-                st.warning("⚠️ Không có dữ liệu sau khi áp dụng bộ lọc")
-        else:
-            st.warning("⚠️ Không có dữ liệu để hiển thị")
+        
+        if total_rows == 0:
+            st.warning("⚠️ Không có dữ liệu sau khi áp dụng bộ lọc")
+            return
+        
+        st.markdown(f"#### 📋 Dữ liệu chi tiết ({total_rows:,} records)")
+        render_pager_navigation(total_rows, page_size, "drill_down_row")
+        
+        # Priority columns trước, các cột còn lại sau
+        priority_cols = ['ORDER_ID', 'MERCHANT', 'AMOUNT', 'SERVICE_TYPE', 'RECONCILE_STATUS',
+                         'INSURANCE_STATUS', 'IS_BUSINESS_ORDER', 'ORDER_TIME', 'CREATED_TIME']
+        ordered_cols = [col for col in priority_cols if col in df.columns] + \
+            [col for col in df.columns if col not in priority_cols]
+        
+        start_row = min(st.session_state.drill_down_row, total_rows)
+        page = pager.page(start_row - 1, page_size).select(ordered_cols)
+        
+        st.dataframe(
+            page.to_arrow(),
+            use_container_width=True,
+            height=400,
+            column_config={
+                "ORDER_ID": st.column_config.TextColumn("Order ID", width="medium"),
+                "AMOUNT": st.column_config.NumberColumn("Amount", format="%.0f"),
+                "ORDER_TIME": st.column_config.DatetimeColumn("Order Time"),
+                "CREATED_TIME": st.column_config.DatetimeColumn("Created Time"),
+            }
+        )
+        
+        # Summary info
+        st.info(
+            f"📝 Hiển thị records {start_row:,}-{start_row + page.height - 1:,} "
+            f"trong tổng số {total_rows:,} records (sau khi lọc)"
+        )
     
+    @st.fragment
     def render_insurance_analysis(self):
         """Phân tích INSURANCE_STATUS"""
         if st.session_state.current_data is not None and not st.session_state.current_data.is_empty():
@@ -947,19 +1419,18 @@ class DashboardApp:
             if 'INSURANCE_STATUS' in df.columns:
                 st.markdown("## 🛡️ Phân tích Bảo hiểm (INSURANCE_STATUS)")
                 
-                insurance_stats = self.reader.analyze_insurance_status(df)
+                insurance_stats = self.get_panel_input('insurance_stats')
                 
                 if insurance_stats:
                     # Biểu đồ bar chart
-                    fig = px.bar(
-                        x=list(insurance_stats.keys()),
-                        y=list(insurance_stats.values()),
-                        title="Phân bố Trạng thái Bảo hiểm",
-                        labels={'x': 'Insurance Status', 'y': 'Số lượng'},
-                        color=list(insurance_stats.values()),
-                        color_continuous_scale='viridis'
+                    fig = self.charts.bar(
+                        list(insurance_stats.keys()),
+                        list(insurance_stats.values()),
+                        "Phân bố Trạng thái Bảo hiểm",
+                        x_title='Insurance Status',
+                        y_title='Số lượng',
+                        color_scale='Viridis'
                     )
-                    fig.update_layout(height=400)
                     st.plotly_chart(fig, use_container_width=True)
                     
                     # Bảng thống kê
@@ -972,6 +1443,7 @@ class DashboardApp:
                         insurance_df['Tỷ lệ %'] = (insurance_df['Số lượng'] / insurance_df['Số lượng'].sum() * 100).round(2)
                         st.dataframe(insurance_df, use_container_width=True)
     
+    @st.fragment
     def render_business_analysis(self):
         """Phân tích Business Orders"""
         if st.session_state.current_data is not None and not st.session_state.current_data.is_empty():
@@ -980,7 +1452,7 @@ class DashboardApp:
             if 'IS_BUSINESS_ORDER' in df.columns:
                 st.markdown("### 🏢 Phân tích Business Orders")
                 
-                business_stats = self.reader.analyze_business_orders(df)
+                business_stats = self.get_panel_input('business_stats')
                 
                 if business_stats:
                     col1, col2 = st.columns([1, 1])
@@ -999,14 +1471,13 @@ class DashboardApp:
                                 clean_labels.append(f'Unknown ({label})')
                             clean_values.append(value)
                         
-                        fig = px.pie(
-                            values=clean_values,
-                            names=clean_labels,
-                            title="Phân bố Business vs Non-Business",
-                            color_discrete_sequence=['#FF9999', '#66B2FF', '#99FF99']
+                        fig = self.charts.pie(
+                            clean_labels,
+                            clean_values,
+                            "Phân bố Business vs Non-Business",
+                            colors=['#FF9999', '#66B2FF', '#99FF99'],
+                            height=350
                         )
-                        fig.update_traces(textposition='inside', textinfo='percent+label')
-                        fig.update_layout(height=350)
                         st.plotly_chart(fig, use_container_width=True)
                     
                     with col2:
@@ -1028,6 +1499,7 @@ class DashboardApp:
                         st.metric("📈 Tỷ lệ Business", f"{business_rate:.1f}%")
                         st.metric("📝 Tổng đơn hàng", f"{total_orders:,}")
     
+    @st.fragment
     def render_service_type_analysis(self):
         """Phân tích Service Type (Ride/Express)"""
         if st.session_state.current_data is not None and not st.session_state.current_data.is_empty():
@@ -1036,24 +1508,22 @@ class DashboardApp:
             if 'SERVICE_TYPE' in df.columns:
                 st.markdown("### 🚗 Phân tích Service Type")
                 
-                service_stats = self.reader.analyze_service_type(df)
+                service_stats = self.get_panel_input('service_stats')
                 
                 if service_stats:
                     col1, col2 = st.columns([1, 1])
                     
                     with col1:
                         # Bar chart cho service types
-                        fig = px.bar(
-                            x=list(service_stats.keys()),
-                            y=list(service_stats.values()),
-                            title="Phân bố theo Service Type",
-                            labels={'x': 'Service Type', 'y': 'Số lượng'},
-                            color=list(service_stats.values()),
-                            color_discrete_sequence=['#FF6B6B', '#4ECDC4', '#45B7D1', '#96CEB4']
-                        )
-                        fig.update_layout(
+                        fig = self.charts.bar(
+                            list(service_stats.keys()),
+                            list(service_stats.values()),
+                            "Phân bố theo Service Type",
+                            x_title='Service Type',
+                            y_title='Số lượng',
+                            color_scale='Plasma',
                             height=350,
-                            xaxis_tickangle=45
+                            tick_angle=45
                         )
                         st.plotly_chart(fig, use_container_width=True)
                     
@@ -1079,6 +1549,7 @@ class DashboardApp:
                         if unknown_count > 0:
                             st.metric("❓ Không xác định", f"{unknown_count:,}")
 
+    @st.fragment
     def render_order_search(self):
         """Tìm kiếm Order ID đặc biệt"""
         st.markdown("## 🔍 Tìm kiếm Order ID đặc biệt")
@@ -1091,72 +1562,175 @@ class DashboardApp:
                 placeholder="01Z1ABCD123\n01Z2EFGH456\n01Z3IJKL789",
                 height=100
             )
+            uploaded_file = st.file_uploader(
+                "Hoặc tải file danh sách Order ID (CSV / TXT / XLSX):",
+                type=ORDER_ID_FILE_TYPES,
+                key="order_ids_file"
+            )
         
         with col2:
+            year = st.session_state.get('year_selector', datetime.now().year)
+            month = st.session_state.get('month_selector', datetime.now().month)
+            scope = st.radio(
+                "Phạm vi:",
+                options=['loaded', 'ulid', 'month', 'year'],
+                format_func=lambda x: {
+                    'loaded': "Dữ liệu đang xem",
+                    'ulid': "Theo ngày tạo trong Order ID",
+                    'month': f"Cả tháng {month:02d}/{year}",
+                    'year': f"Cả năm {year}"
+                }[x],
+                key="order_search_scope"
+            )
             search_button = st.button("🔍 Tìm kiếm", type="primary")
         
+        if search_button and uploaded_file is not None and st.session_state.current_data is not None:
+            self.render_bulk_order_search(uploaded_file, scope, year, month)
+            return
+        
         if search_button and order_ids_input and st.session_state.current_data is not None:
             order_ids = [id.strip() for id in order_ids_input.split('\n') if id.strip()]
             
             if order_ids:
                 with st.spinner("Đang tìm kiếm..."):
-                    results = self.reader.find_special_orders(st.session_state.current_data, order_ids)
-                    
-                    if not results.is_empty():
-                        st.success(f"✅ Tìm thấy {results.height} bản ghi")
-                        
-                        # Chuyển đổi sang pandas để hiển thị
-                        results_pd = results.to_pandas()
-                        
-                        # Hiển thị kết quả
-                        st.dataframe(results_pd, use_container_width=True)
-                        
-                        # Download CSV
-                        csv = results_pd.to_csv(index=False)
-                        st.download_button(
-                            label="📥 Tải xuống CSV",
-                            data=csv,
-                            file_name=f"special_orders_{st.session_state.selected_date}.csv",
-                            mime="text/csv"
-                        )
+                    if scope == 'loaded':
+                        # Dữ liệu một ngày thì tra index ORDER_ID của ngày, dữ liệu nhiều ngày thì lọc trực tiếp
+                        info = st.session_state.file_info or {}
+                        date_str = info.get('date') if not info.get('date_end') else None
+                        results = self.reader.find_special_orders(st.session_state.current_data, order_ids, date_str)
                     else:
+                        # Order ID dạng ULID đi thẳng tới ngày tạo, Bloom filter mỗi ngày loại các ngày không chứa ID
+                        if scope == 'ulid':
+                            start_date, end_date = None, None
+                        elif scope == 'month':
+                            start_date, end_date = date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+                        else:
+                            start_date, end_date = date(year, 1, 1), date(year, 12, 31)
+                        search = self.order_index.search(order_ids, start_date, end_date)
+                        results = search['results']
+                        st.caption(f"📂 Đã đọc {search['days_scanned']}/{search['days_checked']} ngày có dữ liệu")
+                        if search['unroutable']:
+                            st.caption(f"Không đọc được ngày tạo (không phải ULID), chọn tháng / năm để tìm: {', '.join(search['unroutable'][:20])}")
+                        if search['not_found']:
+                            st.caption(f"Không tìm thấy: {', '.join(search['not_found'][:20])}")
+                    
+                    # Giữ kết quả trong session: nút export chạy lại script sau khi bấm Tìm kiếm
+                    st.session_state.order_search_results = (
+                        SearchResult(results, st.session_state.current_data) if not results.is_empty() else None
+                    )
+                    if results.is_empty():
                         st.warning("⚠️ Không tìm thấy Order ID nào")
+        
+        stored = st.session_state.get('order_search_results')
+        if stored is not None and not stored.belongs_to(st.session_state.current_data):
+            # Đã tải ngày / khoảng ngày khác: bỏ kết quả của dữ liệu cũ
+            stored = st.session_state.order_search_results = None
+        if stored is not None:
+            results = stored.frame
+            st.success(f"✅ Tìm thấy {results.height} bản ghi")
+            
+            # Hiển thị kết quả
+            st.dataframe(results.to_arrow(), use_container_width=True)
+            
+            # Export (CSV / CSV gzip / Parquet)
+            render_export(
+                lambda: frame_chunks(results),
+                f"special_orders_{st.session_state.selected_date}",
+                "order_search_export",
+                version=stored.token
+            )
+    
+    def render_bulk_order_search(self, uploaded_file, scope: str, year: int, month: int):
+        """Tìm hàng loạt Order ID từ file upload bằng semi-join / anti-join"""
+        order_ids = read_order_id_file(uploaded_file)
+        if order_ids is None:
+            return
+        
+        with st.spinner(f"Đang tìm {order_ids.height:,} Order ID..."):
+            if scope == 'loaded':
+                result = self.bulk_search.search_frame(st.session_state.current_data, order_ids)
+            else:
+                if scope == 'ulid':
+                    date_range = self.bulk_search.ulid_date_range(order_ids)
+                    if date_range is None:
+                        st.warning("⚠️ Không có Order ID dạng ULID, chọn tháng / năm để tìm")
+                        return
+                elif scope == 'month':
+                    date_range = (date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1]))
+                else:
+                    date_range = (date(year, 1, 1), date(year, 12, 31))
+                st.caption(f"📅 Khoảng tìm: {date_range[0]:%d/%m/%Y} - {date_range[1]:%d/%m/%Y}")
+                result = self.bulk_search.search_range(date_range[0], date_range[1], order_ids)
+        
+        render_bulk_results(result, f"bulk_orders_{st.session_state.selected_date or 'range'}", "bulk")
     
+    @st.fragment
     def render_data_viewer(self):
-        """Hiển thị dữ liệu thô"""
+        """Hiển thị dữ liệu thô (phân trang phía server: sort / lọc trên toàn bộ dữ liệu, chỉ gửi trang đang xem)"""
         if st.session_state.current_data is not None and not st.session_state.current_data.is_empty():
             st.markdown("## 👁️ Xem dữ liệu thô")
             
             df = st.session_state.current_data
+            pager = st.session_state.get('data_pager')
+            if pager is None or pager.source is not df:
+                pager = DataPager(df)
+                st.session_state.data_pager = pager
             
-            col1, col2, col3 = st.columns(3)
+            col1, col2, col3 = st.columns([2, 1, 1])
             
             with col1:
-                show_rows = st.number_input("Số dòng hiển thị:", min_value=10, max_value=1000, value=100)
+                sort_by = st.selectbox("Sắp xếp theo:", ['(Thứ tự gốc)'] + df.columns, key="data_viewer_sort")
             
             with col2:
-                if st.button("🔄 Làm mới"):
-                    st.rerun()
+                descending = st.checkbox("Giảm dần", key="data_viewer_descending")
+            
+            with col3:
+                page_size = st.selectbox("Số dòng mỗi trang:", PAGE_SIZES, key="data_viewer_page_size")
+            
+            with st.expander("🔎 Lọc theo cột"):
+                st.caption("Cột chữ: chứa chuỗi (không phân biệt hoa thường). Cột số / ngày: `>100`, `<=5`, `!=0`, `2025-07-01`")
+                filter_columns = st.multiselect("Cột cần lọc:", df.columns, key="data_viewer_filter_columns")
+                filters = {
+                    col: st.text_input(f"{col}:", key=f"data_viewer_filter_{col}")
+                    for col in filter_columns
+                }
+            
+            sort_column = None if sort_by == '(Thứ tự gốc)' else sort_by
+            total_rows = pager.set_view(sort_column, descending, filters)
+            
+            # Về đầu view khi đổi dữ liệu / sort / bộ lọc
+            view_key = (id(df), pager.view_key)
+            if st.session_state.get('data_viewer_view') != view_key:
+                st.session_state.data_viewer_view = view_key
+                st.session_state.data_viewer_row = 1
             
-            # Hiển thị sample data
-            sample_data = df.head(show_rows).to_pandas()
-            st.dataframe(sample_data, use_container_width=True, height=400)
+            render_pager_navigation(total_rows, page_size, "data_viewer_row")
+            
+            start_row = min(st.session_state.data_viewer_row, max(total_rows, 1))
+            if total_rows == 0:
+                st.info("ℹ️ Không có dòng nào khớp bộ lọc")
+            else:
+                st.dataframe(pager.page_arrow(start_row - 1, page_size), use_container_width=True, height=400)
+                end_row = min(start_row + page_size - 1, total_rows)
+                st.caption(
+                    f"Dòng {start_row:,}–{end_row:,} / {total_rows:,}"
+                    + (f" (lọc từ {df.height:,})" if total_rows != df.height else "")
+                )
             
             # Thông tin cột
             with st.expander("📋 Thông tin các cột"):
-                cols_info = []
-                for col in df.columns:
-                    null_count = df.select(pl.col(col).is_null().sum()).item()
-                    data_type = str(df.select(pl.col(col)).dtypes[0])
-                    cols_info.append({
-                        'Cột': col,
-                        'Kiểu dữ liệu': data_type,
-                        'Giá trị null': null_count,
-                        'Tỷ lệ null %': f"{(null_count/df.height*100):.2f}%"
-                    })
-                
-                cols_df = pd.DataFrame(cols_info)
-                st.dataframe(cols_df, use_container_width=True)
+                profile = self.get_panel_input('column_profile')
+                cols_df = profile.select([
+                    pl.col('column').alias('Cột'),
+                    pl.col('dtype').alias('Kiểu dữ liệu'),
+                    pl.col('null_count').alias('Giá trị null'),
+                    pl.col('null_pct').round(2).alias('Tỷ lệ null %'),
+                    pl.col('distinct_estimate').alias('Số giá trị khác nhau (ước lượng)'),
+                    pl.col('min').alias('Min'),
+                    pl.col('max').alias('Max'),
+                    pl.col('top_values').alias('Giá trị phổ biến')
+                ])
+                st.dataframe(cols_df.to_arrow(), use_container_width=True)
     
     def run(self):
         """Chạy dashboard"""
@@ -1166,28 +1740,38 @@ class DashboardApp:
         # Main content
         if st.session_state.current_data is not None:
             self.render_file_info()
+            self.render_version_diff()
             self.render_summary_stats()
             
-            # Tabs cho các phân tích khác nhau
-            tab1, tab2, tab3, tab4 = st.tabs([
-                "🔄 Đối soát", 
-                "🛡️ Bảo hiểm", 
-                "🔍 Tìm kiếm", 
-                "👁️ Dữ liệu thô"
-            ])
+            # Chỉ render view đang chọn (st.tabs chạy tất cả các tab mỗi lần rerun),
+            # đầu vào của các view còn lại được tính nền khi giao diện rảnh
+            view = st.radio(
+                "View:",
+                ["🔄 Đối soát", "🛡️ Bảo hiểm", "🔍 Tìm kiếm", "👁️ Dữ liệu thô"],
+                horizontal=True,
+                label_visibility="collapsed",
+                key="active_view"
+            )
             
-            with tab1:
+            if view == "🔄 Đối soát":
                 self.render_reconcile_analysis()
-            
-            with tab2:
+                # Drill-down (nếu có) và phân tích amount là các fragment riêng
+                self.render_drill_down_analysis()
+                self.render_amount_analysis_by_service_type()
+                self.render_time_window_analysis()
+                self.render_order_time_series()
+                self.render_anomaly_analysis()
+                self.render_transition_analysis()
+            
+            elif view == "🛡️ Bảo hiểm":
                 self.render_insurance_analysis()
                 self.render_business_analysis()
                 self.render_service_type_analysis()
             
-            with tab3:
+            elif view == "🔍 Tìm kiếm":
                 self.render_order_search()
             
-            with tab4:
+            else:
                 self.render_data_viewer()
         
         else:
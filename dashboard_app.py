@@ -2,9 +2,19 @@ import streamlit as st
 import pandas as pd
 import polars as pl
 import plotly.express as px
-from datetime import datetime
+from datetime import date, datetime
 import os
 from csv_reader import CSVDataReader
+from bulk_search import ORDER_ID_FILE_TYPES, BulkOrderSearch
+from ui_components import file_date_label, range_too_large_message, read_order_id_file, render_bulk_results
+from panel_cache import PanelInputCache
+from chart_builder import ChartBuilder
+from typing import Callable, Dict, Optional
+
+# Các tên có thể có của cột RECONCILE_STATUS
+RECONCILE_COLUMN_CANDIDATES = ['RECONCILE_STATUS', 'Reconcile Status', 'RECONCILE STATUS', 'RECONCILE', 'GSM_ORDER_RECONCILE', 'GSM_ORDE_RECONCILE', 'RECONCILE_STAT']
+# Các cột amount phân tích theo service type
+SERVICE_AMOUNT_COLUMNS = ['AMOUNT', 'GSM_AMOUNT', 'MERCHANT_AMOUNT', 'RECONCILED_AMOUNT']
 
 # Cấu hình trang
 st.set_page_config(
@@ -46,6 +56,7 @@ header {visibility: hidden;}
 class DashboardApp:
     def __init__(self):
         self.reader = CSVDataReader()
+        self.charts = ChartBuilder()
         self.init_session_state()
     
     def init_session_state(self):
@@ -156,6 +167,22 @@ class DashboardApp:
                 - ⭐ = Có file version 2
                 """)
             
+            # Chế độ khoảng ngày
+            st.markdown("---")
+            st.markdown("### 📆 Phân tích nhiều ngày")
+            date_range = st.date_input(
+                "Khoảng ngày:",
+                value=(date(year, month, 1), date(year, month, 7)),
+                format="DD/MM/YYYY",
+                key="app_range_selector"
+            )
+            if st.button("📥 Tải khoảng ngày", key="app_load_range_btn"):
+                if isinstance(date_range, (list, tuple)) and len(date_range) == 2:
+                    self.load_range_data(date_range[0], date_range[1])
+                    st.rerun()
+                else:
+                    st.warning("⚠️ Chọn đủ ngày bắt đầu và ngày kết thúc")
+            
             # Message area
             if st.session_state.load_message:
                 st.sidebar.info(st.session_state.load_message)
@@ -267,6 +294,57 @@ class DashboardApp:
             print(f"DEBUG: Error loading data: {e}")
             st.session_state.load_message = f"❌ Lỗi khi tải dữ liệu: {e}"
     
+    def load_range_data(self, start_date: date, end_date: date):
+        try:
+            range_label = f"{start_date:%d/%m/%Y} - {end_date:%d/%m/%Y}"
+            
+            # Khoảng quá lớn thì giữ nguyên dữ liệu đang xem
+            reconciled_info = self.reader.get_range_info(start_date, end_date, 'reconciled')
+            taixe_info = self.reader.get_range_info(start_date, end_date, 'taixe')
+            for range_info in (reconciled_info, taixe_info):
+                if range_info['too_large']:
+                    st.session_state.load_message = range_too_large_message(range_info)
+                    return
+            
+            # Clear previous data
+            st.session_state.current_data = None
+            st.session_state.taixe_data = None
+            st.session_state.file_info = None
+            st.session_state.taixe_file_info = None
+            st.session_state.selected_date = None
+            
+            # Reconciliation và tài xế: mỗi loại một streaming query trên các ngày trong khoảng
+            if reconciled_info['files']:
+                df = self.reader.load_date_range(start_date, end_date, 'reconciled')
+                if not df.is_empty():
+                    st.session_state.current_data = df
+                    st.session_state.file_info = {
+                        'date': reconciled_info['start_date'],
+                        'date_end': reconciled_info['end_date'],
+                        'reconciled_files': reconciled_info['files'],
+                        'reconciled_size_mb': reconciled_info['size_mb']
+                    }
+            
+            if taixe_info['files']:
+                taixe_df = self.reader.load_date_range(start_date, end_date, 'taixe')
+                if not taixe_df.is_empty():
+                    st.session_state.taixe_data = taixe_df
+                    st.session_state.taixe_file_info = {
+                        'date': taixe_info['start_date'],
+                        'date_end': taixe_info['end_date'],
+                        'taixe_files': taixe_info['files'],
+                        'taixe_size_mb': taixe_info['size_mb']
+                    }
+            
+            if st.session_state.current_data is None and st.session_state.taixe_data is None:
+                st.session_state.load_message = f"⚠️ Không có dữ liệu trong khoảng {range_label}"
+            else:
+                st.session_state.load_message = f"✅ Đã tải dữ liệu {len(reconciled_info['days'])} ngày ({range_label})"
+            
+        except Exception as e:
+            print(f"DEBUG: Error loading range: {e}")
+            st.session_state.load_message = f"❌ Lỗi khi tải dữ liệu: {e}"
+    
     def render_launcher(self):
         st.markdown("### 🎯 Chọn dashboard để phân tích dữ liệu PVI-GSM")
         
@@ -412,9 +490,12 @@ class DashboardApp:
             col1, col2, col3, col4 = st.columns(4)
             
             with col1:
-                st.metric("📅 Ngày", info['date'])
+                st.metric("📅 Ngày", file_date_label(info))
             with col2:
-                st.metric("📄 File", os.path.basename(info['reconciled_file']))
+                if info.get('reconciled_files'):
+                    st.metric("📄 File", f"{len(info['reconciled_files'])} file")
+                else:
+                    st.metric("📄 File", os.path.basename(info['reconciled_file']))
             with col3:
                 st.metric("📊 Size", f"{info['reconciled_size_mb']:.1f} MB")
             with col4:
@@ -444,27 +525,68 @@ class DashboardApp:
             else:
                 st.metric("💰 Total", "N/A")
         
-        # Analysis tabs
-        tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(["🔄 Đối soát", "🛡️ Bảo hiểm", "🏢 Business", "🚗 Service Type", "🔍 Tìm kiếm", "👁️ Dữ liệu"])
+        # Chỉ render view đang chọn (st.tabs chạy tất cả các tab mỗi lần rerun),
+        # đầu vào của các view còn lại được tính nền khi giao diện rảnh
+        view = st.radio(
+            "View:",
+            ["🔄 Đối soát", "🛡️ Bảo hiểm", "🏢 Business", "🚗 Service Type", "🔍 Tìm kiếm", "👁️ Dữ liệu"],
+            horizontal=True,
+            label_visibility="collapsed",
+            key="app_active_view"
+        )
         
-        with tab1:
+        if view == "🔄 Đối soát":
             self.render_reconcile_analysis(df)
-        
-        with tab2:
+        elif view == "🛡️ Bảo hiểm":
             self.render_insurance_analysis(df)
-        
-        with tab3:
+        elif view == "🏢 Business":
             self.render_business_analysis(df)
-        
-        with tab4:
+        elif view == "🚗 Service Type":
             self.render_service_type_analysis(df)
-        
-        with tab5:
+        elif view == "🔍 Tìm kiếm":
             self.render_search_orders(df)
-        
-        with tab6:
+        else:
             self.render_data_viewer(df)
     
+    @staticmethod
+    def find_reconcile_column(df) -> Optional[str]:
+        """Cột RECONCILE_STATUS trong dữ liệu (theo các tên có thể có)"""
+        return next((col for col in RECONCILE_COLUMN_CANDIDATES if col in df.columns), None)
+    
+    @staticmethod
+    def count_by(df, col: str) -> pl.DataFrame:
+        return df.group_by(col).agg(pl.count().alias('count')).sort('count', descending=True)
+    
+    def panel_input_tasks(self, df) -> Dict[str, Callable]:
+        """Các kết quả tổng hợp đầu vào của từng view (tên -> hàm tính), tính khi view cần lần đầu"""
+        tasks = {}
+        reconcile_col = self.find_reconcile_column(df)
+        if reconcile_col:
+            tasks['reconcile_stats'] = lambda: self.count_by(df, reconcile_col)
+        for name, col in [('insurance_stats', 'INSURANCE_STATUS'), ('business_stats', 'IS_BUSINESS_ORDER'), ('service_stats', 'SERVICE_TYPE')]:
+            if col in df.columns:
+                tasks[name] = lambda col=col: self.count_by(df, col)
+        if 'SERVICE_TYPE' in df.columns:
+            for amount_col in [col for col in SERVICE_AMOUNT_COLUMNS if col in df.columns]:
+                tasks[f"amount_by_service_type_{amount_col}"] = lambda amount_col=amount_col: df.group_by('SERVICE_TYPE').agg([
+                    pl.col(amount_col).sum().alias('total'),
+                    pl.col(amount_col).mean().alias('average'),
+                    pl.count().alias('count')
+                ]).sort('total', descending=True)
+        return tasks
+    
+    def get_panel_inputs(self, df) -> PanelInputCache:
+        """Cache đầu vào các view của dữ liệu đang xem (tạo mới khi đổi dữ liệu)"""
+        cache = st.session_state.get('app_panel_inputs')
+        if cache is None or cache.data is not df:
+            cache = PanelInputCache(df)
+            st.session_state.app_panel_inputs = cache
+        return cache
+    
+    def get_panel_input(self, df, name: str):
+        """Kết quả tổng hợp đầu vào của view, tính một lần cho dữ liệu đang xem"""
+        return self.get_panel_inputs(df).get(name, self.panel_input_tasks(df)[name])
+    
     def render_taixe_dashboard(self):
         if st.session_state.taixe_data is None:
             st.warning("⚠️ **Chưa có dữ liệu tài xế!** Vui lòng:")
@@ -496,9 +618,12 @@ class DashboardApp:
             col1, col2, col3, col4 = st.columns(4)
             
             with col1:
-                st.metric("📅 Ngày", info['date'])
+                st.metric("📅 Ngày", file_date_label(info))
             with col2:
-                st.metric("📄 File", os.path.basename(info['taixe_file']))
+                if info.get('taixe_files'):
+                    st.metric("📄 File", f"{len(info['taixe_files'])} file")
+                else:
+                    st.metric("📄 File", os.path.basename(info['taixe_file']))
             with col3:
                 st.metric("📊 Size", f"{info['taixe_size_mb']:.1f} MB")
             with col4:
@@ -538,20 +663,12 @@ class DashboardApp:
     
     def render_reconcile_analysis(self, df):
         # Tìm cột RECONCILE_STATUS với các tên có thể có
-        reconcile_col = None
-        possible_reconcile_cols = ['RECONCILE_STATUS', 'Reconcile Status', 'RECONCILE STATUS', 'RECONCILE', 'GSM_ORDER_RECONCILE', 'GSM_ORDE_RECONCILE', 'RECONCILE_STAT']
-        
-        for col in possible_reconcile_cols:
-            if col in df.columns:
-                reconcile_col = col
-                break
+        reconcile_col = self.find_reconcile_column(df)
         
         if reconcile_col:
             st.success(f"✅ Tìm thấy cột: **{reconcile_col}**")
             
-            reconcile_stats = df.group_by(reconcile_col).agg(
-                pl.count().alias('count')
-            ).sort('count', descending=True)
+            reconcile_stats = self.get_panel_input(df, 'reconcile_stats')
             
             col1, col2 = st.columns([1, 1])
             
@@ -629,9 +746,7 @@ class DashboardApp:
         
     def render_insurance_analysis(self, df):
         if 'INSURANCE_STATUS' in df.columns:
-            insurance_stats = df.group_by('INSURANCE_STATUS').agg(
-                pl.count().alias('count')
-            ).sort('count', descending=True)
+            insurance_stats = self.get_panel_input(df, 'insurance_stats')
 
             fig = px.bar(
                 insurance_stats.to_pandas(),
@@ -646,9 +761,16 @@ class DashboardApp:
             "Nhập Order IDs (mỗi dòng một ID):",
             height=100
         )
+        uploaded_file = st.file_uploader(
+            "Hoặc tải file danh sách Order ID (CSV / TXT / XLSX):",
+            type=ORDER_ID_FILE_TYPES,
+            key="app_order_ids_file"
+        )
         
         if st.button("🔍 Tìm kiếm"):
-            if order_ids_input and 'ORDER_ID' in df.columns:
+            if uploaded_file is not None:
+                self.render_bulk_search(df, uploaded_file, 'reconciled', "app_bulk")
+            elif order_ids_input and 'ORDER_ID' in df.columns:
                 order_ids = [id.strip() for id in order_ids_input.split('\n') if id.strip()]
                 results = df.filter(pl.col('ORDER_ID').is_in(order_ids))
                 
@@ -671,26 +793,23 @@ class DashboardApp:
         # Phân tích Bike vs Car dựa trên GSM_AMOUNT
         st.markdown("### 🚗 Phân tích Bike vs Car (dựa trên GSM_AMOUNT)")
         
-        # Tìm cột GSM_AMOUNT với các tên có thể có
-        gsm_amount_col = None
-        possible_gsm_cols = ['GSM Amount', 'GSM_AMOUNT', 'GSM_AMO', 'GSM_AMOUNT_MERCHANT', 'GSM_AMO_MERCHANT', 'GSM_AMOUNT_MERCH', 'GSM_AMO_MERCH']
+        # Tìm cột GSM_AMOUNT / Merchant Amount với các tên có thể có
+        possible_gsm_cols = self.reader.vehicle_amount_columns['gsm']
+        gsm_amount_col = self.reader.find_column(df, possible_gsm_cols)
+        merchant_amount_col = self.reader.find_column(df, self.reader.vehicle_amount_columns['merchant'])
         
-        for col in possible_gsm_cols:
-            if col in df.columns:
-                gsm_amount_col = col
-                break
+        # Một group_by duy nhất cho toàn bộ phần Bike vs Car (100 = Bike, 200 = Car)
+        vehicle_summary = {}
+        if gsm_amount_col:
+            vehicle_stats = self.reader.analyze_vehicle_types(df, gsm_amount_col, merchant_amount_col)
+            vehicle_summary = self.reader.summarize_vehicle_types(vehicle_stats)
         
         if gsm_amount_col:
             st.success(f"✅ Tìm thấy cột: **{gsm_amount_col}**")
             
-            # Phân tích theo GSM_AMOUNT: 100 = Bike, 200 = Car
-            bike_df = df.filter(pl.col(gsm_amount_col) == 100)
-            car_df = df.filter(pl.col(gsm_amount_col) == 200)
-            other_df = df.filter(~pl.col(gsm_amount_col).is_in([100, 200]))
-            
-            bike_count = bike_df.height
-            car_count = car_df.height
-            other_count = other_df.height
+            bike_count = vehicle_summary['gsm']['Bike']['count']
+            car_count = vehicle_summary['gsm']['Car']['count']
+            other_count = vehicle_summary['gsm']['Khác']['count']
             
             col1, col2 = st.columns([1, 1])
             
@@ -962,26 +1081,18 @@ class DashboardApp:
         # Phân tích Amount theo loại xe
         st.markdown("### 💰 Phân tích Amount theo loại xe (Bike vs Car)")
         
-        if 'GSM Amount' in df.columns and 'Merchant Amount' in df.columns:
-            # Phân tích GSM Amount theo loại xe
-            gsm_bike_df = df.filter(pl.col('GSM Amount') == 100)
-            gsm_car_df = df.filter(pl.col('GSM Amount') == 200)
-            
-            # Phân tích Merchant Amount theo loại xe
-            merchant_bike_df = df.filter(pl.col('Merchant Amount') == 100)
-            merchant_car_df = df.filter(pl.col('Merchant Amount') == 200)
-            
-            # Tính tổng tiền
-            gsm_bike_total = gsm_bike_df.select(pl.col('GSM Amount').sum()).item() if not gsm_bike_df.is_empty() else 0
-            gsm_car_total = gsm_car_df.select(pl.col('GSM Amount').sum()).item() if not gsm_car_df.is_empty() else 0
-            merchant_bike_total = merchant_bike_df.select(pl.col('Merchant Amount').sum()).item() if not merchant_bike_df.is_empty() else 0
-            merchant_car_total = merchant_car_df.select(pl.col('Merchant Amount').sum()).item() if not merchant_car_df.is_empty() else 0
+        if 'gsm' in vehicle_summary and 'merchant' in vehicle_summary:
+            # Tổng tiền và số đơn lấy từ kết quả group_by ở trên
+            gsm_bike_total = vehicle_summary['gsm']['Bike']['total']
+            gsm_car_total = vehicle_summary['gsm']['Car']['total']
+            merchant_bike_total = vehicle_summary['merchant']['Bike']['total']
+            merchant_car_total = vehicle_summary['merchant']['Car']['total']
             
             # Số lượng đơn hàng
-            gsm_bike_count = gsm_bike_df.height
-            gsm_car_count = gsm_car_df.height
-            merchant_bike_count = merchant_bike_df.height
-            merchant_car_count = merchant_car_df.height
+            gsm_bike_count = vehicle_summary['gsm']['Bike']['count']
+            gsm_car_count = vehicle_summary['gsm']['Car']['count']
+            merchant_bike_count = vehicle_summary['merchant']['Bike']['count']
+            merchant_car_count = vehicle_summary['merchant']['Car']['count']
             
             col1, col2 = st.columns([1, 1])
             
@@ -1090,7 +1201,12 @@ class DashboardApp:
             st.dataframe(comparison_df, use_container_width=True, hide_index=True)
             
         else:
-            st.warning("⚠️ Không tìm thấy cột 'GSM Amount' hoặc 'Merchant Amount' để phân tích")
+            missing = [label for label, col in [('GSM Amount', gsm_amount_col), ('Merchant Amount', merchant_amount_col)] if col is None]
+            st.warning(
+                f"⚠️ Không tìm thấy cột {' và '.join(missing)} để phân tích. "
+                f"Đã tìm kiếm GSM Amount: {self.reader.vehicle_amount_columns['gsm']}; "
+                f"Merchant Amount: {self.reader.vehicle_amount_columns['merchant']}"
+            )
         
         # Sample data
         st.markdown("### 👁️ Sample Data (10 records đầu)")
@@ -1102,9 +1218,16 @@ class DashboardApp:
             height=100,
             key="taixe_search"
         )
+        uploaded_file = st.file_uploader(
+            "Hoặc tải file danh sách Order ID (CSV / TXT / XLSX):",
+            type=ORDER_ID_FILE_TYPES,
+            key="app_taixe_order_ids_file"
+        )
         
         if st.button("🔍 Tìm kiếm", key="taixe_search_btn"):
-            if order_ids_input and 'ORDER_ID' in df.columns:
+            if uploaded_file is not None:
+                self.render_bulk_search(df, uploaded_file, 'taixe', "app_taixe_bulk")
+            elif order_ids_input and 'ORDER_ID' in df.columns:
                 order_ids = [id.strip() for id in order_ids_input.split('\n') if id.strip()]
                 results = df.filter(pl.col('ORDER_ID').is_in(order_ids))
                 
@@ -1114,6 +1237,17 @@ class DashboardApp:
                 else:
                     st.warning("⚠️ Không tìm thấy Order ID nào")
     
+    def render_bulk_search(self, df, uploaded_file, file_type: str, key_prefix: str):
+        """Tìm hàng loạt Order ID từ file upload trong dữ liệu đang xem (semi-join / anti-join)"""
+        order_ids = read_order_id_file(uploaded_file)
+        if order_ids is None:
+            return
+        
+        with st.spinner(f"Đang tìm {order_ids.height:,} Order ID..."):
+            result = BulkOrderSearch(self.reader, file_type).search_frame(df, order_ids)
+        
+        render_bulk_results(result, f"{key_prefix}_{st.session_state.get('selected_date') or 'range'}", key_prefix)
+    
     def render_taixe_data_viewer(self, df):
         show_rows = st.number_input("Số dòng hiển thị:", min_value=10, max_value=1000, value=100, key="taixe_rows")
         st.dataframe(df.head(show_rows).to_pandas(), use_container_width=True)
@@ -1235,8 +1369,7 @@ class DashboardApp:
             st.markdown("### 💰 Phân tích Phí theo Service Type")
             
             # Tạo tabs cho các loại amount khác nhau
-            amount_cols = ['AMOUNT', 'GSM_AMOUNT', 'MERCHANT_AMOUNT', 'RECONCILED_AMOUNT']
-            available_amount_cols = [col for col in amount_cols if col in df.columns]
+            available_amount_cols = [col for col in SERVICE_AMOUNT_COLUMNS if col in df.columns]
             
             if available_amount_cols:
                 amount_tabs = st.tabs([f"📊 {col.replace('_', ' ').title()}" for col in available_amount_cols])
@@ -1244,47 +1377,35 @@ class DashboardApp:
                 for i, amount_col in enumerate(available_amount_cols):
                     with amount_tabs[i]:
                         # Phân tích theo service type
-                        service_analysis = df.group_by('SERVICE_TYPE').agg([
-                            pl.col(amount_col).sum().alias('total'),
-                            pl.col(amount_col).mean().alias('average'),
-                            pl.count().alias('count')
-                        ]).sort('total', descending=True)
+                        service_analysis = self.get_panel_input(df, f"amount_by_service_type_{amount_col}")
                         
                         col1, col2 = st.columns([1, 1])
                         
                         with col1:
                             # Bar chart cho tổng amount
-                            fig_total = px.bar(
-                                service_analysis.to_pandas(),
-                                x='SERVICE_TYPE',
-                                y='total',
-                                title=f"Tổng {amount_col.replace('_', ' ').title()} theo Service Type",
-                                labels={'total': 'Tổng Amount (VND)', 'SERVICE_TYPE': 'Service Type'},
-                                color='total',
-                                color_continuous_scale='viridis'
-                            )
-                            fig_total.update_layout(
-                                height=400,
-                                xaxis_tickangle=45,
-                                yaxis_tickformat=',.0f'
+                            fig_total = self.charts.bar(
+                                service_analysis['SERVICE_TYPE'],
+                                service_analysis['total'],
+                                f"Tổng {amount_col.replace('_', ' ').title()} theo Service Type",
+                                x_title='Service Type',
+                                y_title='Tổng Amount (VND)',
+                                color_scale='Viridis',
+                                tick_format=',.0f',
+                                tick_angle=45
                             )
                             st.plotly_chart(fig_total, use_container_width=True)
                         
                         with col2:
                             # Bar chart cho average amount
-                            fig_avg = px.bar(
-                                service_analysis.to_pandas(),
-                                x='SERVICE_TYPE',
-                                y='average',
-                                title=f"Trung bình {amount_col.replace('_', ' ').title()} theo Service Type",
-                                labels={'average': 'Trung bình Amount (VND)', 'SERVICE_TYPE': 'Service Type'},
-                                color='average',
-                                color_continuous_scale='plasma'
-                            )
-                            fig_avg.update_layout(
-                                height=400,
-                                xaxis_tickangle=45,
-                                yaxis_tickformat=',.0f'
+                            fig_avg = self.charts.bar(
+                                service_analysis['SERVICE_TYPE'],
+                                service_analysis['average'],
+                                f"Trung bình {amount_col.replace('_', ' ').title()} theo Service Type",
+                                x_title='Service Type',
+                                y_title='Trung bình Amount (VND)',
+                                color_scale='Plasma',
+                                tick_format=',.0f',
+                                tick_angle=45
                             )
                             st.plotly_chart(fig_avg, use_container_width=True)
                         
@@ -1331,9 +1452,7 @@ class DashboardApp:
         if 'IS_BUSINESS_ORDER' in df.columns:
             st.markdown("### 🏢 Phân tích Business Orders")
             
-            business_stats = df.group_by('IS_BUSINESS_ORDER').agg(
-                pl.count().alias('count')
-            ).sort('count', descending=True)
+            business_stats = self.get_panel_input(df, 'business_stats')
             
             col1, col2 = st.columns([1, 1])
             
@@ -1389,9 +1508,7 @@ class DashboardApp:
         if 'SERVICE_TYPE' in df.columns:
             st.markdown("### 🚗 Phân tích Service Type")
             
-            service_stats = df.group_by('SERVICE_TYPE').agg(
-                pl.count().alias('count')
-            ).sort('count', descending=True)
+            service_stats = self.get_panel_input(df, 'service_stats')
             
             col1, col2 = st.columns([1, 1])
             
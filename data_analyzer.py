@@ -1,7 +1,7 @@
 import polars as pl
 import pandas as pd
-from typing import Dict, List, Optional, Tuple, Set
-from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple, Set
+from datetime import date, datetime, timedelta
 import numpy as np
 
 class DataAnalyzer:
@@ -30,7 +30,27 @@ class DataAnalyzer:
             'pending': 'Đang xử lý bảo hiểm',
             'failed': 'Bảo hiểm thất bại'
         }
-    
+
+        # Cột dùng để sort trong merchant analytics
+        self.merchant_sort_keys = {
+            'volume': 'total_transactions',
+            'amount': 'total_amount',
+            'discrepancy_rate': 'discrepancy_rate',
+            'discrepancy_count': 'discrepancy_count'
+        }
+
+        # Các cột thời gian có thể có trong file
+        self.time_columns = {
+            # ORDER_ID_TIME (giải mã từ ULID) là trục thời gian dự phòng khi file không có ORDER_TIME
+            'order': ['ORDER_TIME', 'CREATED_TIME', 'ORDER_ID_TIME'],
+            'gsm': ['GSM_ORDER_TIME', 'GSM_TIME', 'GSM_CREATED_TIME', 'GSM_CREATED_AT'],
+            'pvi': ['PVI_ORDER_TIME', 'PVI_TIME', 'PVI_CREATED_TIME', 'PVI_CREATED_AT']
+        }
+        self.time_formats = ['%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M:%S%.f', '%Y-%m-%dT%H:%M:%S', '%d/%m/%Y %H:%M:%S']
+
+        # Ngưỡng (phút) chia bucket cho histogram độ lệch thời gian GSM - PVI
+        self.gap_buckets_minutes = [5, 15, 60, 240, 1440]
+
     def get_reconcile_summary(self, df: pl.DataFrame) -> Dict:
         """Tóm tắt chi tiết về reconcile status"""
         if df.is_empty() or 'RECONCILE_STATUS' not in df.columns:
@@ -61,90 +81,342 @@ class DataAnalyzer:
         
         return result
     
-    def analyze_discrepancies(self, df: pl.DataFrame) -> Dict:
+    def analyze_discrepancies(self, df: pl.DataFrame, gap_threshold_minutes: int = 60) -> Dict:
         """Phân tích chi tiết các trường hợp không khớp"""
         discrepancies = {
             'pvi_only': [],  # not_found_in_m
             'gsm_only': [],  # not_found_in_external
             'amount_mismatch': [],
-            'time_discrepancy': []
+            'time_discrepancy': [],
+            'time_discrepancy_histogram': []
         }
         
         if df.is_empty():
             return discrepancies
         
-        # PVI only (có PVI nhưng không có GSM)
+        lf = df.lazy()
+        queries = {}
+        
+        # PVI only (có PVI nhưng không có GSM) / GSM only (có GSM nhưng không có PVI)
         if 'RECONCILE_STATUS' in df.columns:
-            pvi_only = df.filter(pl.col('RECONCILE_STATUS').str.contains('not_found_in_m'))
-            if not pvi_only.is_empty():
-                discrepancies['pvi_only'] = self._format_discrepancy_records(pvi_only)
-            
-            # GSM only (có GSM nhưng không có PVI)
-            gsm_only = df.filter(pl.col('RECONCILE_STATUS').str.contains('not_found_in_external'))
-            if not gsm_only.is_empty():
-                discrepancies['gsm_only'] = self._format_discrepancy_records(gsm_only)
+            queries['pvi_only'] = self._discrepancy_records_query(
+                lf.filter(pl.col('RECONCILE_STATUS').str.contains('not_found_in_m')), df.columns
+            )
+            queries['gsm_only'] = self._discrepancy_records_query(
+                lf.filter(pl.col('RECONCILE_STATUS').str.contains('not_found_in_external')), df.columns
+            )
         
         # Amount mismatch analysis
         if all(col in df.columns for col in ['GSM_AMOUNT', 'PVI_AMOUNT']):
-            amount_diff = df.filter(
+            queries['amount_mismatch'] = self._amount_mismatch_query(lf.filter(
                 (pl.col('GSM_AMOUNT').is_not_null()) & 
                 (pl.col('PVI_AMOUNT').is_not_null()) &
                 (pl.col('GSM_AMOUNT') != pl.col('PVI_AMOUNT'))
-            )
-            if not amount_diff.is_empty():
-                discrepancies['amount_mismatch'] = self._format_amount_mismatch(amount_diff)
+            ), df.columns)
+        
+        # Lệch thời gian GSM - PVI
+        gap_queries = self._time_gap_queries(df, gap_threshold_minutes)
+        if gap_queries:
+            queries['time_discrepancy'] = gap_queries['gap_samples']
+            queries['time_discrepancy_histogram'] = gap_queries['gap_histogram']
+        
+        # Tất cả các check chạy chung một lần collect
+        names = list(queries.keys())
+        results = pl.collect_all([queries[name] for name in names]) if names else []
+        
+        for name, result in zip(names, results):
+            discrepancies[name] = result.to_dicts()
         
         return discrepancies
     
+    def _discrepancy_records_query(self, lf: pl.LazyFrame, columns: List[str], limit: int = 100) -> pl.LazyFrame:
+        """Query lazy lấy các cột quan trọng của discrepancy records"""
+        important_cols = ['ORDER_ID', 'MERCHANT', 'TOTAL_AMOUNT', 'ORDER_TIME', 'RECONCILE_STATUS']
+        available_cols = [col for col in important_cols if col in columns]
+        
+        return lf.select(available_cols).head(limit)
+    
+    def _amount_mismatch_query(self, lf: pl.LazyFrame, columns: List[str], limit: int = 100) -> pl.LazyFrame:
+        """Query lazy tính chênh lệch GSM_AMOUNT - PVI_AMOUNT"""
+        lf_with_diff = lf.with_columns([
+            (pl.col('GSM_AMOUNT') - pl.col('PVI_AMOUNT')).alias('amount_diff'),
+            ((pl.col('GSM_AMOUNT') - pl.col('PVI_AMOUNT')) / pl.col('PVI_AMOUNT') * 100).alias('diff_percentage')
+        ])
+        
+        cols = ['ORDER_ID', 'MERCHANT', 'GSM_AMOUNT', 'PVI_AMOUNT']
+        available_cols = [col for col in cols if col in columns] + ['amount_diff', 'diff_percentage']
+        
+        return lf_with_diff.select(available_cols).head(limit)
+    
     def _format_discrepancy_records(self, df: pl.DataFrame, limit: int = 100) -> List[Dict]:
         """Format discrepancy records cho hiển thị"""
         if df.is_empty():
             return []
         
-        # Lấy các cột quan trọng
-        important_cols = ['ORDER_ID', 'MERCHANT', 'TOTAL_AMOUNT', 'ORDER_TIME', 'RECONCILE_STATUS']
-        available_cols = [col for col in important_cols if col in df.columns]
-        
         # Giới hạn số lượng để tránh quá tải
-        sample_df = df.select(available_cols).head(limit)
-        
-        return sample_df.to_dicts()
+        return self._discrepancy_records_query(df.lazy(), df.columns, limit).collect().to_dicts()
     
     def _format_amount_mismatch(self, df: pl.DataFrame, limit: int = 100) -> List[Dict]:
         """Format amount mismatch records"""
         if df.is_empty():
             return []
         
-        # Tính difference và percentage difference
-        df_with_diff = df.with_columns([
-            (pl.col('GSM_AMOUNT') - pl.col('PVI_AMOUNT')).alias('amount_diff'),
-            ((pl.col('GSM_AMOUNT') - pl.col('PVI_AMOUNT')) / pl.col('PVI_AMOUNT') * 100).alias('diff_percentage')
-        ])
-        
-        # Lấy các cột quan trọng
-        cols = ['ORDER_ID', 'MERCHANT', 'GSM_AMOUNT', 'PVI_AMOUNT', 'amount_diff', 'diff_percentage']
-        available_cols = [col for col in cols if col in df_with_diff.columns]
+        return self._amount_mismatch_query(df.lazy(), df.columns, limit).collect().to_dicts()
+    
+    def _timestamp_expr(self, df: pl.DataFrame, col: str) -> pl.Expr:
+        """Expression chuyển cột thời gian (string/date/datetime) sang Datetime"""
+        dtype = df.schema[col]
+        
+        if dtype == pl.Utf8:
+            # Thử lần lượt các format, giá trị không parse được thành null
+            return pl.coalesce([
+                pl.col(col).str.strptime(pl.Datetime, format=fmt, strict=False)
+                for fmt in self.time_formats
+            ])
+        if dtype == pl.Date:
+            return pl.col(col).cast(pl.Datetime)
         
-        sample_df = df_with_diff.select(available_cols).head(limit)
-        return sample_df.to_dicts()
+        return pl.col(col)
     
-    def analyze_merchant_patterns(self, df: pl.DataFrame) -> Dict:
-        """Phân tích patterns theo merchant"""
-        if df.is_empty() or 'MERCHANT' not in df.columns:
+    def _time_anomaly_queries(self, df: pl.DataFrame, file_date: Optional[date] = None,
+                              sample_limit: int = 50) -> Dict[str, pl.LazyFrame]:
+        """
+        Query lazy cho order time bất thường:
+        - thời gian nằm ngoài ngày của file: file_date nếu truyền vào, không thì cột DATE của từng dòng
+          (dữ liệu nhiều ngày), chỉ dữ liệu một ngày không có DATE mới dùng ngày xuất hiện nhiều nhất
+        - thời gian ở tương lai
+        """
+        order_col = next((col for col in self.time_columns['order'] if col in df.columns), None)
+        if order_col is None:
             return {}
         
-        merchant_analysis = df.group_by('MERCHANT').agg([
-            pl.count().alias('total_transactions'),
-            pl.col('TOTAL_AMOUNT').sum().alias('total_amount'),
-            pl.col('TOTAL_AMOUNT').mean().alias('avg_amount'),
-            pl.col('RECONCILE_STATUS').filter(pl.col('RECONCILE_STATUS') == 'match').count().alias('match_count'),
-            pl.col('RECONCILE_STATUS').filter(pl.col('RECONCILE_STATUS').str.contains('not_found')).count().alias('discrepancy_count')
+        if file_date:
+            file_day = pl.lit(file_date)
+        elif 'DATE' in df.columns and df.schema['DATE'] in (pl.Date, pl.Datetime):
+            file_day = pl.col('DATE').cast(pl.Date)
+        else:
+            file_day = pl.col('_order_ts').dt.date().mode().first()
+        
+        flagged = df.lazy().with_columns([
+            self._timestamp_expr(df, order_col).alias('_order_ts')
         ]).with_columns([
+            (pl.col('_order_ts').dt.date() - file_day).dt.total_days().alias('day_offset'),
+            (pl.col('_order_ts') > pl.lit(datetime.now())).alias('is_future')
+        ]).filter(
+            (pl.col('day_offset') != 0) | pl.col('is_future')
+        )
+        
+        sample_cols = [col for col in ['ORDER_ID', 'MERCHANT', 'RECONCILE_STATUS'] if col in df.columns]
+        
+        return {
+            'time_histogram': flagged.group_by('day_offset').agg([
+                pl.count().alias('count'),
+                pl.col('is_future').sum().alias('future_count')
+            ]).sort('day_offset'),
+            'time_samples': flagged.select(sample_cols + [
+                pl.col(order_col),
+                pl.col('day_offset'),
+                pl.when(pl.col('is_future')).then(pl.lit('future_timestamp'))
+                .otherwise(pl.lit('outside_file_date')).alias('anomaly')
+            ]).head(sample_limit)
+        }
+    
+    def _time_gap_queries(self, df: pl.DataFrame, gap_threshold_minutes: int = 60,
+                          sample_limit: int = 50) -> Dict[str, pl.LazyFrame]:
+        """Query lazy cho độ lệch thời gian giữa GSM và PVI (histogram + sample lệch lớn)"""
+        gsm_col = next((col for col in self.time_columns['gsm'] if col in df.columns), None)
+        pvi_col = next((col for col in self.time_columns['pvi'] if col in df.columns), None)
+        if gsm_col is None or pvi_col is None:
+            return {}
+        
+        gaps = df.lazy().with_columns([
+            ((self._timestamp_expr(df, gsm_col) - self._timestamp_expr(df, pvi_col))
+             .dt.total_seconds().abs() / 60).alias('gap_minutes')
+        ]).filter(pl.col('gap_minutes').is_not_null())
+        
+        # Bucket theo ngưỡng phút: [0, 5), [5, 15), ... , [1440, inf)
+        edges = self.gap_buckets_minutes
+        bucket = pl.when(pl.col('gap_minutes') < edges[0]).then(pl.lit(f"< {edges[0]} phút"))
+        for low, high in zip(edges[:-1], edges[1:]):
+            bucket = bucket.when(pl.col('gap_minutes') < high).then(pl.lit(f"{low}-{high} phút"))
+        bucket = bucket.otherwise(pl.lit(f">= {edges[-1]} phút"))
+        
+        bucket_order = pl.when(pl.col('gap_minutes') < edges[0]).then(0)
+        for i, high in enumerate(edges[1:], start=1):
+            bucket_order = bucket_order.when(pl.col('gap_minutes') < high).then(i)
+        bucket_order = bucket_order.otherwise(len(edges))
+        
+        sample_cols = [col for col in ['ORDER_ID', 'MERCHANT', 'RECONCILE_STATUS'] if col in df.columns]
+        
+        return {
+            'gap_histogram': gaps.group_by([bucket.alias('gap_bucket'), bucket_order.alias('bucket_order')]).agg([
+                pl.count().alias('count'),
+                (pl.col('gap_minutes') > gap_threshold_minutes).sum().alias('large_gap_count'),
+                pl.col('gap_minutes').max().alias('max_gap_minutes')
+            ]).sort('bucket_order'),
+            'gap_samples': gaps.filter(pl.col('gap_minutes') > gap_threshold_minutes).select(
+                sample_cols + [pl.col(gsm_col), pl.col(pvi_col), pl.col('gap_minutes')]
+            ).sort('gap_minutes', descending=True).head(sample_limit)
+        }
+    
+    def analyze_time_anomalies(self, df: pl.DataFrame, file_date: Optional[date] = None,
+                               gap_threshold_minutes: int = 60, sample_limit: int = 50) -> Dict:
+        """Phân tích thời gian bất thường: ngoài ngày file, tương lai, lệch GSM - PVI lớn"""
+        result = {
+            'outside_file_date_count': 0,
+            'future_count': 0,
+            'large_gap_count': 0,
+            'day_offset_histogram': [],
+            'gap_histogram': [],
+            'samples': [],
+            'gap_samples': []
+        }
+        
+        if df.is_empty():
+            return result
+        
+        queries = self._time_anomaly_queries(df, file_date, sample_limit)
+        queries.update(self._time_gap_queries(df, gap_threshold_minutes, sample_limit))
+        if not queries:
+            return result
+        
+        names = list(queries.keys())
+        collected = dict(zip(names, pl.collect_all([queries[name] for name in names])))
+        
+        return self._format_time_anomalies(collected, result)
+    
+    def _format_time_anomalies(self, collected: Dict[str, pl.DataFrame], result: Dict) -> Dict:
+        """Gộp kết quả các query thời gian bất thường vào dict kết quả"""
+        if 'time_histogram' in collected:
+            histogram = collected['time_histogram']
+            result['day_offset_histogram'] = histogram.to_dicts()
+            result['future_count'] = int(histogram['future_count'].sum() or 0)
+            result['outside_file_date_count'] = int(
+                histogram.filter(pl.col('day_offset') != 0)['count'].sum() or 0
+            )
+            result['samples'] = collected['time_samples'].to_dicts()
+        
+        if 'gap_histogram' in collected:
+            result['gap_histogram'] = collected['gap_histogram'].to_dicts()
+            result['large_gap_count'] = int(collected['gap_histogram']['large_gap_count'].sum() or 0)
+            result['gap_samples'] = collected['gap_samples'].to_dicts()
+        
+        return result
+    
+    def _merchant_stats_lazy(self, df: pl.DataFrame) -> pl.LazyFrame:
+        """Query lazy tổng hợp theo merchant (chưa collect)"""
+        aggs = [pl.count().alias('total_transactions')]
+
+        if 'TOTAL_AMOUNT' in df.columns:
+            aggs.extend([
+                pl.col('TOTAL_AMOUNT').sum().alias('total_amount'),
+                pl.col('TOTAL_AMOUNT').mean().alias('avg_amount')
+            ])
+
+        if 'RECONCILE_STATUS' in df.columns:
+            aggs.extend([
+                (pl.col('RECONCILE_STATUS') == 'match').sum().alias('match_count'),
+                pl.col('RECONCILE_STATUS').str.contains('not_found').sum().alias('discrepancy_count')
+            ])
+        else:
+            aggs.extend([
+                pl.lit(0).alias('match_count'),
+                pl.lit(0).alias('discrepancy_count')
+            ])
+
+        return df.lazy().group_by('MERCHANT').agg(aggs).with_columns([
             (pl.col('match_count') / pl.col('total_transactions') * 100).alias('match_rate'),
             (pl.col('discrepancy_count') / pl.col('total_transactions') * 100).alias('discrepancy_rate')
-        ]).sort('total_transactions', descending=True)
-        
-        return merchant_analysis.to_dicts()
+        ])
+
+    def _merchant_filter_expr(self, min_transactions: Optional[int] = None,
+                              min_discrepancy_rate: Optional[float] = None,
+                              max_match_rate: Optional[float] = None,
+                              min_amount: Optional[float] = None) -> pl.Expr:
+        """Build filter expression cho các ngưỡng merchant"""
+        expr = pl.lit(True)
+
+        if min_transactions is not None:
+            expr = expr & (pl.col('total_transactions') >= min_transactions)
+        if min_discrepancy_rate is not None:
+            expr = expr & (pl.col('discrepancy_rate') > min_discrepancy_rate)
+        if max_match_rate is not None:
+            expr = expr & (pl.col('match_rate') < max_match_rate)
+        if min_amount is not None:
+            expr = expr & (pl.col('total_amount') >= min_amount)
+
+        return expr
+
+    def query_merchants(self, df: pl.DataFrame, sort_by: str = 'volume', page_size: int = 50,
+                        cursor: Optional[Dict] = None, **filters) -> Dict:
+        """
+        Truy vấn merchant theo trang (keyset pagination):
+        - sort_by: 'volume', 'amount', 'discrepancy_rate', 'discrepancy_count' (khóa khác -> ValueError)
+        - filters: min_transactions, min_discrepancy_rate, max_match_rate, min_amount
+        - cursor: giá trị 'next_cursor' của trang trước
+
+        Sort, filter và cắt trang đều chạy trong Polars, chỉ trang kết quả được chuyển sang dict.
+        """
+        result = {'merchants': [], 'next_cursor': None, 'total_matching': 0}
+
+        if df.is_empty() or 'MERCHANT' not in df.columns:
+            return result
+
+        if sort_by not in self.merchant_sort_keys:
+            raise ValueError(f"Unsupported sort_by: {sort_by}")
+
+        sort_col = self.merchant_sort_keys[sort_by]
+        # Khóa keyset không null: giá trị null xếp cuối (giảm dần), MERCHANT null coi như ''
+        filtered = self._merchant_stats_lazy(df).filter(self._merchant_filter_expr(**filters)).with_columns([
+            pl.col(sort_col).cast(pl.Float64).fill_null(float('-inf')).alias('_sort_value'),
+            pl.col('MERCHANT').cast(pl.Utf8).fill_null('').alias('_sort_merchant')
+        ])
+
+        # Keyset: (sort_col giảm dần, MERCHANT tăng dần) để trang ổn định khi có giá trị trùng
+        page = filtered
+        if cursor:
+            last_value, last_merchant = cursor['value'], cursor['merchant']
+            page = page.filter(
+                (pl.col('_sort_value') < last_value) |
+                ((pl.col('_sort_value') == last_value) & (pl.col('_sort_merchant') > last_merchant))
+            )
+        page = page.sort(['_sort_value', '_sort_merchant'], descending=[True, False]).head(page_size + 1)
+
+        # Group by chỉ chạy một lần nhờ common subplan elimination
+        page_df, count_df = pl.collect_all([page, filtered.select(pl.count().alias('total'))])
+
+        rows = page_df.head(page_size)
+        result['merchants'] = rows.drop(['_sort_value', '_sort_merchant']).to_dicts()
+        result['total_matching'] = count_df.item()
+
+        if page_df.height > page_size and rows.height:
+            result['next_cursor'] = {'value': rows['_sort_value'][-1], 'merchant': rows['_sort_merchant'][-1]}
+
+        return result
+
+    def top_merchants(self, df: pl.DataFrame, by: str = 'volume', k: int = 10, **filters) -> List[Dict]:
+        """Top-K merchant theo volume/discrepancy rate (tính trong Polars)"""
+        return self.query_merchants(df, sort_by=by, page_size=k, **filters)['merchants']
+
+    def count_merchants(self, df: pl.DataFrame, **filters) -> int:
+        """Đếm số merchant thỏa các ngưỡng"""
+        if df.is_empty() or 'MERCHANT' not in df.columns:
+            return 0
+
+        return self._merchant_stats_lazy(df).filter(
+            self._merchant_filter_expr(**filters)
+        ).select(pl.count()).collect().item()
+
+    def analyze_merchant_patterns(self, df: pl.DataFrame, limit: Optional[int] = None) -> Dict:
+        """Phân tích patterns theo merchant (sort theo số giao dịch, có thể giới hạn top-K)"""
+        if df.is_empty() or 'MERCHANT' not in df.columns:
+            return {}
+
+        merchant_analysis = self._merchant_stats_lazy(df).sort('total_transactions', descending=True)
+        if limit is not None:
+            merchant_analysis = merchant_analysis.head(limit)
+
+        return merchant_analysis.collect().to_dicts()
     
     def analyze_time_patterns(self, df: pl.DataFrame) -> Dict:
         """Phân tích patterns theo thời gian"""
@@ -176,39 +448,157 @@ class DataAnalyzer:
             print(f"Error in time analysis: {e}")
             return {}
     
-    def find_suspicious_patterns(self, df: pl.DataFrame) -> Dict:
+    def analyze_time_windows(self, df: pl.DataFrame, every: str = '15m', period: Optional[str] = None) -> pl.DataFrame:
+        """
+        Phân tích theo cửa sổ thời gian bằng group_by_dynamic trên timestamp đã sort:
+        - every: bước trượt (vd '5m', '15m', '60m')
+        - period: độ dài cửa sổ (mặc định bằng every; lớn hơn every thì là rolling window)
+        Kết quả giữ count/sum (cộng dồn được), match_rate tính từ count.
+        """
+        order_col = next((col for col in self.time_columns['order'] if col in df.columns), None)
+        if df.is_empty() or order_col is None:
+            return pl.DataFrame()
+        
+        amount_col = next((col for col in ['TOTAL_AMOUNT', 'AMOUNT', 'GSM_AMOUNT'] if col in df.columns), None)
+        
+        columns = [self._timestamp_expr(df, order_col).alias('window_start')]
+        if 'RECONCILE_STATUS' in df.columns:
+            columns.append((pl.col('RECONCILE_STATUS') == 'match').alias('is_match'))
+        else:
+            columns.append(pl.lit(False).alias('is_match'))
+        columns.append(pl.col(amount_col).cast(pl.Float64).alias('amount') if amount_col else pl.lit(0.0).alias('amount'))
+        
+        try:
+            base = df.lazy().select(columns).drop_nulls('window_start').sort('window_start').collect()
+            if base.is_empty():
+                return pl.DataFrame()
+            
+            # Rolling window (period > every) sinh thêm cửa sổ bắt đầu trước điểm dữ liệu đầu tiên, bỏ các cửa sổ đó
+            first_start = base.select(pl.col('window_start').first().dt.truncate(every)).item()
+            
+            windows = base.lazy().group_by_dynamic(
+                'window_start',
+                every=every,
+                period=period or every,
+                closed='left'
+            ).agg([
+                pl.count().alias('transaction_count'),
+                pl.col('is_match').sum().alias('match_count'),
+                pl.col('amount').sum().alias('total_amount')
+            ]).with_columns([
+                (pl.col('match_count') / pl.col('transaction_count') * 100).alias('match_rate')
+            ]).filter(pl.col('window_start') >= first_start).collect()
+            
+            return windows
+            
+        except Exception as e:
+            print(f"Error in time window analysis: {e}")
+            return pl.DataFrame()
+    
+    def order_time_series(self, df: pl.DataFrame) -> pl.DataFrame:
+        """
+        Chuỗi theo từng đơn cho chart thời gian: time (Datetime từ cột thời gian đầu tiên có trong dữ liệu)
+        và amount (Float64), sort theo time, bỏ các dòng không có thời gian.
+        """
+        order_col = next((col for col in self.time_columns['order'] if col in df.columns), None)
+        if df.is_empty() or order_col is None:
+            return pl.DataFrame()
+        
+        amount_col = next((col for col in ['TOTAL_AMOUNT', 'AMOUNT', 'GSM_AMOUNT'] if col in df.columns), None)
+        
+        return df.lazy().select([
+            self._timestamp_expr(df, order_col).alias('time'),
+            pl.col(amount_col).cast(pl.Float64).alias('amount') if amount_col else pl.lit(None, dtype=pl.Float64).alias('amount')
+        ]).drop_nulls('time').sort('time').collect()
+    
+    def load_day_time_windows(self, reader, date_str: str, every: str = '15m', period: Optional[str] = None,
+                              file_type: str = 'reconciled', df: Optional[pl.DataFrame] = None) -> pl.DataFrame:
+        """
+        Time windows của một ngày, cache theo fingerprint file nguồn (DayCache).
+        Nếu truyền df (dữ liệu đã load) thì dùng luôn khi cache chưa có, không đọc lại file.
+        """
+        file_path = reader.find_best_file(reader.get_day_folder(date_str), date_str, file_type)
+        if file_path is None:
+            return self.analyze_time_windows(df, every, period) if df is not None else pl.DataFrame()
+        
+        def compute() -> pl.DataFrame:
+            day_df = df
+            if day_df is None:
+                # Chỉ đọc các cột cần thiết
+                lf = reader.with_order_id_time(reader.scan_csv_polars(file_path))
+                # Chỉ một cột thời gian: ORDER_ID_TIME chỉ được giải mã khi không có ORDER_TIME / CREATED_TIME
+                order_col = next((col for col in self.time_columns['order'] if col in lf.columns), None)
+                needed = [order_col, 'RECONCILE_STATUS', 'TOTAL_AMOUNT', 'AMOUNT', 'GSM_AMOUNT']
+                day_df = lf.select([col for col in lf.columns if col in needed]).collect()
+            return self.analyze_time_windows(day_df, every, period)
+        
+        cache = reader.get_day_cache()
+        name = f"windows_{file_type}_{every}_{period or every}"
+        return cache.get_or_compute(date_str, name, cache.file_fingerprint(file_path), compute)
+    
+    def iter_time_windows(self, reader, start_date: date, end_date: date, every: str = '15m',
+                          period: Optional[str] = None, file_type: str = 'reconciled') -> Iterator[Tuple[str, pl.DataFrame]]:
+        """Stream time windows từng ngày trong khoảng (mỗi ngày đọc từ cache nếu có)"""
+        for date_str, _ in reader.iter_day_files(start_date, end_date, file_type):
+            windows = self.load_day_time_windows(reader, date_str, every, period, file_type)
+            if not windows.is_empty():
+                yield date_str, windows
+    
+    def find_suspicious_patterns(self, df: pl.DataFrame, file_date: Optional[date] = None) -> Dict:
         """Tìm các patterns đáng ngờ"""
         suspicious = {
             'duplicate_orders': [],
             'high_amount_discrepancy': [],
             'unusual_merchants': [],
-            'time_anomalies': []
+            'time_anomalies': [],
+            'time_anomaly_summary': {}
         }
         
         if df.is_empty():
             return suspicious
         
+        lf = df.lazy()
+        queries = {}
+        
         # Duplicate orders
         if 'ORDER_ID' in df.columns:
-            duplicate_orders = df.group_by('ORDER_ID').agg(pl.count().alias('count')).filter(pl.col('count') > 1)
-            if not duplicate_orders.is_empty():
-                suspicious['duplicate_orders'] = duplicate_orders.to_dicts()
+            queries['duplicate_orders'] = lf.group_by('ORDER_ID').agg(pl.count().alias('count')).filter(pl.col('count') > 1)
         
         # High amount discrepancy (> 10%)
         if all(col in df.columns for col in ['GSM_AMOUNT', 'PVI_AMOUNT']):
-            high_discrepancy = df.filter(
+            queries['high_amount_discrepancy'] = self._amount_mismatch_query(lf.filter(
                 (pl.col('GSM_AMOUNT').is_not_null()) & 
                 (pl.col('PVI_AMOUNT').is_not_null()) &
                 (pl.col('PVI_AMOUNT') > 0) &
                 ((pl.col('GSM_AMOUNT') - pl.col('PVI_AMOUNT')).abs() / pl.col('PVI_AMOUNT') > 0.1)
-            )
-            if not high_discrepancy.is_empty():
-                suspicious['high_amount_discrepancy'] = self._format_amount_mismatch(high_discrepancy, 50)
-        
-        # Unusual merchants (có tỷ lệ lỗi cao)
-        merchant_patterns = self.analyze_merchant_patterns(df)
-        unusual_merchants = [m for m in merchant_patterns if m.get('discrepancy_rate', 0) > 20]
-        suspicious['unusual_merchants'] = unusual_merchants
+            ), df.columns, 50)
+        
+        # Time anomalies (ngoài ngày file, tương lai, lệch GSM - PVI)
+        queries.update(self._time_anomaly_queries(df, file_date))
+        queries.update(self._time_gap_queries(df))
+        
+        # Chạy tất cả các check trong cùng một lần collect
+        names = list(queries.keys())
+        collected = dict(zip(names, pl.collect_all([queries[name] for name in names]))) if names else {}
+        
+        for name in ['duplicate_orders', 'high_amount_discrepancy']:
+            if name in collected:
+                suspicious[name] = collected[name].to_dicts()
+        
+        time_summary = self._format_time_anomalies(collected, {
+            'outside_file_date_count': 0,
+            'future_count': 0,
+            'large_gap_count': 0,
+            'day_offset_histogram': [],
+            'gap_histogram': [],
+            'samples': [],
+            'gap_samples': []
+        })
+        suspicious['time_anomalies'] = time_summary.pop('samples')
+        suspicious['time_anomaly_summary'] = time_summary
+        
+        # Unusual merchants (có tỷ lệ lỗi cao) - lọc bằng expression, giới hạn 100 merchant
+        suspicious['unusual_merchants'] = self.top_merchants(df, by='volume', k=100, min_discrepancy_rate=20)
         
         return suspicious
     
@@ -257,11 +647,9 @@ class DataAnalyzer:
                 recommendations.append(f"📊 Có {gsm_only_count} giao dịch chỉ có ở GSM. Kiểm tra API callback PVI.")
         
         # Phân tích merchant
-        merchant_patterns = self.analyze_merchant_patterns(df)
-        if merchant_patterns:
-            high_discrepancy_merchants = [m for m in merchant_patterns if m.get('discrepancy_rate', 0) > 15]
-            if high_discrepancy_merchants:
-                recommendations.append(f"🏪 {len(high_discrepancy_merchants)} merchant có tỷ lệ lỗi cao. Cần review configuration.")
+        high_discrepancy_count = self.count_merchants(df, min_discrepancy_rate=15)
+        if high_discrepancy_count:
+            recommendations.append(f"🏪 {high_discrepancy_count} merchant có tỷ lệ lỗi cao. Cần review configuration.")
         
         # Phân tích suspicious patterns
         suspicious = self.find_suspicious_patterns(df)
@@ -271,6 +659,16 @@ class DataAnalyzer:
         if suspicious['high_amount_discrepancy']:
             recommendations.append(f"💰 Có {len(suspicious['high_amount_discrepancy'])} giao dịch lệch số tiền lớn. Review pricing logic.")
         
+        time_summary = suspicious['time_anomaly_summary']
+        if time_summary.get('outside_file_date_count') or time_summary.get('future_count'):
+            recommendations.append(
+                f"⏰ Có {time_summary['outside_file_date_count']} giao dịch ngoài ngày của file và "
+                f"{time_summary['future_count']} giao dịch có thời gian ở tương lai. Kiểm tra timezone/đồng bộ giờ."
+            )
+        
+        if time_summary.get('large_gap_count'):
+            recommendations.append(f"🕒 Có {time_summary['large_gap_count']} giao dịch lệch thời gian GSM - PVI lớn. Kiểm tra độ trễ đồng bộ.")
+        
         if not recommendations:
             recommendations.append("✅ Dữ liệu trông ổn định. Tiếp tục monitor theo chu kỳ.")
         
@@ -296,6 +694,11 @@ class DataAnalyzer:
                 if discrepancies['amount_mismatch']:
                     amount_df = pd.DataFrame(discrepancies['amount_mismatch'])
                     amount_df.to_excel(writer, sheet_name='Amount Mismatch', index=False)
+
+                # Time Discrepancy sheet
+                if discrepancies['time_discrepancy']:
+                    time_df = pd.DataFrame(discrepancies['time_discrepancy'])
+                    time_df.to_excel(writer, sheet_name='Time Discrepancy', index=False)
                 
                 # Summary sheet
                 summary = self.get_reconcile_summary(df)
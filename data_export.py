@@ -0,0 +1,125 @@
+import gzip
+import itertools
+import os
+import tempfile
+import time
+import weakref
+import pyarrow.parquet as pq
+import polars as pl
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+# Định dạng export: tên hiển thị, đuôi file, MIME type
+EXPORT_FORMATS: Dict[str, Tuple[str, str, str]] = {
+    'csv': ('CSV', '.csv', 'text/csv'),
+    'csv_gz': ('CSV (gzip)', '.csv.gz', 'application/gzip'),
+    'parquet': ('Parquet', '.parquet', 'application/octet-stream')
+}
+# Số dòng mỗi lần ghi (bộ nhớ phụ khi export chỉ khoảng một chunk)
+EXPORT_CHUNK_ROWS = 100_000
+# Thư mục file export tạm và thời gian giữ lại (giây)
+EXPORT_DIR = os.path.join(tempfile.gettempdir(), 'gsm_dashboard_exports')
+EXPORT_MAX_AGE_SECONDS = 6 * 3600
+
+# Token tăng dần cho mỗi lần tìm kiếm trong process (khóa file export của kết quả)
+_SEARCH_TOKENS = itertools.count(1)
+
+
+def frame_chunks(df: pl.DataFrame, rows: int = EXPORT_CHUNK_ROWS) -> Iterator[pl.DataFrame]:
+    """Các slice liên tiếp của df (zero-copy), ít nhất một chunk để file có header / schema"""
+    if df.is_empty():
+        yield df
+        return
+    for offset in range(0, df.height, rows):
+        yield df.slice(offset, rows)
+
+
+def write_export(chunks: Iterable[pl.DataFrame], path: str, fmt: str) -> int:
+    """
+    Ghi lần lượt từng chunk vào file theo định dạng fmt (csv / csv_gz / parquet), không qua pandas.
+    Trả về số dòng đã ghi.
+    """
+    rows = 0
+    if fmt == 'parquet':
+        writer: Optional[pq.ParquetWriter] = None
+        try:
+            for chunk in chunks:
+                table = chunk.to_arrow()
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema, compression='zstd')
+                writer.write_table(table)
+                rows += chunk.height
+        finally:
+            if writer is not None:
+                writer.close()
+        return rows
+
+    opener = gzip.open if fmt == 'csv_gz' else open
+    with opener(path, 'wb') as f:
+        for chunk in chunks:
+            chunk.write_csv(f, include_header=rows == 0)
+            rows += chunk.height
+    return rows
+
+
+class SearchResult:
+    """
+    Kết quả tìm kiếm giữ trong session để hiển thị / export qua các lần rerun:
+    - token tăng dần cho mỗi lần tìm (id() của frame đã giải phóng có thể bị dùng lại)
+    - gắn với dataset đã tìm (weakref): tải ngày / khoảng ngày khác thì kết quả cũ không còn hiệu lực
+    """
+
+    def __init__(self, frame: pl.DataFrame, source: Optional[pl.DataFrame]):
+        self.frame = frame
+        self.token = next(_SEARCH_TOKENS)
+        self._source = weakref.ref(source) if source is not None else None
+
+    def belongs_to(self, source: Optional[pl.DataFrame]) -> bool:
+        """Kết quả được tìm trên đúng dataset source"""
+        return self._source is not None and source is not None and self._source() is source
+
+
+class DataExporter:
+    """
+    Export bảng kết quả ra file tạm trên đĩa (CSV / CSV gzip / Parquet) để phục vụ tải xuống:
+    - dữ liệu ghi theo chunk thẳng từ Polars / Arrow, không tạo DataFrame pandas và chuỗi CSV trong bộ nhớ
+    - file cũ hơn EXPORT_MAX_AGE_SECONDS được dọn mỗi lần export
+    """
+
+    def __init__(self, export_dir: str = EXPORT_DIR):
+        self.export_dir = export_dir
+
+    def export(self, chunks: Iterable[pl.DataFrame], fmt: str) -> str:
+        """Ghi các chunk vào một file tạm mới, trả về đường dẫn file"""
+        os.makedirs(self.export_dir, exist_ok=True)
+        self.cleanup()
+
+        fd, path = tempfile.mkstemp(suffix=EXPORT_FORMATS[fmt][1], dir=self.export_dir)
+        os.close(fd)
+        try:
+            write_export(chunks, path, fmt)
+        except Exception:
+            self.remove(path)
+            raise
+        return path
+
+    @staticmethod
+    def remove(path: Optional[str]):
+        """Xóa file export (bỏ qua nếu không còn)"""
+        if path and os.path.exists(path):
+            try:
+                os.remove(path)
+            except OSError as e:
+                print(f"Error removing export {path}: {e}")
+
+    def cleanup(self, max_age: float = EXPORT_MAX_AGE_SECONDS):
+        """Xóa các file export quá max_age giây"""
+        if not os.path.isdir(self.export_dir):
+            return
+        cutoff = time.time() - max_age
+        for name in os.listdir(self.export_dir):
+            path = os.path.join(self.export_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                continue
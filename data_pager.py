@@ -0,0 +1,134 @@
+import pyarrow as pa
+import polars as pl
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Số dòng mỗi trang cho các bảng xem dữ liệu thô
+PAGE_SIZES = [100, 500, 1000, 5000]
+# Toán tử so sánh cho bộ lọc cột số / ngày giờ (thứ tự: toán tử dài trước)
+FILTER_OPERATORS = ['>=', '<=', '!=', '>', '<', '=']
+# Cột vị trí dòng trong dữ liệu gốc (chỉ dùng nội bộ khi tính view)
+ROW_POSITION_COLUMN = '__row_position'
+
+
+def filter_expr(column: str, dtype: pl.DataType, text: str) -> Optional[pl.Expr]:
+    """
+    Điều kiện lọc cho một cột từ chuỗi người dùng nhập:
+    - cột chuỗi: chứa chuỗi con (không phân biệt hoa thường)
+    - cột số / ngày giờ: `>100`, `<=5`, `!=0`, `=2025-07-01` (không có toán tử = so sánh bằng)
+    Trả về None nếu chuỗi rỗng hoặc giá trị không đúng kiểu cột.
+    """
+    text = text.strip()
+    if not text:
+        return None
+
+    col = pl.col(column)
+    if dtype == pl.Utf8:
+        return col.str.to_lowercase().str.contains(text.lower(), literal=True)
+    if dtype == pl.Boolean:
+        return col == (text.lower() in ('true', '1', 'yes'))
+
+    operator = next((op for op in FILTER_OPERATORS if text.startswith(op)), '=')
+    raw_value = text[len(operator):].strip() if text.startswith(operator) else text
+    try:
+        raw = pl.Series([raw_value])
+        if dtype in (pl.Date, pl.Datetime):
+            raw = raw.str.to_datetime(strict=True)
+        value = raw.cast(dtype, strict=True)[0]
+    except Exception:
+        return None
+    if value is None:
+        return None
+
+    return {
+        '>=': col >= value, '<=': col <= value, '!=': col != value,
+        '>': col > value, '<': col < value, '=': col == value
+    }[operator]
+
+
+class DataPager:
+    """
+    Phân trang phía server cho bảng dữ liệu thô:
+    - sort / lọc cột chạy một lần bằng lazy query chỉ đọc các cột liên quan, kết quả là danh sách vị trí dòng (UInt32)
+    - mỗi trang chỉ gather đúng các dòng của cửa sổ đang xem nên trang ở dòng 900,000 tốn như trang đầu
+    - trang trả về dạng Arrow table để đưa thẳng vào st.dataframe (không qua pandas)
+    """
+
+    def __init__(self, source: pl.DataFrame):
+        self.source = source
+        self._view_key: Optional[Tuple] = None
+        # None: view là toàn bộ dữ liệu theo thứ tự gốc (trang = slice, không cần gather)
+        self._rows: Optional[pl.Series] = None
+
+    @property
+    def view_key(self) -> Optional[Tuple]:
+        """Sort + bộ lọc đang áp dụng (đổi khi view được tính lại)"""
+        return self._view_key
+
+    @property
+    def total_rows(self) -> int:
+        """Số dòng của view hiện tại (sau khi lọc)"""
+        return self.source.height if self._rows is None else len(self._rows)
+
+    def set_view(self, sort_by: Optional[str] = None, descending: bool = False,
+                 filters: Optional[Dict[str, str]] = None, where: Optional[Dict[str, List]] = None) -> int:
+        """
+        Đặt sort / bộ lọc cho view (chỉ tính lại khi sort hoặc bộ lọc thay đổi).
+        - filters: cột -> chuỗi người dùng nhập (xem filter_expr), bộ lọc không hợp lệ với kiểu cột bị bỏ qua
+        - where: cột -> danh sách giá trị được giữ (drill-down theo status, merchant, service type, ...)
+        Trả về số dòng của view.
+        """
+        schema = self.source.schema
+        conditions = []
+        for column, values in sorted((where or {}).items()):
+            if column in schema and values:
+                key = ('in',) + tuple(sorted(str(value) for value in values))
+                conditions.append((column, key, pl.col(column).is_in(list(values))))
+        for column, text in sorted((filters or {}).items()):
+            if column in schema:
+                expr = filter_expr(column, schema[column], text)
+                if expr is not None:
+                    conditions.append((column, text.strip(), expr))
+        if sort_by not in schema:
+            sort_by = None
+
+        view_key = (sort_by, descending, tuple((column, text) for column, text, _ in conditions))
+        if view_key == self._view_key:
+            return self.total_rows
+        self._view_key = view_key
+
+        if sort_by is None and not conditions:
+            self._rows = None
+            return self.total_rows
+
+        columns = sorted({column for column, _, _ in conditions} | ({sort_by} if sort_by else set()))
+        query = self.source.lazy().select(columns).with_row_count(ROW_POSITION_COLUMN)
+        for _, _, expr in conditions:
+            query = query.filter(expr)
+        if sort_by is not None:
+            query = query.sort(sort_by, descending=descending, nulls_last=True, maintain_order=True)
+
+        self._rows = query.select(ROW_POSITION_COLUMN).collect()[ROW_POSITION_COLUMN]
+        return self.total_rows
+
+    def page(self, offset: int, limit: int) -> pl.DataFrame:
+        """Cửa sổ [offset, offset + limit) của view hiện tại"""
+        offset = max(0, min(offset, max(self.total_rows - 1, 0)))
+        if self._rows is None:
+            return self.source.slice(offset, limit)
+        return self.source[self._rows.slice(offset, limit)]
+
+    def frame(self) -> pl.DataFrame:
+        """Toàn bộ view hiện tại (đã lọc, theo thứ tự sort)"""
+        return self.source if self._rows is None else self.source[self._rows]
+
+    def chunks(self, rows: int) -> Iterator[pl.DataFrame]:
+        """Toàn bộ view hiện tại theo từng cửa sổ `rows` dòng (export không cần gather cả view một lần)"""
+        if self.total_rows == 0:
+            yield self.source.head(0)
+            return
+        for offset in range(0, self.total_rows, rows):
+            yield self.page(offset, rows)
+
+    def page_arrow(self, offset: int, limit: int) -> pa.Table:
+        """Cửa sổ của view dạng Arrow table (đưa thẳng vào st.dataframe)"""
+        return self.page(offset, limit).to_arrow()
@@ -0,0 +1,178 @@
+import os
+import json
+import hashlib
+import threading
+import polars as pl
+from typing import Callable, Dict, List, Optional
+
+# Khóa read-modify-write manifest trong process: các DayCache được tạo mới mỗi lần gọi
+# (reader.get_day_cache) và nhiều thread (session / fragment Streamlit) có thể ghi cùng một ngày
+_MANIFEST_LOCK = threading.Lock()
+
+
+def _tmp_suffix() -> str:
+    """Hậu tố file tạm riêng cho mỗi process + thread (hai thread không ghi chung một file tạm)"""
+    return f"{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+class DayCache:
+    """
+    Cache kết quả tổng hợp theo ngày dưới dạng file Parquet nhỏ:
+    - <cache_dir>/<YYYYMMDD>/<name>.parquet
+    - <cache_dir>/<YYYYMMDD>/manifest.json lưu fingerprint của file nguồn
+    Khi file nguồn thay đổi (vd: có thêm file _2) thì toàn bộ cache của ngày đó bị thay thế.
+    """
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+
+    @staticmethod
+    def file_fingerprint(*file_paths: Optional[str]) -> str:
+        """Fingerprint từ tên file, kích thước và thời gian sửa đổi (không đọc nội dung)"""
+        parts = []
+        for file_path in file_paths:
+            if file_path and os.path.exists(file_path):
+                stat = os.stat(file_path)
+                parts.append(f"{os.path.basename(file_path)}:{stat.st_size}:{stat.st_mtime_ns}")
+            else:
+                parts.append(f"{file_path}:missing")
+
+        return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()[:16]
+
+    @property
+    def writable(self) -> bool:
+        """
+        Chỉ ghi khi thư mục chứa cache_dir đã tồn tại: base_path sai hoặc ổ dữ liệu chưa mount
+        (vd 'F:/...' khi chạy trên máy khác) thì không tạo cây thư mục mới dưới thư mục làm việc
+        """
+        return os.path.isdir(os.path.dirname(os.path.abspath(self.cache_dir)))
+
+    def _day_dir(self, date_str: str) -> str:
+        return os.path.join(self.cache_dir, date_str)
+
+    def _manifest_path(self, date_str: str) -> str:
+        return os.path.join(self._day_dir(date_str), 'manifest.json')
+
+    def _read_manifest(self, date_str: str) -> Dict:
+        try:
+            with open(self._manifest_path(date_str), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_manifest(self, date_str: str, manifest: Dict):
+        """Ghi manifest qua file tạm rồi os.replace để không bao giờ đọc phải file ghi dở"""
+        path = self._manifest_path(date_str)
+        tmp_path = f"{path}.{_tmp_suffix()}"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, path)
+
+    def _artifact_path(self, date_str: str, name: str, ext: str = 'parquet') -> str:
+        return os.path.join(self._day_dir(date_str), f"{name}.{ext}")
+
+    def is_valid(self, date_str: str, fingerprint: str) -> bool:
+        """Cache của ngày còn khớp với file nguồn hiện tại hay không"""
+        return self._read_manifest(date_str).get('fingerprint') == fingerprint
+
+    def list_artifacts(self, date_str: str) -> List[str]:
+        return list(self._read_manifest(date_str).get('artifacts', []))
+
+    def artifact_path(self, date_str: str, name: str, fingerprint: str, ext: str = 'parquet') -> Optional[str]:
+        """Đường dẫn artifact nếu đã có và còn hợp lệ"""
+        manifest = self._read_manifest(date_str)
+        if manifest.get('fingerprint') != fingerprint or name not in manifest.get('artifacts', []):
+            return None
+
+        path = self._artifact_path(date_str, name, ext)
+        return path if os.path.exists(path) else None
+
+    def load_frame(self, date_str: str, name: str, fingerprint: str) -> Optional[pl.DataFrame]:
+        """Đọc artifact của ngày nếu fingerprint còn khớp"""
+        path = self.artifact_path(date_str, name, fingerprint)
+        if path is None:
+            return None
+
+        try:
+            return pl.read_parquet(path)
+        except Exception as e:
+            print(f"Error reading cache {path}: {e}")
+            return None
+
+    def reserve_artifact(self, date_str: str, name: str, fingerprint: str, ext: str = 'parquet') -> str:
+        """
+        Chuẩn bị ghi một artifact: nếu fingerprint của ngày đã đổi thì xóa cache cũ.
+        Trả về đường dẫn file tạm, gọi commit_artifact sau khi ghi xong.
+        """
+        day_dir = self._day_dir(date_str)
+        os.makedirs(day_dir, exist_ok=True)
+
+        with _MANIFEST_LOCK:
+            manifest = self._read_manifest(date_str)
+            if manifest.get('fingerprint') != fingerprint:
+                for old_name in manifest.get('artifacts', []):
+                    for file_name in os.listdir(day_dir):
+                        if file_name.startswith(f"{old_name}."):
+                            try:
+                                os.remove(os.path.join(day_dir, file_name))
+                            except OSError:
+                                pass
+                self._write_manifest(date_str, {'fingerprint': fingerprint, 'artifacts': []})
+
+        return f"{self._artifact_path(date_str, name, ext)}.{_tmp_suffix()}"
+
+    def commit_artifact(self, date_str: str, name: str, fingerprint: str, tmp_path: str, ext: str = 'parquet'):
+        """Đổi tên file tạm thành artifact và ghi vào manifest (atomic)"""
+        self.commit_artifacts(date_str, fingerprint, {name: tmp_path}, ext)
+
+    def commit_artifacts(self, date_str: str, fingerprint: str, tmp_paths: Dict[str, str], ext: str = 'parquet'):
+        """
+        Đổi tên các file tạm thành artifact rồi thêm tất cả vào manifest trong một lần ghi:
+        manifest là điểm commit, artifact chỉ được đọc khi có tên trong manifest
+        """
+        with _MANIFEST_LOCK:
+            for name, tmp_path in tmp_paths.items():
+                os.replace(tmp_path, self._artifact_path(date_str, name, ext))
+
+            manifest = self._read_manifest(date_str)
+            if manifest.get('fingerprint') != fingerprint:
+                manifest = {'fingerprint': fingerprint, 'artifacts': []}
+            for name in tmp_paths:
+                if name not in manifest['artifacts']:
+                    manifest['artifacts'].append(name)
+            self._write_manifest(date_str, manifest)
+
+    def save_frame(self, date_str: str, name: str, fingerprint: str, df: pl.DataFrame):
+        """Lưu artifact dạng Parquet cho ngày"""
+        self.save_frames(date_str, fingerprint, {name: df})
+
+    def save_frames(self, date_str: str, fingerprint: str, frames: Dict[str, pl.DataFrame]):
+        """
+        Lưu nhiều artifact của ngày cùng lúc: ghi hết các file tạm trước, lỗi ở bất kỳ file nào thì
+        không artifact nào được commit (không có ngày chỉ có rollup mà thiếu sketch / Bloom filter)
+        """
+        if not self.writable or not frames:
+            return
+        tmp_paths: Dict[str, str] = {}
+        try:
+            for name, df in frames.items():
+                tmp_paths[name] = self.reserve_artifact(date_str, name, fingerprint)
+                df.write_parquet(tmp_paths[name], statistics=True)
+            self.commit_artifacts(date_str, fingerprint, tmp_paths)
+        except Exception as e:
+            for tmp_path in tmp_paths.values():
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            print(f"Error writing cache {date_str}/{', '.join(frames)}: {e}")
+
+    def get_or_compute(self, date_str: str, name: str, fingerprint: str,
+                       compute_fn: Callable[[], pl.DataFrame]) -> pl.DataFrame:
+        """Đọc từ cache, nếu chưa có thì tính bằng compute_fn và lưu lại"""
+        cached = self.load_frame(date_str, name, fingerprint)
+        if cached is not None:
+            return cached
+
+        df = compute_fn()
+        if df is not None:
+            self.save_frame(date_str, name, fingerprint, df)
+        return df
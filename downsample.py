@@ -0,0 +1,125 @@
+import numpy as np
+import polars as pl
+from datetime import datetime, timezone
+from typing import Optional
+
+# Số điểm tối đa gửi lên trình duyệt cho một chart (khoảng số pixel chiều ngang)
+MAX_CHART_POINTS = 2000
+DOWNSAMPLE_METHODS = ['lttb', 'minmax']
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: chọn n_out điểm giữ hình dạng chuỗi (x tăng dần).
+    Mỗi bucket giữ điểm tạo tam giác lớn nhất với điểm đã chọn ở bucket trước và trung bình bucket sau.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    every = (n - 2) / (n_out - 2)
+    indices = np.empty(n_out, dtype=np.int64)
+    indices[0] = 0
+    selected = 0
+
+    for i in range(n_out - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_start = end
+        next_end = min(int((i + 2) * every) + 1, n)
+
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        area = np.abs(
+            (x[selected] - avg_x) * (y[start:end] - y[selected])
+            - (x[selected] - x[start:end]) * (avg_y - y[selected])
+        )
+        selected = start + int(area.argmax())
+        indices[i + 1] = selected
+
+    indices[-1] = n - 1
+    return indices
+
+
+def minmax_indices(x: np.ndarray, y: np.ndarray, n_buckets: int) -> np.ndarray:
+    """Min và max của y trong mỗi bucket thời gian bằng nhau (mỗi bucket ~ một pixel), giữ đúng các đỉnh"""
+    n = len(x)
+    if 2 * n_buckets >= n:
+        return np.arange(n)
+
+    boundaries = np.searchsorted(x, np.linspace(x[0], x[-1], n_buckets + 1)[1:-1])
+    boundaries = np.concatenate([[0], boundaries, [n]])
+
+    indices = []
+    for start, end in zip(boundaries[:-1], boundaries[1:]):
+        if end > start:
+            segment = y[start:end]
+            indices.extend((start + int(segment.argmin()), start + int(segment.argmax())))
+    return np.unique(np.asarray(indices, dtype=np.int64))
+
+
+def as_time_series(value: datetime, dtype: pl.DataType) -> pl.Series:
+    """
+    Mốc thời gian thành Series một phần tử cùng kiểu với cột thời gian (so sánh / search_sorted đúng múi giờ).
+    Cột có múi giờ: giá trị naive là giờ địa phương của cột, giá trị có tzinfo được đổi sang múi giờ của cột.
+    """
+    time_zone = getattr(dtype, 'time_zone', None)
+    if value.tzinfo is not None:
+        if time_zone is None:
+            return pl.Series([value.replace(tzinfo=None)]).cast(dtype)
+        # Đổi sang UTC naive trước khi tạo Series (tránh TimeZoneAwareConstructorWarning)
+        utc = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return pl.Series([utc]).dt.replace_time_zone('UTC').dt.convert_time_zone(time_zone).cast(dtype)
+    if time_zone is not None:
+        return pl.Series([value]).dt.replace_time_zone(time_zone).cast(dtype)
+    return pl.Series([value]).cast(dtype)
+
+
+def window(series: pl.DataFrame, start=None, end=None, time_col: str = 'time') -> pl.DataFrame:
+    """Các dòng trong [start, end] của chuỗi đã sort theo thời gian (binary search, không quét)"""
+    times = series[time_col]
+    lo = int(times.search_sorted(as_time_series(start, times.dtype), side='left')[0]) if start is not None else 0
+    hi = int(times.search_sorted(as_time_series(end, times.dtype), side='right')[0]) if end is not None else series.height
+    return series.slice(lo, max(0, hi - lo))
+
+
+def downsample_points(series: pl.DataFrame, value_col: str, points: int = MAX_CHART_POINTS,
+                      method: str = 'lttb', time_col: str = 'time') -> pl.DataFrame:
+    """Chọn tối đa `points` điểm (LTTB) hoặc 2 điểm min / max mỗi bucket (minmax) của chuỗi đã sort"""
+    values = series.select([time_col, value_col]).drop_nulls()
+    if values.height <= points:
+        return values
+
+    x = values[time_col].dt.epoch('ms').to_numpy().astype(np.float64)
+    x -= x[0]
+    y = values[value_col].cast(pl.Float64).to_numpy()
+
+    if method == 'minmax':
+        indices = minmax_indices(x, y, points // 2)
+    else:
+        indices = lttb_indices(x, y, points)
+    return values[pl.Series(indices)]
+
+
+def bucket_counts(series: pl.DataFrame, start, end, buckets: int = MAX_CHART_POINTS,
+                  time_col: str = 'time') -> Optional[pl.DataFrame]:
+    """
+    Số đơn trong mỗi bucket thời gian bằng nhau giữa start và end (volume, chính xác không lấy mẫu).
+    Cột time của kết quả cùng kiểu (và múi giờ) với cột thời gian của series.
+    """
+    if series.is_empty():
+        return None
+
+    dtype = series[time_col].dtype
+    x = series[time_col].dt.epoch('ms').to_numpy()
+    start_ms = int(as_time_series(start, dtype).dt.epoch('ms')[0])
+    end_ms = max(int(as_time_series(end, dtype).dt.epoch('ms')[0]), start_ms + 1)
+    counts, edges = np.histogram(x, bins=buckets, range=(start_ms, end_ms))
+
+    # epoch ms là thời điểm UTC: dựng lại theo UTC rồi đổi về múi giờ của cột
+    times = pl.Series(edges[:-1].astype(np.int64)).cast(pl.Datetime('ms'))
+    time_zone = getattr(dtype, 'time_zone', None)
+    if time_zone is not None:
+        times = times.dt.replace_time_zone('UTC').dt.convert_time_zone(time_zone)
+    return pl.DataFrame({time_col: times.cast(dtype), 'count': counts})
@@ -0,0 +1,128 @@
+import numpy as np
+import polars as pl
+from typing import Any, Dict, List, Optional, Tuple
+
+# Các cột có bộ lọc facet trong drill-down
+FACET_COLUMNS = ['RECONCILE_STATUS', 'INSURANCE_STATUS', 'SERVICE_TYPE', 'IS_BUSINESS_ORDER', 'MERCHANT']
+# Giá trị có ít hơn 1 dòng / ARRAY_DENSITY_LIMIT dòng giữ danh sách vị trí (UInt32) thay cho bitset:
+# danh sách khi đó nhỏ hơn bitset (cùng ngưỡng container của roaring bitmap)
+ARRAY_DENSITY_LIMIT = 32
+# Số bit 1 của mỗi byte (popcount bằng tra bảng, không cần numpy >= 2.0)
+_POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def popcount(bits: np.ndarray) -> int:
+    """Số bit 1 của bitset đã pack (uint8)"""
+    return int(_POPCOUNT_TABLE[bits].sum(dtype=np.int64))
+
+
+class FacetIndex:
+    """
+    Bitmap index cho các cột facet của một dataset (build một lần, giữ cùng đầu vào các panel):
+    - mỗi giá trị của cột là một container: bitset đã pack (giá trị dày) hoặc mảng vị trí dòng (giá trị thưa, vd merchant nhỏ)
+    - tổ hợp bộ lọc = OR các giá trị trong một cột, AND giữa các cột, chỉ thao tác trên bitset
+    - số dòng của từng giá trị facet tính trên giao của các bộ lọc còn lại, không đọc dữ liệu dòng
+    Giá trị null không được index (không chọn được trong bộ lọc).
+    """
+
+    def __init__(self, df: pl.DataFrame, columns: Optional[List[str]] = None):
+        self.row_count = df.height
+        self.n_bytes = (df.height + 7) // 8
+        self.columns = [col for col in (columns or FACET_COLUMNS) if col in df.columns]
+        # cột -> giá trị -> container (bitset uint8 dài n_bytes, hoặc vị trí dòng uint32)
+        self._containers: Dict[str, Dict[Any, np.ndarray]] = {}
+        # cột -> (giá trị thưa, vị trí dòng nối liền, vị trí bắt đầu của từng giá trị): đếm facet một lượt numpy
+        self._sparse: Dict[str, Tuple[List, np.ndarray, np.ndarray]] = {}
+
+        if not self.columns:
+            return
+
+        # Vị trí dòng của từng giá trị, tất cả các cột trong một collect_all
+        queries = [
+            df.lazy().select(col).with_row_count('row')
+            .filter(pl.col(col).is_not_null())
+            .group_by(col).agg(pl.col('row'))
+            for col in self.columns
+        ]
+        for col, groups in zip(self.columns, pl.collect_all(queries)):
+            # Một mảng vị trí liền cho cả cột, cắt theo độ dài từng nhóm (không chuyển list sang Python)
+            lengths = groups['row'].list.len().to_numpy()
+            positions = groups['row'].explode().to_numpy().astype(np.uint32)
+            containers: Dict[Any, np.ndarray] = {}
+            sparse_values, sparse_rows = [], []
+            for value, rows in zip(groups[col].to_list(), np.split(positions, np.cumsum(lengths)[:-1])):
+                if len(rows) * ARRAY_DENSITY_LIMIT >= self.row_count:
+                    containers[value] = self._to_bitset(rows)
+                else:
+                    containers[value] = rows
+                    sparse_values.append(value)
+                    sparse_rows.append(rows)
+            self._containers[col] = containers
+            if sparse_values:
+                starts = np.cumsum([0] + [len(rows) for rows in sparse_rows[:-1]])
+                self._sparse[col] = (sparse_values, np.concatenate(sparse_rows), starts)
+
+    def _to_bitset(self, positions: np.ndarray) -> np.ndarray:
+        flags = np.zeros(self.row_count, dtype=bool)
+        flags[positions] = True
+        return np.packbits(flags)
+
+    def _all_rows(self) -> np.ndarray:
+        return np.packbits(np.ones(self.row_count, dtype=bool))
+
+    def values(self, column: str) -> List:
+        """Các giá trị đã index của cột (theo thứ tự giá trị)"""
+        return sorted(self._containers.get(column, {}), key=str)
+
+    def _column_mask(self, column: str, values: List) -> np.ndarray:
+        """Bitset các dòng có cột thuộc values (OR các container)"""
+        mask = np.zeros(self.n_bytes, dtype=np.uint8)
+        sparse = []
+        for value in values:
+            container = self._containers[column].get(value)
+            if container is None:
+                continue
+            if container.dtype == np.uint8:
+                mask |= container
+            else:
+                sparse.append(container)
+        if sparse:
+            mask |= self._to_bitset(np.concatenate(sparse))
+        return mask
+
+    def mask(self, selections: Dict[str, List], exclude: Optional[str] = None) -> np.ndarray:
+        """
+        Bitset các dòng thỏa mọi bộ lọc (AND giữa các cột).
+        selections: cột -> giá trị được chọn; cột không có trong index hoặc danh sách rỗng bị bỏ qua.
+        exclude: bỏ qua bộ lọc của cột này (số đếm facet của chính cột đó)
+        """
+        mask = self._all_rows()
+        for column, values in selections.items():
+            if column == exclude or column not in self._containers or not values:
+                continue
+            mask &= self._column_mask(column, values)
+        return mask
+
+    def count(self, selections: Dict[str, List]) -> int:
+        """Số dòng thỏa tổ hợp bộ lọc"""
+        return popcount(self.mask(selections))
+
+    def facet_counts(self, column: str, selections: Dict[str, List]) -> Dict[Any, int]:
+        """Số dòng của từng giá trị của cột khi áp các bộ lọc của những cột khác"""
+        mask = self.mask(selections, exclude=column)
+        counts: Dict[Any, int] = {}
+        for value, container in self._containers.get(column, {}).items():
+            if container.dtype == np.uint8:
+                counts[value] = popcount(mask & container)
+
+        if column in self._sparse:
+            # Đọc bit của mask tại mọi vị trí thưa một lượt (thứ tự bit của np.packbits: bit cao trước),
+            # rồi cộng theo đoạn của từng giá trị
+            values, rows, starts = self._sparse[column]
+            bits = (mask[rows >> 3] >> (7 - (rows & 7)).astype(np.uint8)) & 1
+            counts.update(zip(values, np.add.reduceat(bits.astype(np.int64), starts).tolist()))
+        return counts
+
+    def all_facet_counts(self, selections: Dict[str, List]) -> Dict[str, Dict[Any, int]]:
+        """facet_counts cho mọi cột đã index"""
+        return {column: self.facet_counts(column, selections) for column in self.columns}
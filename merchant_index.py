@@ -0,0 +1,113 @@
+import unicodedata
+import numpy as np
+import polars as pl
+from typing import Dict, List
+
+# Số kết quả tối đa trả về cho ô tìm kiếm merchant
+MERCHANT_SEARCH_LIMIT = 50
+# Tỷ lệ trigram trùng tối thiểu để coi là gần đúng (fuzzy)
+FUZZY_MIN_SCORE = 0.4
+
+
+def normalize_name(name: str) -> str:
+    """Chuẩn hóa tên để so khớp: chữ thường, bỏ dấu tiếng Việt, gộp khoảng trắng"""
+    text = unicodedata.normalize('NFKD', str(name).lower().replace('đ', 'd'))
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(text.split())
+
+
+def trigrams(text: str, padded: bool = False) -> List[str]:
+    """Các trigram của chuỗi (padded: thêm khoảng trắng hai đầu để so khớp cả đầu / cuối từ)"""
+    if padded:
+        text = f"  {text} "
+    return [text[i:i + 3] for i in range(len(text) - 2)]
+
+
+class MerchantIndex:
+    """
+    Từ điển merchant của một dataset (tên + số giao dịch) kèm trigram index cho ô tìm kiếm:
+    - substring: giao các posting list trigram của query rồi kiểm tra lại bằng `in`
+    - fuzzy: đếm trigram trùng (np.bincount trên các posting list), xếp theo tỷ lệ trùng
+    """
+
+    def __init__(self, merchants: pl.DataFrame):
+        # merchants: cột MERCHANT, count (mỗi merchant một dòng)
+        self.merchants = merchants.sort(['count', 'MERCHANT'], descending=[True, False])
+        self.names: List[str] = self.merchants['MERCHANT'].to_list()
+        self.counts = self.merchants['count'].to_numpy()
+        self.normalized = [normalize_name(name) for name in self.names]
+        self.trigram_counts = np.array([max(1, len(trigrams(name, padded=True))) for name in self.normalized])
+
+        postings: Dict[str, List[int]] = {}
+        for merchant_id, name in enumerate(self.normalized):
+            for gram in set(trigrams(name, padded=True)):
+                postings.setdefault(gram, []).append(merchant_id)
+        self.postings = {gram: np.array(ids, dtype=np.int32) for gram, ids in postings.items()}
+
+    @classmethod
+    def from_frame(cls, df: pl.DataFrame, column: str = 'MERCHANT') -> 'MerchantIndex':
+        """Từ điển merchant từ một DataFrame (một lần group_by)"""
+        merchants = (
+            df.lazy()
+            .select(pl.col(column).cast(pl.Utf8).alias('MERCHANT'))
+            .filter(pl.col('MERCHANT').is_not_null())
+            .group_by('MERCHANT').agg(pl.count().alias('count'))
+            .collect()
+        )
+        return cls(merchants)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _substring_ids(self, query: str) -> np.ndarray:
+        """Merchant có chứa query (query đã chuẩn hóa)"""
+        grams = set(trigrams(query))
+        if not grams:
+            # Query ngắn hơn 3 ký tự: duyệt trực tiếp từ điển
+            return np.array([i for i, name in enumerate(self.normalized) if query in name], dtype=np.int32)
+
+        candidates = None
+        for gram in sorted(grams, key=lambda g: len(self.postings.get(g, ()))):
+            posting = self.postings.get(gram)
+            if posting is None:
+                return np.array([], dtype=np.int32)
+            candidates = posting if candidates is None else np.intersect1d(candidates, posting, assume_unique=True)
+            if not len(candidates):
+                return candidates
+
+        return np.array([i for i in candidates if query in self.normalized[i]], dtype=np.int32)
+
+    def _fuzzy_scores(self, query: str) -> np.ndarray:
+        """Tỷ lệ trigram trùng (Dice) giữa query và từng merchant"""
+        grams = set(trigrams(query, padded=True))
+        postings = [self.postings[gram] for gram in grams if gram in self.postings]
+        if not postings:
+            return np.zeros(len(self.names))
+
+        shared = np.bincount(np.concatenate(postings), minlength=len(self.names))
+        return 2 * shared / (len(grams) + self.trigram_counts)
+
+    def search(self, query: str, limit: int = MERCHANT_SEARCH_LIMIT, fuzzy: bool = True) -> List[str]:
+        """
+        Merchant khớp với query: khớp chuỗi con trước (trùng hoàn toàn / bắt đầu bằng query xếp đầu, sau đó theo số giao dịch),
+        rồi đến khớp gần đúng theo trigram. Query rỗng trả về các merchant nhiều giao dịch nhất.
+        """
+        query = normalize_name(query)
+        if not query:
+            return self.names[:limit]
+
+        substring_ids = self._substring_ids(query)
+        # Thứ tự: trùng khớp hoàn toàn, tên bắt đầu bằng query, sau đó theo số giao dịch (từ điển đã sort theo count)
+        ranked = sorted(substring_ids.tolist(), key=lambda i: (
+            self.normalized[i] != query, not self.normalized[i].startswith(query), i
+        ))
+        results = [self.names[i] for i in ranked[:limit]]
+
+        if fuzzy and len(results) < limit and len(query) >= 3:
+            scores = self._fuzzy_scores(query)
+            scores[substring_ids] = 0
+            fuzzy_ids = np.flatnonzero(scores >= FUZZY_MIN_SCORE)
+            fuzzy_ids = fuzzy_ids[np.argsort(-scores[fuzzy_ids], kind='stable')]
+            results.extend(self.names[i] for i in fuzzy_ids[:limit - len(results)])
+
+        return results
@@ -0,0 +1,347 @@
+import bisect
+import numpy as np
+import polars as pl
+import pyarrow as pa
+import pyarrow.parquet as pq
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+from day_cache import DayCache
+from order_ulid import decode_ulid_times, route_order_ids
+
+# Seed hash ORDER_ID dùng chung cho sketch HLL (rollup_store) và Bloom filter: một lần hash cho cả hai
+ORDER_HASH_SEEDS = (0x5F3759DF, 0x2545F491, 0x9E3779B9, 0x7F4A7C15)
+# 10 bit / ORDER_ID với 7 hàm hash: tỷ lệ dương tính giả ~0.8%
+BLOOM_BITS_PER_KEY = 10
+BLOOM_HASHES = 7
+# Hash của Polars có thể đổi giữa các phiên bản, nên filter gắn với phiên bản khi lưu cache
+BLOOM_VERSION = f"bloom{BLOOM_BITS_PER_KEY}k{BLOOM_HASHES}_pl{pl.__version__.replace('.', '')}"
+
+
+def bloom_name(file_type: str) -> str:
+    """Tên artifact Bloom filter ORDER_ID của ngày trong DayCache"""
+    return f"order_bloom_{file_type}_{BLOOM_VERSION}"
+
+
+def hash_order_ids(order_ids: List[str]) -> np.ndarray:
+    """Hash 64 bit của các ORDER_ID (cùng hash với lúc build filter)"""
+    return pl.Series('ORDER_ID', order_ids, dtype=pl.Utf8).hash(*ORDER_HASH_SEEDS).to_numpy()
+
+
+def _bloom_positions(hashes: np.ndarray, n_bits: int, n_hashes: int) -> np.ndarray:
+    """Vị trí bit (double hashing: h1 + i*h2) dạng ma trận (số hash, BLOOM_HASHES)"""
+    hashes = hashes.astype(np.uint64)
+    h1 = hashes & np.uint64(0xFFFFFFFF)
+    h2 = (hashes >> np.uint64(32)) | np.uint64(1)
+    steps = np.arange(n_hashes, dtype=np.uint64)
+    return (h1[:, None] + steps[None, :] * h2[:, None]) % np.uint64(n_bits)
+
+
+def build_bloom(hashes: np.ndarray) -> pl.DataFrame:
+    """Bloom filter từ hash ORDER_ID, lưu thành một dòng: n_keys, n_bits, n_hashes, bits (đã pack)"""
+    hashes = np.unique(hashes)
+    n_bits = max(64, int(len(hashes)) * BLOOM_BITS_PER_KEY)
+    n_bits += (-n_bits) % 8
+
+    bits = np.zeros(n_bits, dtype=bool)
+    if len(hashes):
+        bits[_bloom_positions(hashes, n_bits, BLOOM_HASHES).ravel()] = True
+
+    return pl.DataFrame({
+        'n_keys': [len(hashes)],
+        'n_bits': [n_bits],
+        'n_hashes': [BLOOM_HASHES],
+        'bits': [np.packbits(bits).tobytes()]
+    }, schema={'n_keys': pl.Int64, 'n_bits': pl.Int64, 'n_hashes': pl.Int32, 'bits': pl.Binary})
+
+
+def bloom_contains(bloom: pl.DataFrame, hashes: np.ndarray) -> np.ndarray:
+    """Mask: ORDER_ID có thể có trong ngày (True) / chắc chắn không có (False)"""
+    if bloom.is_empty() or not len(hashes):
+        return np.zeros(len(hashes), dtype=bool)
+
+    row = bloom.row(0, named=True)
+    if not row['n_keys']:
+        return np.zeros(len(hashes), dtype=bool)
+
+    packed = np.frombuffer(row['bits'], dtype=np.uint8)
+    positions = _bloom_positions(hashes, row['n_bits'], row['n_hashes'])
+    # packbits dùng thứ tự bit big-endian trong mỗi byte
+    bit_set = (packed[positions >> np.uint64(3)] >> (np.uint8(7) - (positions & np.uint64(7)).astype(np.uint8))) & 1
+    return bit_set.all(axis=1)
+
+
+class OrderRowIndex:
+    """
+    Index ORDER_ID -> vị trí dòng của mỗi ngày, lưu trong DayCache: (ORDER_ID, row_nr) sắp xếp theo ORDER_ID.
+    Tra cứu bằng binary search (search_sorted) rồi chỉ lấy các dòng khớp:
+    - từ DataFrame đã load của ngày (index theo thứ tự dòng của file CSV)
+    - từ partition Parquet mirror, chỉ đọc các row group chứa dòng cần lấy
+    """
+
+    def __init__(self, reader, file_type: str = 'reconciled'):
+        self.reader = reader
+        self.file_type = file_type
+        # Index đã đọc trong phiên: (date_str, source) -> (fingerprint, index)
+        self._indexes: Dict[Tuple[str, str], Tuple[str, pl.DataFrame]] = {}
+
+    def _index_name(self, source: str) -> str:
+        return f"order_rows_{self.file_type}_{source}"
+
+    def load_index(self, date_str: str, file_path: str, parquet_file: Optional[str] = None) -> Optional[pl.DataFrame]:
+        """
+        Index của ngày theo thứ tự dòng của file Parquet (nếu truyền parquet_file) hoặc file CSV.
+        Tính và lưu vào DayCache nếu chưa có.
+        """
+        source = 'parquet' if parquet_file else 'csv'
+        fingerprint = DayCache.file_fingerprint(file_path)
+        cached = self._indexes.get((date_str, source))
+        if cached and cached[0] == fingerprint:
+            return cached[1]
+
+        def compute() -> pl.DataFrame:
+            lf = pl.scan_parquet(parquet_file, hive_partitioning=False) if parquet_file \
+                else self.reader.scan_csv_polars(file_path)
+            if 'ORDER_ID' not in lf.columns:
+                return pl.DataFrame(schema={'ORDER_ID': pl.Utf8, 'row_nr': pl.UInt32})
+
+            return (
+                lf.select(pl.col('ORDER_ID').cast(pl.Utf8))
+                .with_row_count('row_nr')
+                .filter(pl.col('ORDER_ID').is_not_null())
+                .sort(['ORDER_ID', 'row_nr'])
+                .select(['ORDER_ID', 'row_nr'])
+                .collect()
+            )
+
+        try:
+            index = self.reader.get_day_cache().get_or_compute(date_str, self._index_name(source), fingerprint, compute)
+        except Exception as e:
+            print(f"Error building order index {date_str}: {e}")
+            return None
+
+        self._indexes[(date_str, source)] = (fingerprint, index)
+        return index
+
+    @staticmethod
+    def lookup(index: pl.DataFrame, order_ids: List[str]) -> np.ndarray:
+        """Vị trí dòng (đã sắp xếp) của các ORDER_ID, mỗi ID có thể có nhiều dòng"""
+        if index.is_empty() or not order_ids:
+            return np.array([], dtype=np.int64)
+
+        keys = pl.Series('ORDER_ID', sorted(set(order_ids)), dtype=pl.Utf8)
+        lo = index['ORDER_ID'].search_sorted(keys, side='left').to_numpy().astype(np.int64)
+        hi = index['ORDER_ID'].search_sorted(keys, side='right').to_numpy().astype(np.int64)
+        lengths = hi - lo
+        if not lengths.sum():
+            return np.array([], dtype=np.int64)
+
+        # Ghép các đoạn [lo, hi) thành danh sách vị trí trong index
+        positions = np.repeat(lo - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        return np.sort(index['row_nr'].to_numpy()[positions].astype(np.int64))
+
+    def find_in_frame(self, df: pl.DataFrame, date_str: str, order_ids: List[str]) -> Optional[pl.DataFrame]:
+        """
+        Lấy các dòng khớp từ DataFrame đã load của ngày (đọc từ file CSV được ưu tiên).
+        Trả về None nếu không dùng được index (khi đó lọc toàn bộ như cũ).
+        """
+        file_path = self.reader.find_best_file(self.reader.get_day_folder(date_str), date_str, self.file_type)
+        if file_path is None:
+            return None
+
+        index = self.load_index(date_str, file_path)
+        if index is None:
+            return None
+
+        rows = self.lookup(index, order_ids)
+        if len(rows) and rows[-1] >= df.height:
+            return None
+
+        found = df[rows.tolist()] if len(rows) else df.clear()
+        # DataFrame không khớp thứ tự dòng của file (vd: đã lọc / sort) thì không dùng index
+        if not found.is_empty() and not found['ORDER_ID'].cast(pl.Utf8).is_in(order_ids).all():
+            return None
+        return found
+
+    def fetch(self, date_str: str, file_path: str, order_ids: List[str], mirror=None) -> Optional[pl.DataFrame]:
+        """
+        Lấy các dòng khớp từ partition Parquet của ngày, chỉ đọc các row group chứa dòng cần lấy.
+        Trả về None nếu ngày chưa có partition còn khớp file nguồn.
+        """
+        parquet_file = mirror.partition_file(date_str, self.file_type, file_path) if mirror else None
+        if parquet_file is None:
+            return None
+
+        index = self.load_index(date_str, file_path, parquet_file)
+        if index is None:
+            return None
+
+        rows = self.lookup(index, order_ids)
+        parquet = pq.ParquetFile(parquet_file)
+        if not len(rows):
+            return self.reader.with_order_id_time(pl.from_arrow(parquet.schema_arrow.empty_table())).with_columns([
+                pl.lit(datetime.strptime(date_str, '%Y%m%d').date()).alias('DATE')
+            ])
+
+        # Dòng đầu của mỗi row group để biết dòng cần lấy nằm ở row group nào
+        metadata = parquet.metadata
+        group_starts = np.cumsum([0] + [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)])
+        groups = np.searchsorted(group_starts, rows, side='right') - 1
+
+        tables = []
+        for group in np.unique(groups):
+            local_rows = rows[groups == group] - group_starts[group]
+            tables.append(parquet.read_row_group(int(group)).take(pa.array(local_rows)))
+
+        found = pl.from_arrow(pa.concat_tables(tables))
+        return self.reader.with_order_id_time(found).with_columns([
+            pl.lit(datetime.strptime(date_str, '%Y%m%d').date()).alias('DATE')
+        ])
+
+
+class OrderIndex:
+    """
+    Tìm ORDER_ID trên nhiều ngày (tháng / năm) không cần biết ngày giao dịch.
+    ORDER_ID dạng ULID được định tuyến thẳng tới ngày tạo theo timestamp trong ID.
+    Mỗi ngày có một Bloom filter ORDER_ID trong DayCache (build cùng lúc với rollup, hoặc khi cần);
+    chỉ các ngày mà filter báo "có thể có" mới phải đọc file.
+    """
+
+    def __init__(self, reader, file_type: str = 'reconciled'):
+        self.reader = reader
+        self.file_type = file_type
+        # Filter đã đọc trong phiên: date_str -> (fingerprint, filter)
+        self._filters: Dict[str, Tuple[str, pl.DataFrame]] = {}
+        self.row_index = OrderRowIndex(reader, file_type)
+
+    def _compute_bloom(self, date_str: str, file_path: str) -> pl.DataFrame:
+        """Build filter của ngày từ cột ORDER_ID (Parquet mirror nếu còn khớp, không thì CSV)"""
+        lf = self.reader.scan_day_file(date_str, file_path, self.file_type, self.reader.get_parquet_mirror())
+        if 'ORDER_ID' not in lf.columns:
+            return build_bloom(np.array([], dtype=np.uint64))
+
+        hashes = lf.select(
+            pl.col('ORDER_ID').cast(pl.Utf8).drop_nulls().hash(*ORDER_HASH_SEEDS).alias('order_hash')
+        ).collect()['order_hash'].to_numpy()
+        return build_bloom(hashes)
+
+    def get_day_bloom(self, date_str: str, file_path: str) -> Optional[pl.DataFrame]:
+        """Bloom filter của ngày (đọc từ DayCache, tính và lưu nếu chưa có)"""
+        fingerprint = DayCache.file_fingerprint(file_path)
+        cached = self._filters.get(date_str)
+        if cached and cached[0] == fingerprint:
+            return cached[1]
+
+        try:
+            bloom = self.reader.get_day_cache().get_or_compute(
+                date_str, bloom_name(self.file_type), fingerprint,
+                lambda: self._compute_bloom(date_str, file_path)
+            )
+        except Exception as e:
+            print(f"Error building order filter {date_str}: {e}")
+            return None
+
+        self._filters[date_str] = (fingerprint, bloom)
+        return bloom
+
+    def build_range(self, start_date: date, end_date: date) -> int:
+        """Build trước filter cho các ngày trong khoảng. Trả về số ngày có filter."""
+        return sum(
+            1 for date_str, file_path in self.reader.iter_day_files(start_date, end_date, self.file_type)
+            if self.get_day_bloom(date_str, file_path) is not None
+        )
+
+    def _day_assignments(self, order_ids: List[str], start_date: Optional[date],
+                         end_date: Optional[date]) -> Tuple[Dict[str, Tuple[str, List[str]]], List[str]]:
+        """
+        Các ngày cần kiểm tra filter: date_str -> (file_path, ORDER_ID cần kiểm tra).
+        - Có khoảng ngày: mọi ngày trong khoảng, nhưng ORDER_ID dạng ULID bỏ qua các ngày trước ngày tạo
+        - Không có khoảng ngày: ORDER_ID dạng ULID chỉ đi tới ngày tạo (và ngày sau đó)
+        Trả về kèm các ORDER_ID không xác định được ngày (không phải ULID và không có khoảng ngày).
+        """
+        assignments = {}
+        if start_date and end_date:
+            created = sorted(
+                (created_at.date(), order_id)
+                for order_id, created_at in zip(order_ids, decode_ulid_times(order_ids).to_list())
+                if created_at is not None
+            )
+            created_days = [day for day, _ in created]
+            routed = {order_id for _, order_id in created}
+            unroutable = [order_id for order_id in order_ids if order_id not in routed]
+
+            for date_str, file_path in self.reader.iter_day_files(start_date, end_date, self.file_type):
+                day = datetime.strptime(date_str, '%Y%m%d').date()
+                day_ids = unroutable + [order_id for _, order_id in created[:bisect.bisect_right(created_days, day)]]
+                if day_ids:
+                    assignments[date_str] = (file_path, day_ids)
+            return assignments, []
+
+        routes, unroutable = route_order_ids(order_ids)
+        for date_str, day_ids in routes.items():
+            file_path = self.reader.find_best_file(self.reader.get_day_folder(date_str), date_str, self.file_type)
+            if file_path:
+                assignments[date_str] = (file_path, day_ids)
+        return assignments, unroutable
+
+    def candidate_days(self, order_ids: List[str], start_date: Optional[date] = None,
+                       end_date: Optional[date] = None) -> Tuple[Dict[str, Tuple[str, List[str]]], int, List[str]]:
+        """
+        Các ngày có thể chứa ít nhất một ORDER_ID: date_str -> (file_path, các ORDER_ID có thể có),
+        kèm số ngày đã kiểm tra filter và các ORDER_ID không xác định được ngày.
+        """
+        order_ids = list(dict.fromkeys(order_ids))
+        if not order_ids:
+            return {}, 0, []
+
+        assignments, unroutable = self._day_assignments(order_ids, start_date, end_date)
+        hashes = dict(zip(order_ids, hash_order_ids(order_ids)))
+
+        candidates = {}
+        for date_str, (file_path, day_ids) in assignments.items():
+            bloom = self.get_day_bloom(date_str, file_path)
+            # Không có filter (lỗi đọc file) thì vẫn phải đọc ngày đó
+            mask = bloom_contains(bloom, np.array([hashes[order_id] for order_id in day_ids], dtype=np.uint64)) \
+                if bloom is not None else np.ones(len(day_ids), dtype=bool)
+            if mask.any():
+                candidates[date_str] = (file_path, [order_id for order_id, hit in zip(day_ids, mask) if hit])
+
+        return candidates, len(assignments), unroutable
+
+    def search(self, order_ids: List[str], start_date: Optional[date] = None, end_date: Optional[date] = None) -> Dict:
+        """
+        Tìm ORDER_ID trong khoảng ngày; không truyền khoảng ngày thì mỗi ID (ULID) tự đi tới ngày tạo của nó.
+        Trả về:
+        - results: các dòng tìm thấy (kèm cột DATE)
+        - days_checked / days_scanned: số ngày đã kiểm tra filter / số ngày thực sự phải đọc file
+        - not_found: các ORDER_ID không tìm thấy
+        - unroutable: các ORDER_ID không phải ULID (cần chọn khoảng ngày để tìm)
+        """
+        order_ids = [order_id.strip() for order_id in order_ids if order_id and order_id.strip()]
+        candidates, days_checked, unroutable = self.candidate_days(order_ids, start_date, end_date)
+        mirror = self.reader.get_parquet_mirror()
+
+        frames = []
+        for date_str, (file_path, day_ids) in candidates.items():
+            try:
+                # Có Parquet mirror thì tra index và chỉ đọc row group cần, không thì lọc cả file
+                found = self.row_index.fetch(date_str, file_path, day_ids, mirror)
+                if found is None:
+                    lf = self.reader.scan_day_file(date_str, file_path, self.file_type, mirror)
+                    found = lf.filter(pl.col('ORDER_ID').cast(pl.Utf8).is_in(day_ids)).collect()
+            except Exception as e:
+                print(f"Error searching {file_path}: {e}")
+                continue
+            if not found.is_empty():
+                frames.append(found)
+
+        results = pl.concat(frames, how='diagonal_relaxed') if frames else pl.DataFrame()
+        found_ids = set(results['ORDER_ID'].cast(pl.Utf8).to_list()) if not results.is_empty() else set()
+
+        return {
+            'results': results,
+            'days_checked': days_checked,
+            'days_scanned': len(candidates),
+            'not_found': [order_id for order_id in dict.fromkeys(order_ids) if order_id not in found_ids],
+            'unroutable': unroutable
+        }
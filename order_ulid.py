@@ -0,0 +1,102 @@
+import numpy as np
+import polars as pl
+import pyarrow as pa
+from datetime import timedelta
+from typing import Dict, List, Tuple
+
+# ORDER_ID dạng ULID: 10 ký tự đầu (Crockford base32) là thời điểm tạo đơn tính bằng ms từ epoch
+CROCKFORD_ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+ULID_TIME_CHARS = 10
+ULID_LENGTH = 26
+# Thư mục ngày (YYYY/MM/DD) và ORDER_TIME theo giờ Việt Nam, timestamp ULID theo UTC
+ULID_LOCAL_TIMEZONE = 'Asia/Ho_Chi_Minh'
+# Đơn có thể nằm trong file của ngày tạo hoặc các ngày sau (đối soát trễ, đơn tạo gần nửa đêm)
+ULID_ROUTE_DAYS_AFTER = 1
+# Cột thời gian giải mã từ ORDER_ID (dùng làm trục thời gian khi file không có ORDER_TIME)
+ORDER_ID_TIME_COLUMN = 'ORDER_ID_TIME'
+
+
+def _crockford_lookup() -> np.ndarray:
+    """Bảng byte -> giá trị base32 (255 nếu không hợp lệ), không phân biệt hoa thường"""
+    lookup = np.full(256, 255, dtype=np.uint8)
+    for value, char in enumerate(CROCKFORD_ALPHABET):
+        lookup[ord(char)] = value
+        lookup[ord(char.lower())] = value
+    return lookup
+
+
+_CROCKFORD_LOOKUP = _crockford_lookup()
+_TIME_WEIGHTS = (32 ** np.arange(ULID_TIME_CHARS - 1, -1, -1, dtype=np.int64))
+
+
+def decode_ulid_ms(order_ids: pl.Series) -> pl.Series:
+    """
+    Timestamp (ms, Int64) trong ULID; null nếu giá trị không phải ULID.
+    Đọc thẳng buffer UTF-8 của Arrow thành ma trận byte (n, 26) rồi tra bảng bằng numpy.
+    """
+    array = order_ids.cast(pl.Utf8).to_arrow()
+    if isinstance(array, pa.ChunkedArray):
+        array = array.combine_chunks()
+    array = array.cast(pa.large_string())
+
+    n = len(array)
+    ms = np.zeros(n, dtype=np.int64)
+    valid = np.zeros(n, dtype=bool)
+    if n:
+        _, offsets_buffer, data_buffer = array.buffers()
+        offsets = np.frombuffer(offsets_buffer, dtype=np.int64)[array.offset:array.offset + n + 1]
+        data = np.frombuffer(data_buffer, dtype=np.uint8) if data_buffer is not None else np.zeros(0, dtype=np.uint8)
+
+        candidates = np.flatnonzero((np.diff(offsets) == ULID_LENGTH) & array.is_valid().to_numpy(zero_copy_only=False))
+        if len(candidates):
+            digits = _CROCKFORD_LOOKUP[data[offsets[candidates][:, None] + np.arange(ULID_LENGTH)]]
+            # Ký tự đầu <= 7 để timestamp không vượt 48 bit
+            is_ulid = (digits < 32).all(axis=1) & (digits[:, 0] <= 7)
+            rows = candidates[is_ulid]
+            ms[rows] = digits[is_ulid, :ULID_TIME_CHARS].astype(np.int64) @ _TIME_WEIGHTS
+            valid[rows] = True
+
+    return pl.Series(order_ids.name, ms).set(pl.Series(~valid), None)
+
+
+def ulid_ms_expr(col: str = 'ORDER_ID') -> pl.Expr:
+    """Expression timestamp (ms) trong ULID, dùng được cả trên LazyFrame"""
+    return pl.col(col).map_batches(decode_ulid_ms, return_dtype=pl.Int64)
+
+
+def ulid_time_expr(col: str = 'ORDER_ID') -> pl.Expr:
+    """Thời điểm tạo đơn (Datetime giờ địa phương, không timezone) giải mã từ ULID"""
+    return (
+        pl.from_epoch(ulid_ms_expr(col), time_unit='ms')
+        .dt.replace_time_zone('UTC')
+        .dt.convert_time_zone(ULID_LOCAL_TIMEZONE)
+        .dt.replace_time_zone(None)
+    )
+
+
+def decode_ulid_times(order_ids: List[str]) -> pl.Series:
+    """Thời điểm tạo của từng ORDER_ID (null nếu không phải ULID)"""
+    return pl.DataFrame({'ORDER_ID': order_ids}, schema={'ORDER_ID': pl.Utf8}).select(
+        ulid_time_expr('ORDER_ID').alias(ORDER_ID_TIME_COLUMN)
+    )[ORDER_ID_TIME_COLUMN]
+
+
+def route_order_ids(order_ids: List[str], days_after: int = ULID_ROUTE_DAYS_AFTER) -> Tuple[Dict[str, List[str]], List[str]]:
+    """
+    Phân ORDER_ID về các ngày (YYYYMMDD) có thể chứa đơn theo thời điểm tạo trong ULID:
+    ngày tạo và days_after ngày sau đó.
+    Trả về (date_str -> các ORDER_ID, các ORDER_ID không phải ULID).
+    """
+    routes: Dict[str, List[str]] = {}
+    unroutable = []
+
+    for order_id, created_at in zip(order_ids, decode_ulid_times(order_ids).to_list()):
+        if created_at is None:
+            unroutable.append(order_id)
+            continue
+
+        for offset in range(days_after + 1):
+            day = created_at.date() + timedelta(days=offset)
+            routes.setdefault(day.strftime('%Y%m%d'), []).append(order_id)
+
+    return dict(sorted(routes.items())), unroutable
@@ -0,0 +1,30 @@
+import threading
+from typing import Any, Callable, Dict
+
+
+class PanelInputCache:
+    """
+    Kết quả tổng hợp đầu vào của các panel cho một dataset (giữ trong session state).
+    Mỗi đầu vào chỉ được tính khi panel cần đến nó lần đầu (view chưa mở thì không tính,
+    không ghi cache xuống đĩa), các lần rerun sau đọc lại.
+    Mỗi tên có lock riêng nên hai fragment chạy song song không tính trùng một kết quả.
+    """
+
+    def __init__(self, data: Any):
+        self.data = data
+        self.values: Dict[str, Any] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    def _lock_for(self, name: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(name, threading.Lock())
+
+    def get(self, name: str, compute: Callable[[], Any]) -> Any:
+        """Kết quả `name` (tính bằng compute nếu chưa có)"""
+        if name in self.values:
+            return self.values[name]
+        with self._lock_for(name):
+            if name not in self.values:
+                self.values[name] = compute()
+            return self.values[name]
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Mirror dữ liệu gsm_data/out (YYYY/MM/DD/*.csv) sang Parquet dạng Hive partition:
+    <mirror>/year=YYYY/month=M/day=D/file_type=<reconciled|taixe>/part-0.parquet
+Chạy một lần cho toàn bộ dữ liệu hoặc incremental (chỉ convert ngày có file nguồn mới / thay đổi).
+"""
+
+import os
+import re
+import json
+import glob
+import argparse
+import polars as pl
+import pyarrow.parquet as pq
+from datetime import date, datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from day_cache import DayCache
+
+# Số dòng mỗi row group: đủ nhỏ để min/max statistics lọc được, đủ lớn để nén tốt
+ROW_GROUP_SIZE = 100_000
+# Cột partition thêm vào khi scan với hive_partitioning
+HIVE_COLUMNS = ['year', 'month', 'day', 'file_type']
+
+class ParquetMirror:
+    """Quản lý dataset Parquet Hive-partitioned song song với thư mục CSV"""
+
+    def __init__(self, reader, mirror_path: Optional[str] = None):
+        self.reader = reader
+        self.mirror_path = mirror_path or reader.parquet_path
+        self._manifest = None
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.mirror_path, '_manifest.json')
+
+    def _load_manifest(self) -> Dict:
+        """Manifest: '<YYYYMMDD>/<file_type>' -> {source, fingerprint, rows}"""
+        if self._manifest is None:
+            try:
+                with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                    self._manifest = json.load(f)
+            except (OSError, ValueError):
+                self._manifest = {}
+        return self._manifest
+
+    def _save_manifest(self):
+        os.makedirs(self.mirror_path, exist_ok=True)
+        tmp_path = f"{self.manifest_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._manifest or {}, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def partition_dir(self, date_str: str, file_type: str) -> str:
+        """Thư mục partition của một ngày / loại file"""
+        return os.path.join(
+            self.mirror_path,
+            f"year={int(date_str[:4])}",
+            f"month={int(date_str[4:6])}",
+            f"day={int(date_str[6:8])}",
+            f"file_type={file_type}"
+        )
+
+    def partition_file(self, date_str: str, file_type: str, source_path: Optional[str] = None) -> Optional[str]:
+        """
+        File Parquet của partition nếu còn khớp với file nguồn (cùng file, cùng fingerprint).
+        Trả về None nếu chưa convert hoặc file nguồn đã đổi (vd: mới có file _2).
+        """
+        entry = self._load_manifest().get(f"{date_str}/{file_type}")
+        if not entry:
+            return None
+
+        if source_path is not None:
+            if os.path.basename(source_path) != entry.get('source') or \
+                    DayCache.file_fingerprint(source_path) != entry.get('fingerprint'):
+                return None
+
+        path = os.path.join(self.partition_dir(date_str, file_type), 'part-0.parquet')
+        return path if os.path.exists(path) else None
+
+    def convert_day(self, date_str: str, source_path: str, file_type: str) -> int:
+        """Convert một file CSV sang partition Parquet (ghi file tạm rồi os.replace). Trả về số dòng."""
+        out_dir = self.partition_dir(date_str, file_type)
+        os.makedirs(out_dir, exist_ok=True)
+        out_path = os.path.join(out_dir, 'part-0.parquet')
+        tmp_path = f"{out_path}.{os.getpid()}.tmp"
+
+        # Streaming CSV -> Parquet: không giữ cả file trong bộ nhớ, số dòng đọc từ metadata của file đã ghi
+        try:
+            self.reader.scan_csv_polars(source_path).sink_parquet(
+                tmp_path, statistics=True, row_group_size=ROW_GROUP_SIZE
+            )
+            rows = pq.ParquetFile(tmp_path).metadata.num_rows
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        os.replace(tmp_path, out_path)
+
+        self._load_manifest()[f"{date_str}/{file_type}"] = {
+            'source': os.path.basename(source_path),
+            'fingerprint': DayCache.file_fingerprint(source_path),
+            'rows': rows,
+            'converted_at': datetime.now().isoformat(timespec='seconds')
+        }
+        return rows
+
+    def scan_range(self, date_strs: List[str], file_type: str = 'reconciled') -> List[Tuple[str, pl.LazyFrame]]:
+        """
+        Scan Hive-partitioned các partition của date_strs (đã kiểm tra còn khớp file nguồn):
+        cột DATE lấy từ year= / month= / day=, filter theo partition để Polars chỉ mở các file trong khoảng.
+        Các ngày có schema khác nhau không scan chung được (Polars dùng schema của file đầu tiên)
+        nên mỗi nhóm schema là một scan. Trả về [(ngày đầu tiên của nhóm, LazyFrame)].
+        """
+        groups: Dict[Tuple, List[str]] = {}
+        for date_str in sorted(date_strs):
+            path = os.path.join(self.partition_dir(date_str, file_type), 'part-0.parquet')
+            schema = tuple((name, str(dtype)) for name, dtype in pl.read_parquet_schema(path).items())
+            groups.setdefault(schema, []).append(date_str)
+
+        scans = []
+        for days in groups.values():
+            files = [os.path.join(self.partition_dir(date_str, file_type), 'part-0.parquet') for date_str in days]
+            day_key = pl.col('year') * 10000 + pl.col('month') * 100 + pl.col('day')
+            lf = (
+                pl.scan_parquet(files, hive_partitioning=True)
+                .filter((pl.col('file_type') == file_type) & day_key.is_between(int(days[0]), int(days[-1])))
+                .with_columns(pl.date(pl.col('year'), pl.col('month'), pl.col('day')).alias('DATE'))
+                .drop(HIVE_COLUMNS)
+            )
+            scans.append((days[0], lf))
+        return scans
+
+    def iter_source_days(self, start_date: Optional[date] = None, end_date: Optional[date] = None) -> Iterator[str]:
+        """Duyệt các ngày (YYYYMMDD) có thư mục YYYY/MM/DD trong base_path"""
+        pattern = os.path.join(self.reader.base_path, '[0-9]' * 4, '[0-9]' * 2, '[0-9]' * 2)
+        for day_path in sorted(glob.glob(pattern)):
+            parts = os.path.normpath(day_path).split(os.sep)[-3:]
+            date_str = ''.join(parts)
+            if not re.fullmatch(r'\d{8}', date_str):
+                continue
+            try:
+                day = datetime.strptime(date_str, '%Y%m%d').date()
+            except ValueError:
+                continue
+            if (start_date and day < start_date) or (end_date and day > end_date):
+                continue
+            yield date_str
+
+    def sync(self, start_date: Optional[date] = None, end_date: Optional[date] = None,
+             file_types: Tuple[str, ...] = ('reconciled', 'taixe'), force: bool = False) -> Dict:
+        """
+        Đồng bộ mirror với thư mục CSV. Mặc định incremental: bỏ qua partition còn khớp fingerprint.
+        Trả về thống kê {'converted', 'skipped', 'failed', 'rows'}.
+        """
+        stats = {'converted': 0, 'skipped': 0, 'failed': 0, 'rows': 0}
+
+        for date_str in self.iter_source_days(start_date, end_date):
+            folder = self.reader.get_day_folder(date_str)
+            for file_type in file_types:
+                source_path = self.reader.find_best_file(folder, date_str, file_type)
+                if source_path is None:
+                    continue
+
+                if not force and self.partition_file(date_str, file_type, source_path):
+                    stats['skipped'] += 1
+                    continue
+
+                try:
+                    stats['rows'] += self.convert_day(date_str, source_path, file_type)
+                    stats['converted'] += 1
+                    # Lưu manifest sau mỗi ngày để chạy lại không phải convert lại từ đầu
+                    self._save_manifest()
+                except Exception as e:
+                    stats['failed'] += 1
+                    print(f"Error converting {source_path}: {e}")
+
+        return stats
+
+
+def main():
+    from csv_reader import CSVDataReader
+
+    parser = argparse.ArgumentParser(description="Mirror gsm_data/out sang Parquet Hive-partitioned")
+    parser.add_argument('--base', default="F:/powerbi/gsm_data/out", help="Thư mục CSV gốc (YYYY/MM/DD)")
+    parser.add_argument('--out', default=None, help="Thư mục Parquet (mặc định GSM_PARQUET_PATH hoặc <base>/_parquet)")
+    parser.add_argument('--start', default=None, help="Ngày bắt đầu YYYY-MM-DD")
+    parser.add_argument('--end', default=None, help="Ngày kết thúc YYYY-MM-DD")
+    parser.add_argument('--file-type', action='append', choices=['reconciled', 'taixe'],
+                        help="Loại file cần convert (mặc định cả hai)")
+    parser.add_argument('--force', action='store_true', help="Convert lại kể cả partition còn khớp")
+    args = parser.parse_args()
+
+    reader = CSVDataReader(args.base)
+    mirror = ParquetMirror(reader, args.out)
+    start_date = datetime.strptime(args.start, '%Y-%m-%d').date() if args.start else None
+    end_date = datetime.strptime(args.end, '%Y-%m-%d').date() if args.end else None
+
+    print(f"📁 CSV: {reader.base_path}")
+    print(f"📦 Parquet: {mirror.mirror_path}")
+    stats = mirror.sync(start_date, end_date, tuple(args.file_type or ('reconciled', 'taixe')), args.force)
+    print(f"✅ Converted: {stats['converted']} | ⏭️ Skipped: {stats['skipped']} | "
+          f"❌ Failed: {stats['failed']} | 📝 Rows: {stats['rows']:,}")
+
+
+if __name__ == "__main__":
+    main()
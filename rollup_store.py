@@ -0,0 +1,366 @@
+import os
+import hashlib
+import numpy as np
+import polars as pl
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+from day_cache import DayCache
+from order_index import ORDER_HASH_SEEDS, bloom_name, build_bloom
+
+# Các chiều tổng hợp theo ngày: tên dimension -> cột nguồn
+ROLLUP_DIMENSIONS = {
+    'merchant': 'MERCHANT',
+    'service_type': 'SERVICE_TYPE',
+    'reconcile_status': 'RECONCILE_STATUS',
+    'insurance_status': 'INSURANCE_STATUS'
+}
+
+# Cột amount dùng cho tổng tiền (lấy cột đầu tiên có trong file)
+AMOUNT_COLUMNS = ['TOTAL_AMOUNT', 'AMOUNT']
+
+# Các cột measure cộng dồn được (additive) của rollup
+ROLLUP_MEASURES = ['transaction_count', 'match_count', 'discrepancy_count', 'total_amount']
+
+# Các dimension có sketch đếm ORDER_ID distinct (ít key, sketch cố định 2^HLL_PRECISION byte / key)
+SKETCH_DIMENSIONS = ['service_type', 'reconcile_status', 'insurance_status']
+HLL_PRECISION = 12
+HLL_SEEDS = ORDER_HASH_SEEDS
+# Hash của Polars có thể đổi giữa các phiên bản, nên sketch gắn với phiên bản khi lưu cache
+SKETCH_VERSION = f"hll{HLL_PRECISION}_pl{pl.__version__.replace('.', '')}"
+
+
+def rollup_source_columns(columns: List[str]) -> List[str]:
+    """Các cột cần đọc từ file nguồn để tính rollup và sketch"""
+    needed = list(ROLLUP_DIMENSIONS.values()) + AMOUNT_COLUMNS + ['ORDER_ID']
+    return [col for col in columns if col in needed]
+
+
+def _rollup_queries(lf: pl.LazyFrame) -> List[pl.LazyFrame]:
+    """Các query group_by theo từng dimension (dạng long: dimension, key + measure)"""
+    columns = lf.columns
+    amount_col = next((col for col in AMOUNT_COLUMNS if col in columns), None)
+
+    aggs = [pl.count().cast(pl.Int64).alias('transaction_count')]
+    if 'RECONCILE_STATUS' in columns:
+        aggs.extend([
+            (pl.col('RECONCILE_STATUS') == 'match').sum().cast(pl.Int64).alias('match_count'),
+            pl.col('RECONCILE_STATUS').str.contains('not_found').sum().cast(pl.Int64).alias('discrepancy_count')
+        ])
+    else:
+        aggs.extend([
+            pl.lit(0, dtype=pl.Int64).alias('match_count'),
+            pl.lit(0, dtype=pl.Int64).alias('discrepancy_count')
+        ])
+    if amount_col:
+        aggs.append(pl.col(amount_col).cast(pl.Float64).sum().alias('total_amount'))
+    else:
+        aggs.append(pl.lit(0.0).alias('total_amount'))
+
+    output_cols = ['dimension', 'key'] + ROLLUP_MEASURES
+
+    queries = [
+        lf.select(aggs).with_columns([
+            pl.lit('total').alias('dimension'),
+            pl.lit('all').alias('key')
+        ]).select(output_cols)
+    ]
+    for dimension, col in ROLLUP_DIMENSIONS.items():
+        if col in columns:
+            queries.append(
+                lf.group_by(pl.col(col).cast(pl.Utf8).fill_null('Unknown').alias('key')).agg(aggs).with_columns([
+                    pl.lit(dimension).alias('dimension')
+                ]).select(output_cols)
+            )
+    return queries
+
+
+def _sketch_query(lf: pl.LazyFrame) -> Optional[pl.LazyFrame]:
+    """Hash ORDER_ID kèm các cột dimension cần sketch"""
+    if 'ORDER_ID' not in lf.columns:
+        return None
+
+    dimension_cols = [ROLLUP_DIMENSIONS[d] for d in SKETCH_DIMENSIONS if ROLLUP_DIMENSIONS[d] in lf.columns]
+    return lf.filter(pl.col('ORDER_ID').is_not_null()).select(
+        [pl.col(col).cast(pl.Utf8).fill_null('Unknown') for col in dimension_cols] +
+        [pl.col('ORDER_ID').cast(pl.Utf8).hash(*HLL_SEEDS).alias('order_hash')]
+    )
+
+
+def compute_day_rollup(lf: pl.LazyFrame) -> pl.DataFrame:
+    """
+    Tính rollup một ngày dạng long format: (dimension, key) + các measure cộng dồn được.
+    Dimension 'total' (key 'all') là tổng của cả ngày.
+    """
+    # Các group_by dùng chung một lần scan nhờ collect_all
+    return pl.concat(pl.collect_all(_rollup_queries(lf)))
+
+
+def compute_day_artifacts(lf: pl.LazyFrame) -> Tuple[pl.DataFrame, pl.DataFrame, pl.DataFrame]:
+    """Rollup, sketch và Bloom filter ORDER_ID của một ngày từ cùng một lần scan"""
+    queries = _rollup_queries(lf)
+    sketch_query = _sketch_query(lf)
+    results = pl.collect_all(queries + ([sketch_query] if sketch_query is not None else []))
+
+    rollup = pl.concat(results[:len(queries)])
+    if sketch_query is None:
+        return rollup, empty_sketches(), build_bloom(np.array([], dtype=np.uint64))
+
+    hashed = results[-1]
+    return rollup, build_sketches(hashed), build_bloom(hashed['order_hash'].to_numpy())
+
+
+def with_rates(rollup: pl.DataFrame) -> pl.DataFrame:
+    """Thêm match_rate / discrepancy_rate (%) tính từ các count"""
+    return rollup.with_columns([
+        (pl.col('match_count') / pl.col('transaction_count') * 100).alias('match_rate'),
+        (pl.col('discrepancy_count') / pl.col('transaction_count') * 100).alias('discrepancy_rate')
+    ])
+
+
+# ----- HyperLogLog: sketch cộng dồn được (merge = max từng register) -----
+
+def _bit_length(values: np.ndarray) -> np.ndarray:
+    """Số bit của từng uint64 (tách 2 nửa 32 bit để log2 trên float64 luôn chính xác)"""
+    hi = (values >> np.uint64(32)).astype(np.float64)
+    lo = (values & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    with np.errstate(divide='ignore'):
+        hi_bits = np.where(hi > 0, np.floor(np.log2(hi)) + 33, 0)
+        lo_bits = np.where(lo > 0, np.floor(np.log2(lo)) + 1, 0)
+    return np.where(hi > 0, hi_bits, lo_bits).astype(np.int64)
+
+
+def hll_registers(hashes: np.ndarray, precision: int = HLL_PRECISION) -> np.ndarray:
+    """Register HLL (uint8, 2^precision phần tử) từ mảng hash uint64"""
+    registers = np.zeros(1 << precision, dtype=np.uint8)
+    if hashes.size == 0:
+        return registers
+
+    hashes = hashes.astype(np.uint64, copy=False)
+    index = (hashes >> np.uint64(64 - precision)).astype(np.int64)
+    remainder = hashes << np.uint64(precision)
+    # rho = vị trí bit 1 đầu tiên của phần còn lại (số 0 ở đầu + 1)
+    rho = np.where(remainder == 0, 64 - precision + 1, 65 - _bit_length(remainder)).astype(np.uint8)
+    np.maximum.at(registers, index, rho)
+    return registers
+
+
+def hll_estimate(registers: np.ndarray) -> float:
+    """Ước lượng số phần tử distinct (có hiệu chỉnh linear counting cho tập nhỏ)"""
+    m = registers.size
+    alpha = 0.7213 / (1 + 1.079 / m)
+    estimate = alpha * m * m / np.sum(np.power(2.0, -registers.astype(np.float64)))
+    zeros = int(np.count_nonzero(registers == 0))
+    if estimate <= 2.5 * m and zeros > 0:
+        estimate = m * np.log(m / zeros)
+    return float(estimate)
+
+
+def empty_sketches() -> pl.DataFrame:
+    return pl.DataFrame(schema={'dimension': pl.Utf8, 'key': pl.Utf8, 'registers': pl.Binary})
+
+
+def build_sketches(hashed: pl.DataFrame) -> pl.DataFrame:
+    """Sketch ORDER_ID distinct cho cả ngày ('total') và từng key của SKETCH_DIMENSIONS"""
+    rows = [{'dimension': 'total', 'key': 'all',
+             'registers': hll_registers(hashed['order_hash'].to_numpy()).tobytes()}]
+
+    for dimension in SKETCH_DIMENSIONS:
+        col = ROLLUP_DIMENSIONS[dimension]
+        if col not in hashed.columns:
+            continue
+        for (key,), group in hashed.select([col, 'order_hash']).group_by([col]):
+            rows.append({'dimension': dimension, 'key': key,
+                         'registers': hll_registers(group['order_hash'].to_numpy()).tobytes()})
+
+    return pl.DataFrame(rows, schema={'dimension': pl.Utf8, 'key': pl.Utf8, 'registers': pl.Binary})
+
+
+def merge_sketches(sketches: pl.DataFrame) -> pl.DataFrame:
+    """Gộp sketch theo (dimension, key): max từng register"""
+    if sketches.is_empty():
+        return empty_sketches()
+
+    rows = []
+    for (dimension, key), group in sketches.group_by(['dimension', 'key']):
+        stacked = np.stack([np.frombuffer(value, dtype=np.uint8) for value in group['registers']])
+        rows.append({'dimension': dimension, 'key': key, 'registers': stacked.max(axis=0).tobytes()})
+
+    return pl.DataFrame(rows, schema={'dimension': pl.Utf8, 'key': pl.Utf8, 'registers': pl.Binary})
+
+
+def estimate_distinct(sketches: pl.DataFrame) -> pl.DataFrame:
+    """Số ORDER_ID distinct ước lượng cho từng (dimension, key)"""
+    return pl.DataFrame({
+        'dimension': sketches['dimension'],
+        'key': sketches['key'],
+        'distinct_orders': [round(hll_estimate(np.frombuffer(value, dtype=np.uint8))) for value in sketches['registers']]
+    }, schema={'dimension': pl.Utf8, 'key': pl.Utf8, 'distinct_orders': pl.Int64})
+
+
+def merge_rollups(rollups: pl.DataFrame) -> pl.DataFrame:
+    """Gộp rollup theo (dimension, key): các measure đều cộng dồn được"""
+    if rollups.is_empty():
+        return rollups
+
+    return rollups.group_by(['dimension', 'key']).agg([pl.col(col).sum() for col in ROLLUP_MEASURES])
+
+
+class RollupStore:
+    """
+    Rollup tổng hợp theo ngày (merchant, service type, reconcile/insurance status) kèm sketch ORDER_ID,
+    lưu trong DayCache theo fingerprint file nguồn. Chỉ đọc file nguồn khi ngày chưa có rollup.
+    Partial tháng được gộp từ partial ngày và lưu riêng, tự tính lại khi một ngày trong tháng đổi file.
+    """
+
+    def __init__(self, reader, file_type: str = 'reconciled'):
+        self.reader = reader
+        self.file_type = file_type
+
+    @property
+    def artifact_name(self) -> str:
+        return f"rollup_{self.file_type}"
+
+    @property
+    def sketch_name(self) -> str:
+        return f"sketch_{self.file_type}_{SKETCH_VERSION}"
+
+    def get_month_cache(self) -> DayCache:
+        """Cache partial tháng: <cache_path>/_months/<YYYYMM>/"""
+        return DayCache(os.path.join(self.reader.cache_path, '_months'))
+
+    def _day_source(self, date_str: str) -> Optional[Tuple[str, str]]:
+        """(file nguồn, fingerprint) của ngày, None nếu không có file"""
+        file_path = self.reader.find_best_file(self.reader.get_day_folder(date_str), date_str, self.file_type)
+        if file_path is None:
+            return None
+        return file_path, DayCache.file_fingerprint(file_path)
+
+    def _compute_day(self, date_str: str, file_path: str, fingerprint: str) -> Tuple[pl.DataFrame, pl.DataFrame]:
+        """Tính rollup + sketch + Bloom filter của ngày từ một lần scan và lưu vào DayCache"""
+        # Đọc từ Parquet mirror nếu partition còn khớp file nguồn, không thì đọc CSV
+        lf = self.reader.scan_day_file(date_str, file_path, self.file_type, self.reader.get_parquet_mirror())
+        rollup, sketches, bloom = compute_day_artifacts(lf.select(rollup_source_columns(lf.columns)))
+
+        # Bloom filter cho OrderIndex: build luôn từ hash ORDER_ID đã tính cho sketch.
+        # Ba artifact được commit cùng một lần ghi manifest
+        self.reader.get_day_cache().save_frames(date_str, fingerprint, {
+            self.artifact_name: rollup,
+            self.sketch_name: sketches,
+            bloom_name(self.file_type): bloom
+        })
+        return rollup, sketches
+
+    def get_day_artifacts(self, date_str: str) -> Optional[Tuple[pl.DataFrame, pl.DataFrame]]:
+        """(rollup, sketch) của một ngày (tính và cache nếu chưa có)"""
+        source = self._day_source(date_str)
+        if source is None:
+            return None
+
+        file_path, fingerprint = source
+        cache = self.reader.get_day_cache()
+        rollup = cache.load_frame(date_str, self.artifact_name, fingerprint)
+        sketches = cache.load_frame(date_str, self.sketch_name, fingerprint)
+        if rollup is not None and sketches is not None:
+            return rollup, sketches
+
+        try:
+            return self._compute_day(date_str, file_path, fingerprint)
+        except Exception as e:
+            print(f"Error computing rollup {date_str}: {e}")
+            return None
+
+    def get_day(self, date_str: str) -> Optional[pl.DataFrame]:
+        """Rollup của một ngày (tính và cache nếu chưa có)"""
+        artifacts = self.get_day_artifacts(date_str)
+        return artifacts[0] if artifacts else None
+
+    def get_day_sketches(self, date_str: str) -> Optional[pl.DataFrame]:
+        """Sketch ORDER_ID của một ngày"""
+        artifacts = self.get_day_artifacts(date_str)
+        return artifacts[1] if artifacts else None
+
+    def history(self, start_date: date, end_date: date) -> pl.DataFrame:
+        """Ghép rollup các ngày trong khoảng, thêm cột DATE"""
+        frames = []
+        for date_str, _ in self.reader.iter_day_files(start_date, end_date, self.file_type):
+            rollup = self.get_day(date_str)
+            if rollup is not None and not rollup.is_empty():
+                frames.append(rollup.with_columns([
+                    pl.lit(datetime.strptime(date_str, '%Y%m%d').date()).alias('DATE')
+                ]))
+
+        if not frames:
+            return pl.DataFrame()
+
+        return pl.concat(frames)
+
+    def _month_days(self, year: int, month: int) -> List[Tuple[str, str]]:
+        """(date_str, fingerprint) các ngày có dữ liệu trong tháng (chỉ stat file, không đọc nội dung)"""
+        start_date = date(year, month, 1)
+        end_date = date(year + month // 12, month % 12 + 1, 1)
+        days = []
+        for date_str, file_path in self.reader.iter_day_files(start_date, end_date, self.file_type):
+            if date_str < end_date.strftime('%Y%m%d'):
+                days.append((date_str, DayCache.file_fingerprint(file_path)))
+        return days
+
+    def get_month(self, year: int, month: int) -> Optional[Tuple[pl.DataFrame, pl.DataFrame]]:
+        """
+        (rollup, sketch) của tháng, gộp từ partial ngày.
+        Fingerprint tháng = fingerprint của tất cả các ngày, nên khi một ngày có file _2 mới
+        thì chỉ ngày đó được tính lại từ dữ liệu gốc, tháng được gộp lại từ partial ngày.
+        """
+        days = self._month_days(year, month)
+        if not days:
+            return None
+
+        month_key = f"{year}{month:02d}"
+        fingerprint = hashlib.sha1('|'.join(f"{d}:{fp}" for d, fp in days).encode('utf-8')).hexdigest()[:16]
+        month_cache = self.get_month_cache()
+
+        rollup = month_cache.load_frame(month_key, self.artifact_name, fingerprint)
+        sketches = month_cache.load_frame(month_key, self.sketch_name, fingerprint)
+        if rollup is not None and sketches is not None:
+            return rollup, sketches
+
+        day_rollups, day_sketches = [], []
+        for date_str, _ in days:
+            artifacts = self.get_day_artifacts(date_str)
+            if artifacts is not None:
+                day_rollups.append(artifacts[0])
+                day_sketches.append(artifacts[1])
+
+        if not day_rollups:
+            return None
+
+        rollup = merge_rollups(pl.concat(day_rollups))
+        sketches = merge_sketches(pl.concat(day_sketches))
+        month_cache.save_frames(month_key, fingerprint, {self.artifact_name: rollup, self.sketch_name: sketches})
+        return rollup, sketches
+
+    def get_year(self, year: int) -> Optional[Tuple[pl.DataFrame, pl.DataFrame]]:
+        """(rollup, sketch) của năm, gộp từ partial tháng"""
+        months = [artifacts for artifacts in (self.get_month(year, month) for month in range(1, 13)) if artifacts]
+        if not months:
+            return None
+
+        return (
+            merge_rollups(pl.concat([rollup for rollup, _ in months])),
+            merge_sketches(pl.concat([sketches for _, sketches in months]))
+        )
+
+    @staticmethod
+    def totals(artifacts: Optional[Tuple[pl.DataFrame, pl.DataFrame]]) -> pl.DataFrame:
+        """Bảng tổng: measure + tỷ lệ + ORDER_ID distinct ước lượng (nếu dimension có sketch)"""
+        if artifacts is None:
+            return pl.DataFrame()
+
+        rollup, sketches = artifacts
+        return with_rates(rollup).join(estimate_distinct(sketches), on=['dimension', 'key'], how='left')
+
+    def month_totals(self, year: int, month: int) -> pl.DataFrame:
+        return self.totals(self.get_month(year, month))
+
+    def year_totals(self, year: int) -> pl.DataFrame:
+        return self.totals(self.get_year(year))
@@ -7,6 +7,13 @@ from plotly.subplots import make_subplots
 from datetime import datetime, date, timedelta
 import os
 from csv_reader import CSVDataReader
+from bulk_search import ORDER_ID_FILE_TYPES, BulkOrderSearch
+from ui_components import (
+    file_date_label, range_too_large_message, read_order_id_file, render_bulk_results, render_export,
+    render_pager_navigation
+)
+from data_pager import PAGE_SIZES, DataPager
+from data_export import SearchResult, frame_chunks
 from typing import Dict, List
 
 # Cấu hình trang - chỉ set nếu chưa được set
@@ -264,6 +271,21 @@ class TaixeDashboardApp:
                             self.load_day_data(year, month, day_num)
                             st.rerun()
             
+            # Chế độ khoảng ngày
+            st.markdown("### 📆 Phân tích nhiều ngày")
+            date_range = st.date_input(
+                "Khoảng ngày:",
+                value=(date(year, month, 1), date(year, month, 7)),
+                format="DD/MM/YYYY",
+                key="taixe_range_selector"
+            )
+            if st.button("📥 Tải khoảng ngày", key="taixe_load_range"):
+                if isinstance(date_range, (list, tuple)) and len(date_range) == 2:
+                    self.load_range_data(date_range[0], date_range[1])
+                    st.rerun()
+                else:
+                    st.warning("⚠️ Chọn đủ ngày bắt đầu và ngày kết thúc")
+            
             # Hiển thị message area
             if st.session_state.taixe_load_message:
                 st.markdown("### 📢 Thông báo:")
@@ -351,6 +373,42 @@ class TaixeDashboardApp:
         except Exception as e:
             st.session_state.taixe_load_message = f"❌ Lỗi khi tải dữ liệu: {str(e)}"
     
+    def load_range_data(self, start_date: date, end_date: date):
+        """Tải dữ liệu tài xế nhiều ngày (ưu tiên file _2 mỗi ngày), thêm cột DATE"""
+        try:
+            range_info = self.reader.get_range_info(start_date, end_date, 'taixe')
+            range_label = f"{start_date:%d/%m/%Y} - {end_date:%d/%m/%Y}"
+            
+            if not range_info['files']:
+                st.session_state.taixe_load_message = f"❌ Không tìm thấy file tài xế trong khoảng {range_label}"
+                return
+            
+            if range_info['too_large']:
+                st.session_state.taixe_load_message = range_too_large_message(range_info)
+                return
+            
+            df = self.reader.load_date_range(start_date, end_date, 'taixe')
+            
+            if df.is_empty():
+                st.session_state.taixe_load_message = f"❌ Không đọc được dữ liệu tài xế trong khoảng {range_label}"
+                return
+            
+            st.session_state.taixe_current_data = df
+            st.session_state.taixe_selected_day = None
+            st.session_state.taixe_file_info = {
+                'taixe_file': f"{len(range_info['files'])} file",
+                'taixe_size': range_info['size_mb'],
+                'taixe_paths': range_info['files'],
+                'date': range_info['start_date'],
+                'date_end': range_info['end_date'],
+                'folder': self.reader.base_path
+            }
+            
+            st.session_state.taixe_load_message = f"✅ Đã tải dữ liệu tài xế: {df.height:,} records từ {len(range_info['files'])} ngày"
+            
+        except Exception as e:
+            st.session_state.taixe_load_message = f"❌ Lỗi khi tải dữ liệu: {str(e)}"
+    
     def render_file_info(self):
         """Hiển thị thông tin file"""
         if not st.session_state.taixe_file_info:
@@ -362,7 +420,7 @@ class TaixeDashboardApp:
         col1, col2, col3, col4, col5 = st.columns(5)
         
         with col1:
-            st.metric("📅 Ngày", info.get('date', 'N/A'))
+            st.metric("📅 Ngày", file_date_label(info))
         with col2:
             st.metric("📄 File tài xế", info.get('taixe_file', 'N/A'))
         with col3:
@@ -451,6 +509,45 @@ class TaixeDashboardApp:
                     - Số lượng: {row['count']:,} records ({percentage:.1f}%)
                     """)
         
+        # Phân tích Bike vs Car (100 = Bike, 200 = Car) - một group_by duy nhất
+        gsm_amount_col = self.reader.find_column(df, self.reader.vehicle_amount_columns['gsm'])
+        merchant_amount_col = self.reader.find_column(df, self.reader.vehicle_amount_columns['merchant'])
+
+        if gsm_amount_col:
+            st.markdown(f"### 🛵 Phân tích Bike vs Car (dựa trên {gsm_amount_col})")
+
+            vehicle_stats = self.reader.analyze_vehicle_types(df, gsm_amount_col, merchant_amount_col)
+            vehicle_summary = self.reader.summarize_vehicle_types(vehicle_stats)
+
+            vehicle_rows = []
+            for vehicle, label in [('Bike', '🛵 Bike (100)'), ('Car', '🚗 Car (200)'), ('Khác', '🚙 Khác')]:
+                row = {
+                    'Loại xe': label,
+                    'Số đơn GSM': vehicle_summary['gsm'][vehicle]['count'],
+                    'GSM Amount': vehicle_summary['gsm'][vehicle]['total']
+                }
+                if 'merchant' in vehicle_summary:
+                    row['Số đơn Merchant'] = vehicle_summary['merchant'][vehicle]['count']
+                    row['Merchant Amount'] = vehicle_summary['merchant'][vehicle]['total']
+                vehicle_rows.append(row)
+
+            col1, col2 = st.columns([1, 1])
+
+            with col1:
+                vehicle_df = pd.DataFrame(vehicle_rows)
+                st.dataframe(vehicle_df, use_container_width=True, hide_index=True)
+
+            with col2:
+                fig_vehicle = px.pie(
+                    values=[row['Số đơn GSM'] for row in vehicle_rows],
+                    names=[row['Loại xe'] for row in vehicle_rows],
+                    title="Phân bố Bike vs Car",
+                    color_discrete_sequence=['#FF9999', '#66B2FF', '#99FF99']
+                )
+                fig_vehicle.update_traces(textposition='inside', textinfo='percent+label')
+                fig_vehicle.update_layout(height=350)
+                st.plotly_chart(fig_vehicle, use_container_width=True)
+
         # Phân tích các cột khác nếu có
         st.markdown("### 📋 Thông tin chi tiết")
         
@@ -492,77 +589,116 @@ class TaixeDashboardApp:
             height=100,
             placeholder="01JZ2SWN3GYQQP8PH8ZT5GFEZ7\n01JZ2KBJRN9B8MJY2XT6A25NJ8\n..."
         )
+        uploaded_file = st.file_uploader(
+            "Hoặc tải file danh sách Order ID (CSV / TXT / XLSX):",
+            type=ORDER_ID_FILE_TYPES,
+            key="taixe_order_ids_file"
+        )
         
         if st.button("🔍 Tìm kiếm", key="taixe_search"):
-            if order_ids_text.strip():
+            if uploaded_file is not None:
+                st.session_state.taixe_search_results = None
+                self.render_bulk_search(df, uploaded_file)
+            elif order_ids_text.strip():
                 order_ids = [id.strip() for id in order_ids_text.split('\n') if id.strip()]
                 
                 if 'ORDER_ID' in df.columns:
                     # Tìm kiếm
                     found_orders = df.filter(pl.col('ORDER_ID').is_in(order_ids))
                     
-                    if not found_orders.is_empty():
-                        st.success(f"✅ Tìm thấy {found_orders.height} orders")
-                        
-                        # Export button
-                        csv = found_orders.to_pandas().to_csv(index=False)
-                        st.download_button(
-                            "📥 Download CSV",
-                            csv,
-                            "taixe_found_orders.csv",
-                            "text/csv",
-                            key="taixe_download"
-                        )
-                        
-                        # Hiển thị kết quả
-                        st.dataframe(found_orders.to_pandas(), use_container_width=True)
-                    else:
+                    # Giữ kết quả trong session: nút export chạy lại script sau khi bấm Tìm kiếm
+                    st.session_state.taixe_search_results = (
+                        SearchResult(found_orders, df) if not found_orders.is_empty() else None
+                    )
+                    if found_orders.is_empty():
                         st.warning("⚠️ Không tìm thấy order nào trong dữ liệu")
                 else:
                     st.error("❌ Không có cột ORDER_ID trong dữ liệu")
             else:
                 st.warning("⚠️ Vui lòng nhập ít nhất một Order ID")
+        
+        stored = st.session_state.get('taixe_search_results')
+        if stored is not None and not stored.belongs_to(df):
+            # Đã tải ngày khác: bỏ kết quả của dữ liệu cũ
+            stored = st.session_state.taixe_search_results = None
+        if stored is not None:
+            found_orders = stored.frame
+            st.success(f"✅ Tìm thấy {found_orders.height} orders")
+            
+            # Export (CSV / CSV gzip / Parquet)
+            render_export(
+                lambda: frame_chunks(found_orders),
+                "taixe_found_orders",
+                "taixe_export",
+                version=stored.token
+            )
+            
+            # Hiển thị kết quả
+            st.dataframe(found_orders.to_arrow(), use_container_width=True)
+    
+    def render_bulk_search(self, df: pl.DataFrame, uploaded_file):
+        """Tìm hàng loạt Order ID từ file upload (semi-join / anti-join)"""
+        order_ids = read_order_id_file(uploaded_file)
+        if order_ids is None:
+            return
+        
+        with st.spinner(f"Đang tìm {order_ids.height:,} Order ID..."):
+            result = BulkOrderSearch(self.reader, 'taixe').search_frame(df, order_ids)
+        
+        render_bulk_results(result, "taixe_orders", "taixe_bulk")
     
     def render_data_viewer(self):
-        """Xem dữ liệu thô"""
+        """Xem dữ liệu thô (phân trang phía server: sort / lọc trên toàn bộ dữ liệu, chỉ gửi trang đang xem)"""
         if st.session_state.taixe_current_data is None:
             return
         
         df = st.session_state.taixe_current_data
+        pager = st.session_state.get('taixe_data_pager')
+        if pager is None or pager.source is not df:
+            pager = DataPager(df)
+            st.session_state.taixe_data_pager = pager
         
         st.markdown("### 👁️ Xem dữ liệu thô")
         
-        # Pagination
-        total_rows = df.height
-        page_size = st.selectbox("Số records mỗi trang:", [100, 500, 1000, 5000], key="taixe_page_size")
+        col1, col2, col3 = st.columns([2, 1, 1])
+        with col1:
+            sort_by = st.selectbox("Sắp xếp theo:", ['(Thứ tự gốc)'] + df.columns, key="taixe_sort")
+        with col2:
+            descending = st.checkbox("Giảm dần", key="taixe_descending")
+        with col3:
+            page_size = st.selectbox("Số records mỗi trang:", PAGE_SIZES, key="taixe_page_size")
         
-        if 'taixe_current_page' not in st.session_state:
-            st.session_state.taixe_current_page = 0
+        with st.expander("🔎 Lọc theo cột"):
+            st.caption("Cột chữ: chứa chuỗi (không phân biệt hoa thường). Cột số / ngày: `>100`, `<=5`, `!=0`, `2025-07-01`")
+            filter_columns = st.multiselect("Cột cần lọc:", df.columns, key="taixe_filter_columns")
+            filters = {
+                col: st.text_input(f"{col}:", key=f"taixe_filter_{col}")
+                for col in filter_columns
+            }
         
-        total_pages = (total_rows + page_size - 1) // page_size
+        sort_column = None if sort_by == '(Thứ tự gốc)' else sort_by
+        total_rows = pager.set_view(sort_column, descending, filters)
         
-        col1, col2, col3 = st.columns([1, 2, 1])
-        with col1:
-            if st.button("⬅️ Trước", disabled=st.session_state.taixe_current_page == 0):
-                st.session_state.taixe_current_page = max(0, st.session_state.taixe_current_page - 1)
-                st.rerun()
+        # Về đầu view khi đổi dữ liệu / sort / bộ lọc
+        view_key = (id(df), pager.view_key)
+        if st.session_state.get('taixe_data_view') != view_key:
+            st.session_state.taixe_data_view = view_key
+            st.session_state.taixe_current_row = 1
         
-        with col2:
-            st.markdown(f"**Trang {st.session_state.taixe_current_page + 1}/{total_pages}**")
-        
-        with col3:
-            if st.button("Tiếp ➡️", disabled=st.session_state.taixe_current_page >= total_pages - 1):
-                st.session_state.taixe_current_page = min(total_pages - 1, st.session_state.taixe_current_page + 1)
-                st.rerun()
+        render_pager_navigation(total_rows, page_size, "taixe_current_row")
         
-        # Hiển thị data
-        start_idx = st.session_state.taixe_current_page * page_size
-        end_idx = min(start_idx + page_size, total_rows)
+        if total_rows == 0:
+            st.info("ℹ️ Không có records nào khớp bộ lọc")
+            return
         
-        page_data = df.slice(start_idx, end_idx - start_idx)
-        st.dataframe(page_data.to_pandas(), use_container_width=True)
+        start_row = min(st.session_state.taixe_current_row, total_rows)
+        end_row = min(start_row + page_size - 1, total_rows)
+        st.dataframe(pager.page_arrow(start_row - 1, page_size), use_container_width=True)
         
-        st.markdown(f"**Hiển thị records {start_idx + 1}-{end_idx} trong tổng số {total_rows:,} records**")
+        st.markdown(
+            f"**Hiển thị records {start_row:,}-{end_row:,} trong tổng số {total_rows:,} records**"
+            + (f" (lọc từ {df.height:,})" if total_rows != df.height else "")
+        )
     
     def run(self):
         """Chạy dashboard tài xế"""
@@ -37,4 +37,623 @@ try:
 except Exception as e:
     print(f"❌ Error: {e}")
     import traceback
-    traceback.print_exc() 
\ No newline at end of file
+    traceback.print_exc() 
+
+
+# ----- Test hành vi (pytest) -----
+
+import os
+import numpy as np
+import polars as pl
+import pytest
+from datetime import date, datetime, timedelta
+
+
+def test_query_merchants_keyset_pages_are_stable():
+    """Keyset pagination: các trang nối tiếp không trùng, không sót và cùng thứ tự với sort toàn bộ (kể cả giá trị trùng)"""
+    from data_analyzer import DataAnalyzer
+
+    # 40 merchant, số giao dịch chỉ có 4 mức: nhiều giá trị trùng nằm ở ranh giới trang
+    merchants = [f"M{i:02d}" for i in range(40)]
+    rows = [merchant for i, merchant in enumerate(merchants) for _ in range(1 + i % 4)]
+    df = pl.DataFrame({
+        'MERCHANT': rows,
+        'TOTAL_AMOUNT': [1000.0] * len(rows),
+        'RECONCILE_STATUS': ['match' if i % 3 else 'not_found_in_m' for i in range(len(rows))]
+    })
+
+    analyzer = DataAnalyzer()
+    pages, cursor = [], None
+    while True:
+        result = analyzer.query_merchants(df, sort_by='volume', page_size=7, cursor=cursor)
+        pages.append([row['MERCHANT'] for row in result['merchants']])
+        cursor = result['next_cursor']
+        if cursor is None:
+            break
+
+    seen = [merchant for page in pages for merchant in page]
+    assert len(seen) == len(set(seen)) == len(merchants)
+    assert all(len(page) == 7 for page in pages[:-1])
+    expected = (
+        df.group_by('MERCHANT').agg(pl.count().alias('n'))
+        .sort(['n', 'MERCHANT'], descending=[True, False])['MERCHANT'].to_list()
+    )
+    assert seen == expected
+    assert result['total_matching'] == len(merchants)
+
+    # Cùng cursor cho cùng trang
+    first = analyzer.query_merchants(df, page_size=7)
+    again = analyzer.query_merchants(df, page_size=7, cursor=first['next_cursor'])
+    assert [row['MERCHANT'] for row in again['merchants']] == pages[1]
+
+
+def test_query_merchants_null_merchant_and_sort_validation():
+    """MERCHANT null không làm mất / lặp dòng giữa các trang, sort_by không hỗ trợ bị từ chối"""
+    from data_analyzer import DataAnalyzer
+
+    df = pl.DataFrame({
+        'MERCHANT': ['a', 'b', None, 'c', 'd', None, 'e'] * 3,
+        'TOTAL_AMOUNT': [1.0, None, 2.0, None, 5.0, 3.0, 1.0] * 3,
+        'RECONCILE_STATUS': ['match'] * 21
+    })
+
+    analyzer = DataAnalyzer()
+    seen, cursor = [], None
+    while True:
+        result = analyzer.query_merchants(df, sort_by='amount', page_size=2, cursor=cursor)
+        seen.extend(row['MERCHANT'] for row in result['merchants'])
+        cursor = result['next_cursor']
+        if cursor is None:
+            break
+
+    assert len(seen) == 6
+    assert set(seen) == {'a', 'b', 'c', 'd', 'e', None}
+
+    with pytest.raises(ValueError):
+        analyzer.query_merchants(df, sort_by='merchant_name')
+
+
+def test_time_anomalies_compare_each_row_with_its_own_day():
+    """Dữ liệu nhiều ngày: mỗi dòng so với cột DATE của nó, không phải ngày xuất hiện nhiều nhất"""
+    from data_analyzer import DataAnalyzer
+
+    days = [date(2025, 7, 1), date(2025, 7, 2), date(2025, 7, 3)]
+    rows = [(day, datetime.combine(day, datetime.min.time()) + timedelta(hours=hour))
+            for day in days for hour in range(2, 20, 3)]
+    # Một đơn của ngày 02 có thời gian ngày 03
+    rows.append((days[1], datetime(2025, 7, 3, 1, 0)))
+    df = pl.DataFrame({
+        'ORDER_ID': [f"O{i}" for i in range(len(rows))],
+        'DATE': [day for day, _ in rows],
+        'ORDER_TIME': [ts for _, ts in rows]
+    })
+
+    result = DataAnalyzer().analyze_time_anomalies(df)
+    assert result['outside_file_date_count'] == 1
+    assert result['samples'][0]['ORDER_ID'] == f"O{len(rows) - 1}"
+    assert result['samples'][0]['day_offset'] == 1
+
+    # Một ngày không có DATE: so với ngày xuất hiện nhiều nhất
+    single_day = df.filter(pl.col('DATE') == days[1]).drop('DATE')
+    assert DataAnalyzer().analyze_time_anomalies(single_day)['outside_file_date_count'] == 1
+
+def test_day_cache_concurrent_saves_keep_every_artifact(tmp_path):
+    """Nhiều thread cùng ghi artifact của một ngày: manifest không mất tên nào, không còn file tạm"""
+    from concurrent.futures import ThreadPoolExecutor
+    from day_cache import DayCache
+
+    cache_dir = str(tmp_path / '_cache')
+    names = [f"artifact_{i}" for i in range(32)]
+
+    def save(name):
+        DayCache(cache_dir).save_frame('20250701', name, 'fp', pl.DataFrame({'name': [name]}))
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(save, names))
+
+    cache = DayCache(cache_dir)
+    assert sorted(cache.list_artifacts('20250701')) == sorted(names)
+    assert all(cache.load_frame('20250701', name, 'fp')['name'][0] == name for name in names)
+    assert not [name for name in os.listdir(tmp_path / '_cache' / '20250701') if name.endswith('.tmp')]
+
+def _daily_history(transaction_counts, discrepancy_counts, start: date = date(2025, 7, 1)) -> pl.DataFrame:
+    """Rollup dạng long của dimension 'total' cho các ngày liên tiếp"""
+    days = len(transaction_counts)
+    return pl.DataFrame({
+        'dimension': ['total'] * days,
+        'key': ['all'] * days,
+        'DATE': [start + timedelta(days=i) for i in range(days)],
+        'transaction_count': transaction_counts,
+        'match_count': [count - bad for count, bad in zip(transaction_counts, discrepancy_counts)],
+        'discrepancy_count': discrepancy_counts,
+        'total_amount': [count * 1000.0 for count in transaction_counts]
+    })
+
+
+def test_anomaly_detector_flags_jump_against_previous_days():
+    """Chỉ ngày nhảy vọt bị gắn cờ; chưa đủ min_history ngày thì chưa có z-score"""
+    from anomaly_detector import AnomalyDetector
+
+    counts = [1000 + (17 * i) % 41 for i in range(20)] + [2000]
+    history = _daily_history(counts, [50 + (7 * i) % 11 for i in range(21)])
+    detector = AnomalyDetector(None)
+
+    anomalies = detector.detect(history, metrics=['transaction_count'])
+    assert anomalies['DATE'].to_list() == [date(2025, 7, 21)]
+    assert anomalies['z_score'][0] > 3
+
+    scored = detector.score(history, metrics=['transaction_count']).sort('DATE')
+    assert scored['z_score'].head(7).is_null().all()
+    assert scored['z_score'].slice(7, 13).abs().max() < 3
+
+
+def test_anomaly_floor_on_flat_baseline():
+    """Lịch sử phẳng (std = 0): thay đổi nhỏ không bị gắn cờ, nhảy vọt có z-score hữu hạn và bị gắn cờ"""
+    from anomaly_detector import AnomalyDetector
+
+    history = _daily_history([1000] * 14 + [1005, 1500], [0] * 14 + [0, 750])
+    detector = AnomalyDetector(None)
+    metrics = ['transaction_count', 'discrepancy_rate']
+
+    scored = detector.score(history, metrics=metrics)
+    z_scores = {(row['DATE'], row['metric']): row['z_score'] for row in scored.iter_rows(named=True)}
+    small_change, jump = date(2025, 7, 15), date(2025, 7, 16)
+    # Sàn tương đối 1% của baseline 1000: +5 giao dịch chỉ là z = 0.5
+    assert z_scores[(small_change, 'transaction_count')] == pytest.approx(0.5)
+    assert z_scores[(small_change, 'discrepancy_rate')] == 0
+
+    anomalies = detector.detect(history, metrics=metrics)
+    assert set(anomalies['DATE'].to_list()) == {jump}
+    assert set(anomalies['metric'].to_list()) == set(metrics)
+    assert anomalies['z_score'].is_finite().all()
+
+
+def test_hll_estimate_within_error_bound():
+    """Ước lượng HLL nằm trong sai số ~3 lần 1.04/sqrt(m), merge hai sketch bằng ước lượng của hợp"""
+    from rollup_store import HLL_PRECISION, HLL_SEEDS, hll_estimate, hll_registers
+
+    def order_hashes(order_ids):
+        return pl.Series('ORDER_ID', order_ids, dtype=pl.Utf8).hash(*HLL_SEEDS).to_numpy()
+
+    tolerance = 3 * 1.04 / np.sqrt(1 << HLL_PRECISION)
+
+    for n in (100, 10_000, 200_000):
+        hashes = order_hashes([f"ORDER{i:08d}" for i in range(n)])
+        # Trùng lặp không làm thay đổi ước lượng
+        registers = hll_registers(np.concatenate([hashes, hashes[: n // 2]]))
+        assert abs(hll_estimate(registers) - n) <= tolerance * n
+
+    first = hll_registers(order_hashes([f"ORDER{i:08d}" for i in range(0, 60_000)]))
+    second = hll_registers(order_hashes([f"ORDER{i:08d}" for i in range(40_000, 100_000)]))
+    assert abs(hll_estimate(np.maximum(first, second)) - 100_000) <= tolerance * 100_000
+    assert hll_estimate(hll_registers(np.zeros(0, dtype=np.uint64))) == 0
+
+
+def test_day_cache_commits_artifacts_together(tmp_path):
+    """Rollup / sketch / Bloom filter của ngày được commit cùng lúc: lỗi ở một file thì không file nào được đọc"""
+    from day_cache import DayCache
+
+    cache = DayCache(str(tmp_path / '_cache'))
+    frame = pl.DataFrame({'a': [1, 2]})
+
+    class DiskFullFrame(pl.DataFrame):
+        def write_parquet(self, *args, **kwargs):
+            raise OSError('No space left on device')
+
+    broken = DiskFullFrame({'a': [3]})
+
+    cache.save_frames('20250701', 'fp', {'rollup': frame, 'sketch': frame, 'bloom': broken})
+    assert cache.list_artifacts('20250701') == []
+    assert cache.load_frame('20250701', 'rollup', 'fp') is None
+    assert not [name for name in os.listdir(tmp_path / '_cache' / '20250701') if name.endswith('.tmp')]
+
+    cache.save_frames('20250701', 'fp', {'rollup': frame, 'sketch': frame, 'bloom': frame})
+    assert cache.list_artifacts('20250701') == ['rollup', 'sketch', 'bloom']
+    assert cache.load_frame('20250701', 'sketch', 'fp').equals(frame)
+
+def _write_day_file(base_path, date_str: str, frame: pl.DataFrame, version_2: bool = False) -> str:
+    """Ghi file reconciled của ngày vào base_path/YYYY/MM/DD (file _2 nếu version_2)"""
+    folder = base_path / date_str[:4] / date_str[4:6] / date_str[6:8]
+    folder.mkdir(parents=True, exist_ok=True)
+    path = folder / f"pvi_transaction_reconciled_{date_str}{'_2' if version_2 else ''}.csv"
+    frame.write_csv(path)
+    return str(path)
+
+
+def test_transition_tracker_counts(tmp_path, monkeypatch):
+    """Chuyển trạng thái giữa file gốc, file _2 và ngày sau; đơn biến mất tính là 'absent'"""
+    from csv_reader import CSVDataReader
+    from transition_tracker import TransitionTracker
+
+    monkeypatch.delenv('GSM_CACHE_PATH', raising=False)
+    _write_day_file(tmp_path, '20250701', pl.DataFrame({
+        'ORDER_ID': ['A', 'B', 'C'], 'RECONCILE_STATUS': ['match', 'not_found_in_m', 'not_found_in_external']
+    }))
+    _write_day_file(tmp_path, '20250701', pl.DataFrame({
+        'ORDER_ID': ['A', 'B', 'C'], 'RECONCILE_STATUS': ['match', 'match', 'not_found_in_external']
+    }), version_2=True)
+    _write_day_file(tmp_path, '20250702', pl.DataFrame({
+        'ORDER_ID': ['A', 'C', 'D'], 'RECONCILE_STATUS': ['match', 'match', 'not_found_in_m']
+    }))
+
+    tracker = TransitionTracker(CSVDataReader(str(tmp_path)))
+    result = tracker.track(date(2025, 7, 1), date(2025, 7, 2))
+    assert result['steps'] == ['20250701', '20250701_2', '20250702']
+
+    counts = {(row['from_status'], row['to_status']): row['count'] for row in result['transitions'].iter_rows(named=True)}
+    assert counts == {
+        ('match', 'match'): 2,
+        ('not_found_in_m', 'match'): 1,
+        ('not_found_in_external', 'not_found_in_external'): 1,
+        ('not_found_in_external', 'match'): 1,
+        ('match', 'absent'): 1
+    }
+
+    summary = tracker.summarize(result)
+    assert summary['resolved_transitions'] == 2
+    assert summary['regressed_transitions'] == 0
+    assert summary['unresolved'] == 1
+    assert tracker.unresolved_orders(result['state'])['ORDER_ID'].to_list() == ['D']
+
+
+def test_status_index_follows_its_own_file(tmp_path, monkeypatch):
+    """Index status của file gốc được tính lại khi file gốc đổi, kể cả khi file _2 của ngày không đổi"""
+    from csv_reader import CSVDataReader
+    from transition_tracker import TransitionTracker
+
+    monkeypatch.delenv('GSM_CACHE_PATH', raising=False)
+    original = _write_day_file(tmp_path, '20250701', pl.DataFrame({'ORDER_ID': ['A'], 'RECONCILE_STATUS': ['not_found_in_m']}))
+    _write_day_file(tmp_path, '20250701', pl.DataFrame({'ORDER_ID': ['A'], 'RECONCILE_STATUS': ['match']}), version_2=True)
+
+    tracker = TransitionTracker(CSVDataReader(str(tmp_path)))
+    assert tracker.load_status_index('20250701', original)['status'].to_list() == ['not_found_in_m']
+
+    _write_day_file(tmp_path, '20250701', pl.DataFrame({
+        'ORDER_ID': ['A', 'B'], 'RECONCILE_STATUS': ['not_found_in_external', 'match']
+    }))
+    tracker = TransitionTracker(CSVDataReader(str(tmp_path)))
+    assert tracker.load_status_index('20250701', original)['status'].to_list() == ['not_found_in_external', 'match']
+
+def test_version_diff_counts(tmp_path, monkeypatch):
+    """Diff file gốc / file _2: added, removed, status_changed, amount_changed và tổng chênh lệch amount"""
+    from csv_reader import CSVDataReader
+    from version_diff import VersionDiff
+
+    monkeypatch.delenv('GSM_CACHE_PATH', raising=False)
+    _write_day_file(tmp_path, '20250701', pl.DataFrame({
+        'ORDER_ID': ['A', 'B', 'C', 'E'],
+        'RECONCILE_STATUS': ['match', 'not_found_in_m', 'match', 'match'],
+        'TOTAL_AMOUNT': [100, 200, 300, 400]
+    }))
+    _write_day_file(tmp_path, '20250701', pl.DataFrame({
+        'ORDER_ID': ['A', 'B', 'C', 'D'],
+        'RECONCILE_STATUS': ['match', 'match', 'match', 'match'],
+        'TOTAL_AMOUNT': [100, 200, 350, 50]
+    }), version_2=True)
+
+    diff = VersionDiff(CSVDataReader(str(tmp_path))).get_diff('20250701')
+    summary = diff['summary']
+    assert (summary['rows_original'], summary['rows_version_2']) == (4, 4)
+    assert (summary['added'], summary['removed'], summary['status_changed'],
+            summary['amount_changed'], summary['unchanged']) == (1, 1, 1, 1, 1)
+    assert summary['TOTAL_AMOUNT_delta'] == 50 + 50 - 400
+
+    changes = dict(zip(diff['details']['ORDER_ID'].to_list(), diff['details']['change_type'].to_list()))
+    assert changes == {'B': 'status_changed', 'C': 'amount_changed', 'D': 'added', 'E': 'removed'}
+    assert diff['status_changes'].rows() == [('not_found_in_m', 'match', 1)]
+
+    # Lần sau đọc từ DayCache, cùng kết quả
+    assert VersionDiff(CSVDataReader(str(tmp_path))).get_diff('20250701')['summary'] == summary
+
+
+def test_bloom_has_no_false_negatives():
+    """Bloom filter ORDER_ID: mọi ID đã thêm đều có, tỷ lệ dương tính giả gần mức thiết kế (~1%)"""
+    from order_index import bloom_contains, build_bloom, hash_order_ids
+
+    members = [f"ORDER{i:08d}" for i in range(50_000)]
+    bloom = build_bloom(hash_order_ids(members))
+    assert bloom_contains(bloom, hash_order_ids(members)).all()
+
+    others = [f"OTHER{i:08d}" for i in range(50_000)]
+    assert bloom_contains(bloom, hash_order_ids(others)).mean() < 0.03
+
+    empty = build_bloom(hash_order_ids([]))
+    assert not bloom_contains(empty, hash_order_ids(members[:10])).any()
+
+
+def _encode_ulid(created_at: datetime, suffix: str = 'ABCDEFGHJKMNPQRS') -> str:
+    """ULID có timestamp created_at (UTC) và phần ngẫu nhiên cố định"""
+    from order_ulid import CROCKFORD_ALPHABET
+
+    ms = int((created_at - datetime(1970, 1, 1)).total_seconds() * 1000)
+    chars = []
+    for _ in range(10):
+        ms, digit = divmod(ms, 32)
+        chars.append(CROCKFORD_ALPHABET[digit])
+    return ''.join(reversed(chars)) + suffix
+
+
+def test_ulid_timestamp_decode():
+    """Giải mã thời điểm tạo trong ULID (giờ Việt Nam), ID không phải ULID cho null"""
+    from order_ulid import decode_ulid_times, route_order_ids
+
+    created_utc = datetime(2025, 7, 1, 17, 30, 15, 123000)
+    ulid = _encode_ulid(created_utc)
+    times = decode_ulid_times([ulid, ulid.lower(), 'ORDER-123', '', None])
+
+    # UTC+7: 17:30 UTC ngày 01/07 là 00:30 ngày 02/07 giờ địa phương
+    expected = datetime(2025, 7, 2, 0, 30, 15, 123000)
+    assert times.to_list() == [expected, expected, None, None, None]
+
+    routes, unroutable = route_order_ids([ulid, 'ORDER-123'])
+    assert routes == {'20250702': [ulid], '20250703': [ulid]}
+    assert unroutable == ['ORDER-123']
+
+
+def test_order_row_index_finds_rows_in_file_order(tmp_path, monkeypatch):
+    """Index ORDER_ID -> dòng: lấy đúng các dòng (kể cả ID lặp) theo thứ tự file, ID không có bị bỏ qua"""
+    from csv_reader import CSVDataReader
+    from order_index import OrderRowIndex
+
+    monkeypatch.delenv('GSM_CACHE_PATH', raising=False)
+    ids = [f"O{(i * 37) % 1000:04d}" for i in range(1000)] + ['O0005']
+    path = _write_day_file(tmp_path, '20250701', pl.DataFrame({'ORDER_ID': ids, 'AMOUNT': list(range(len(ids)))}))
+
+    reader = CSVDataReader(str(tmp_path))
+    df = reader.read_csv_polars(path)
+    wanted = ['O0005', 'O0999', 'O0500', 'MISSING']
+
+    found = OrderRowIndex(reader).find_in_frame(df, '20250701', wanted)
+    assert found is not None
+    assert found.equals(df.filter(pl.col('ORDER_ID').is_in(wanted)))
+    assert found['ORDER_ID'].to_list().count('O0005') == 2
+
+
+def test_bulk_search_found_and_not_found():
+    """Tìm hàng loạt: mọi dòng của ID tìm thấy, ID không có trong dữ liệu, file ID trùng lặp được gộp"""
+    from bulk_search import BulkOrderSearch, parse_order_id_file
+
+    df = pl.DataFrame({
+        'ORDER_ID': ['A1', 'A2', 'A2', 'A3', 'A4'],
+        'RECONCILE_STATUS': ['match', 'match', 'not_found_in_m', 'match', 'not_found_in_external']
+    })
+
+    order_ids = parse_order_id_file(b"ORDER_ID,NOTE\nA2,x\nA3,y\nZ9,z\nA2,w\n", 'ids.csv')
+    assert order_ids['ORDER_ID'].to_list() == ['A2', 'A3', 'Z9']
+
+    result = BulkOrderSearch(None).search_frame(df, order_ids)
+    assert result['requested'] == 3
+    assert result['found_ids'] == 2
+    assert sorted(result['found']['ORDER_ID'].to_list()) == ['A2', 'A2', 'A3']
+    assert result['not_found']['ORDER_ID'].to_list() == ['Z9']
+
+    text_ids = parse_order_id_file(b"A1, A4;Z9\n\nA1\n", 'ids.txt')
+    assert text_ids['ORDER_ID'].to_list() == ['A1', 'A4', 'Z9']
+
+
+def test_order_id_file_header_row():
+    """File ID không có cột ORDER_ID: header khác không bị tính là ID, số 0 ở đầu ID được giữ"""
+    from bulk_search import parse_order_id_file
+
+    assert parse_order_id_file("Mã đơn\n0001A\n0002B\n".encode('utf-8'), 'ids.csv')['ORDER_ID'].to_list() == ['0001A', '0002B']
+    assert parse_order_id_file(b"0001A\n0002B\n", 'ids.csv')['ORDER_ID'].to_list() == ['0001A', '0002B']
+    assert parse_order_id_file(b"Order ID\n0001A\n", 'ids.csv')['ORDER_ID'].to_list() == ['0001A']
+
+
+def test_merchant_index_search():
+    """Tìm merchant: bỏ dấu, khớp chuỗi con trước (trùng / bắt đầu bằng query xếp đầu), rồi khớp gần đúng"""
+    from merchant_index import MerchantIndex
+
+    index = MerchantIndex(pl.DataFrame({
+        'MERCHANT': ['Cà Phê Sữa Đá', 'Cafe Hà Nội', 'Bánh Mì Phượng', 'Phở Thìn', 'Grab Food', 'Phở'],
+        'count': [5, 50, 20, 10, 100, 1]
+    }))
+
+    assert index.search('')[:2] == ['Grab Food', 'Cafe Hà Nội']
+    assert index.search('pho', fuzzy=False) == ['Phở', 'Phở Thìn']
+    assert index.search('ca phe', fuzzy=False) == ['Cà Phê Sữa Đá']
+    assert index.search('banh mi phuog', fuzzy=False) == []
+    assert index.search('banh mi phuog') == ['Bánh Mì Phượng']
+
+
+def test_data_pager_sort_filter_page_at_large_offset():
+    """Pager phía server: trang ở offset lớn khớp với sort / filter trên toàn bộ dữ liệu"""
+    from data_pager import DataPager
+
+    n = 200_000
+    df = pl.DataFrame({
+        'ORDER_ID': [f"O{i:07d}" for i in range(n)],
+        'AMOUNT': (np.arange(n) * 7919) % 100_003,
+        'MERCHANT': [f"M{i % 97}" for i in range(n)]
+    })
+    pager = DataPager(df)
+
+    assert pager.set_view() == n
+    assert pager.page(150_000, 10).equals(df.slice(150_000, 10))
+
+    total = pager.set_view(sort_by='AMOUNT', descending=True, filters={'MERCHANT': 'm1', 'AMOUNT': '>=500'})
+    expected = df.lazy().filter(
+        pl.col('MERCHANT').str.to_lowercase().str.contains('m1', literal=True) & (pl.col('AMOUNT') >= 500)
+    ).sort('AMOUNT', descending=True, maintain_order=True).collect()
+    assert total == expected.height
+    offset = expected.height - 25
+    assert pager.page(offset, 10).equals(expected.slice(offset, 10))
+    assert pager.page(offset + 20, 10).equals(expected.slice(offset + 20, 10))
+
+    # Bộ lọc không đúng kiểu cột bị bỏ qua
+    assert pager.set_view(filters={'AMOUNT': 'abc'}) == n
+
+
+def test_profile_frame_stats():
+    """Profile một lượt: null, min / max, số giá trị khác nhau và giá trị phổ biến nhất của từng cột"""
+    from column_profile import profile_frame
+
+    df = pl.DataFrame({
+        'AMOUNT': [1.0, None, 3.0, 3.0],
+        'RECONCILE_STATUS': ['match', 'match', None, 'not_found_in_m']
+    })
+    profile = {row['column']: row for row in profile_frame(df).iter_rows(named=True)}
+
+    amount = profile['AMOUNT']
+    assert (amount['null_count'], amount['null_pct']) == (1, 25.0)
+    assert (amount['min'], amount['max']) == ('1.00', '3.00')
+    assert amount['top_values'].startswith('3.00 (2)')
+
+    status = profile['RECONCILE_STATUS']
+    assert status['null_count'] == 1
+    assert status['distinct_estimate'] == 2
+    assert status['top_values'].startswith('match (2)')
+
+
+def test_lttb_keeps_endpoints_and_point_count():
+    """LTTB giữ điểm đầu / cuối và trả đúng số điểm yêu cầu; minmax giữ đỉnh của chuỗi"""
+    from downsample import downsample_points, lttb_indices
+
+    x = np.arange(10_000, dtype=np.float64)
+    y = np.sin(x / 50.0)
+    indices = lttb_indices(x, y, 500)
+    assert len(indices) == 500
+    assert indices[0] == 0 and indices[-1] == len(x) - 1
+    assert np.all(np.diff(indices) > 0)
+
+    # Chuỗi ngắn hơn số điểm thì giữ nguyên
+    assert len(lttb_indices(x[:100], y[:100], 500)) == 100
+
+    start = datetime(2025, 7, 1)
+    values = y.copy()
+    values[1234] = 100.0
+    series = pl.DataFrame({
+        'time': [start + timedelta(seconds=int(i)) for i in x],
+        'value': values
+    })
+    lttb = downsample_points(series, 'value', points=500)
+    assert lttb.height == 500
+    assert lttb['time'][0] == series['time'][0] and lttb['time'][-1] == series['time'][-1]
+
+    minmax = downsample_points(series, 'value', points=500, method='minmax')
+    assert minmax.height <= 500
+    assert minmax['value'].max() == 100.0
+
+
+def test_data_pager_drilldown_without_row_limit():
+    """Drill-down (where) trả đủ mọi dòng khớp, trang cuối ở offset lớn đúng thứ tự sort"""
+    from data_pager import DataPager
+
+    n = 300_000
+    statuses = ['match', 'not_found_in_m', 'not_found_in_external']
+    df = pl.DataFrame({
+        'ORDER_ID': [f"O{(i * 7919) % n:07d}" for i in range(n)],
+        'RECONCILE_STATUS': [statuses[i % 3] for i in range(n)]
+    })
+    where = {'RECONCILE_STATUS': ['not_found_in_m', 'not_found_in_external']}
+
+    pager = DataPager(df)
+    total = pager.set_view(sort_by='ORDER_ID', descending=True, where=where)
+    expected = df.filter(pl.col('RECONCILE_STATUS').is_in(where['RECONCILE_STATUS'])).sort('ORDER_ID', descending=True)
+
+    assert total == expected.height == 200_000
+    assert pager.page(total - 100, 100).equals(expected.tail(100))
+    assert pager.frame().equals(expected)
+
+
+def test_facet_index_counts_match_filter():
+    """Số đếm của FacetIndex (container bitset và mảng vị trí thưa) khớp với df.filter(...).height"""
+    from facet_index import FacetIndex
+
+    rng = np.random.default_rng(7)
+    n = 5_000
+    df = pl.DataFrame({
+        'RECONCILE_STATUS': rng.choice(['match', 'not_found_in_m', 'not_found_in_external'], n, p=[0.8, 0.12, 0.08]).tolist(),
+        'SERVICE_TYPE': rng.choice(['normal', 'express'], n).tolist(),
+        # Merchant lớn dùng bitset, merchant nhỏ (< 1/32 số dòng) dùng mảng vị trí; có cả null
+        'MERCHANT': rng.choice(['big_a', 'big_b', 'small_1', 'small_2', None], n, p=[0.5, 0.44, 0.02, 0.02, 0.02]).tolist()
+    }, schema={'RECONCILE_STATUS': pl.Utf8, 'SERVICE_TYPE': pl.Utf8, 'MERCHANT': pl.Utf8})
+    index = FacetIndex(df)
+
+    merchant_containers = index._containers['MERCHANT']
+    assert merchant_containers['big_a'].dtype == np.uint8 and merchant_containers['small_1'].dtype == np.uint32
+    assert None not in merchant_containers
+
+    selections = {'RECONCILE_STATUS': ['match', 'not_found_in_m'], 'MERCHANT': ['big_a', 'small_1']}
+    status_filter = pl.col('RECONCILE_STATUS').is_in(selections['RECONCILE_STATUS'])
+    assert index.count(selections) == df.filter(status_filter & pl.col('MERCHANT').is_in(selections['MERCHANT'])).height
+    assert index.count({}) == n
+
+    # Số đếm facet của MERCHANT bỏ qua bộ lọc của chính MERCHANT
+    counts = index.facet_counts('MERCHANT', selections)
+    for merchant in ['big_a', 'big_b', 'small_1', 'small_2']:
+        assert counts[merchant] == df.filter(status_filter & (pl.col('MERCHANT') == merchant)).height
+
+    status_counts = index.facet_counts('RECONCILE_STATUS', selections)
+    for status in ['match', 'not_found_in_m', 'not_found_in_external']:
+        assert status_counts[status] == df.filter(
+            (pl.col('RECONCILE_STATUS') == status) & pl.col('MERCHANT').is_in(selections['MERCHANT'])
+        ).height
+
+
+def test_write_export_round_trip(tmp_path):
+    """Export theo chunk ra CSV / CSV gzip / Parquet đọc lại đúng dữ liệu (header chỉ ghi một lần)"""
+    import gzip
+    from data_export import frame_chunks, write_export
+
+    df = pl.DataFrame({
+        'ORDER_ID': [f"O{i:05d}" for i in range(250)],
+        'AMOUNT': list(range(250)),
+        'RECONCILE_STATUS': [None if i % 50 == 0 else 'match' for i in range(250)]
+    })
+    readers = {
+        'csv': lambda path: pl.read_csv(path),
+        'csv_gz': lambda path: pl.read_csv(gzip.open(path).read()),
+        'parquet': lambda path: pl.read_parquet(path)
+    }
+
+    for fmt, read in readers.items():
+        path = str(tmp_path / f"export_{fmt}")
+        assert write_export(frame_chunks(df, rows=100), path, fmt) == 250
+        assert read(path).equals(df)
+
+    # Dữ liệu rỗng vẫn có header / schema
+    path = str(tmp_path / 'empty.csv')
+    assert write_export(frame_chunks(df.head(0)), path, 'csv') == 0
+    assert pl.read_csv(path).columns == df.columns
+
+
+def test_day_cache_skips_missing_base_path(tmp_path):
+    """base_path không tồn tại (vd ổ F: trên máy khác): không tạo thư mục cache, vẫn trả kết quả tính được"""
+    from day_cache import DayCache
+
+    cache_dir = tmp_path / 'missing_base' / '_cache'
+    cache = DayCache(str(cache_dir))
+    result = cache.get_or_compute('20250701', 'profile', 'fp', lambda: pl.DataFrame({'a': [1]}))
+
+    assert result['a'].to_list() == [1]
+    assert not (tmp_path / 'missing_base').exists()
+
+
+def test_date_range_reads_mirrored_days_through_hive_scan(tmp_path, monkeypatch):
+    """Khoảng ngày: ngày đã mirror đọc qua scan Hive (DATE từ partition), ngày chưa mirror / file nguồn đã đổi đọc CSV"""
+    from csv_reader import CSVDataReader
+    from parquet_mirror import ParquetMirror
+
+    monkeypatch.delenv('GSM_CACHE_PATH', raising=False)
+    monkeypatch.delenv('GSM_PARQUET_PATH', raising=False)
+    for day in range(1, 4):
+        _write_day_file(tmp_path, f"202507{day:02d}", pl.DataFrame({
+            'ORDER_ID': [f"D{day}-{i}" for i in range(day * 10)],
+            'TOTAL_AMOUNT': [day * 1000] * (day * 10)
+        }))
+
+    reader = CSVDataReader(str(tmp_path))
+    mirror = ParquetMirror(reader)
+    stats = mirror.sync(date(2025, 7, 1), date(2025, 7, 2), ('reconciled',))
+    assert (stats['converted'], stats['rows']) == (2, 30)
+    assert len(mirror.scan_range(['20250701', '20250702'])) == 1
+
+    # File nguồn của ngày 02 đổi sau khi mirror: ngày đó đọc lại từ CSV
+    _write_day_file(tmp_path, '20250702', pl.DataFrame({'ORDER_ID': ['D2-new'], 'TOTAL_AMOUNT': [5]}), version_2=True)
+
+    df = reader.load_date_range(date(2025, 7, 1), date(2025, 7, 3), columns=['ORDER_ID', 'TOTAL_AMOUNT', 'DATE'])
+    counts = dict(df.group_by('DATE').agg(pl.count()).iter_rows())
+    assert counts == {date(2025, 7, 1): 10, date(2025, 7, 2): 1, date(2025, 7, 3): 30}
+    assert df['DATE'].is_sorted()
+    assert df.filter(pl.col('DATE') == date(2025, 7, 1))['TOTAL_AMOUNT'].to_list() == [1000] * 10
@@ -0,0 +1,203 @@
+import os
+import polars as pl
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterator, Tuple
+
+# Trạng thái dùng cho đơn không xuất hiện ở bước tiếp theo
+ABSENT_STATUS = 'absent'
+RESOLVED_STATUS = 'match'
+
+class TransitionTracker:
+    """
+    Theo dõi RECONCILE_STATUS của từng ORDER_ID qua các ngày liên tiếp (và từ file gốc sang file _2).
+    Mỗi file chỉ được đọc 2 cột (ORDER_ID, RECONCILE_STATUS) thành index sắp xếp theo ORDER_ID,
+    lưu trong DayCache; khi duyệt chỉ giữ index của bước trước và các đơn chưa match.
+    """
+
+    def __init__(self, reader, file_type: str = 'reconciled'):
+        self.reader = reader
+        self.file_type = file_type
+
+    def _index_name(self, version: str) -> str:
+        return f"status_index_{self.file_type}_{version}"
+
+    def iter_steps(self, start_date: date, end_date: date, include_versions: bool = True) -> Iterator[Tuple[str, str, str]]:
+        """
+        Các bước theo thứ tự thời gian: (label, date_str, file_path).
+        Ngày có file _2 thì file gốc là một bước trước file _2 (nếu include_versions).
+        """
+        base_name = self.reader.file_types.get(self.file_type, 'pvi_transaction_reconciled_')
+        current = start_date
+        while current <= end_date:
+            date_str = current.strftime('%Y%m%d')
+            folder = self.reader.get_day_folder(date_str)
+            original = os.path.join(folder, f"{base_name}{date_str}.csv")
+            version_2 = os.path.join(folder, f"{base_name}{date_str}_2.csv")
+
+            if os.path.exists(version_2):
+                if include_versions and os.path.exists(original):
+                    yield f"{date_str}", date_str, original
+                yield f"{date_str}_2", date_str, version_2
+            elif os.path.exists(original):
+                yield f"{date_str}", date_str, original
+            current += timedelta(days=1)
+
+    def load_status_index(self, date_str: str, file_path: str) -> pl.DataFrame:
+        """Index (ORDER_ID, status) sắp xếp theo ORDER_ID, mỗi ORDER_ID một dòng (lấy dòng cuối)"""
+        version = 'v2' if file_path.endswith('_2.csv') else 'v1'
+        cache = self.reader.get_day_cache()
+        # Fingerprint của ngày theo file được ưu tiên (_2) như các artifact khác của ngày;
+        # tên artifact gắn fingerprint của file_path nên index v1 được tính lại khi file gốc đổi
+        best_file = self.reader.find_best_file(self.reader.get_day_folder(date_str), date_str, self.file_type)
+        fingerprint = cache.file_fingerprint(best_file)
+        name = f"{self._index_name(version)}_{cache.file_fingerprint(file_path)[:8]}"
+
+        def compute() -> pl.DataFrame:
+            lf = self.reader.scan_csv_polars(file_path)
+            if 'ORDER_ID' not in lf.columns or 'RECONCILE_STATUS' not in lf.columns:
+                return pl.DataFrame(schema={'ORDER_ID': pl.Utf8, 'status': pl.Utf8})
+
+            return (
+                lf.select([
+                    pl.col('ORDER_ID').cast(pl.Utf8),
+                    pl.col('RECONCILE_STATUS').cast(pl.Utf8).fill_null('Unknown').alias('status')
+                ])
+                .filter(pl.col('ORDER_ID').is_not_null())
+                .unique(subset=['ORDER_ID'], keep='last', maintain_order=True)
+                .sort('ORDER_ID')
+                .collect()
+            )
+
+        index = cache.get_or_compute(date_str, name, fingerprint, compute)
+        return index.set_sorted('ORDER_ID')
+
+    def track(self, start_date: date, end_date: date, include_versions: bool = True) -> Dict:
+        """
+        Duyệt các bước trong khoảng ngày:
+        - transitions: (from_status, to_status, count) giữa 2 lần xuất hiện liên tiếp của một đơn
+          (to_status = 'absent' nếu đơn có ở bước trước nhưng không có ở bước sau)
+        - state: trạng thái cuối cùng của các đơn ở bước cuối + các đơn chưa match từ trước
+        """
+        state = None
+        transitions = []
+        steps = []
+
+        for label, date_str, file_path in self.iter_steps(start_date, end_date, include_versions):
+            index = self.load_status_index(date_str, file_path)
+            step_date = datetime.strptime(date_str, '%Y%m%d').date()
+            steps.append(label)
+
+            if state is None:
+                state = index.select([
+                    'ORDER_ID',
+                    'status',
+                    pl.col('status').alias('first_status'),
+                    pl.lit(step_date).alias('first_seen'),
+                    pl.lit(step_date).alias('last_seen'),
+                    pl.lit(True).alias('in_last_step')
+                ])
+                continue
+
+            joined = state.join(index.rename({'status': 'new_status'}), on='ORDER_ID', how='outer_coalesce')
+
+            # Chuyển trạng thái của các đơn xuất hiện ở cả hai lần liên tiếp
+            transitions.append(
+                joined.filter(pl.col('status').is_not_null() & pl.col('new_status').is_not_null())
+                .group_by(['status', 'new_status']).agg(pl.count().alias('count'))
+            )
+            # Đơn có ở bước trước nhưng biến mất ở bước này
+            transitions.append(
+                joined.filter(pl.col('in_last_step') & pl.col('new_status').is_null())
+                .group_by('status').agg(pl.count().alias('count'))
+                .with_columns(pl.lit(ABSENT_STATUS).alias('new_status'))
+                .select(['status', 'new_status', 'count'])
+            )
+
+            present = pl.col('new_status').is_not_null()
+            state = joined.with_columns([
+                pl.coalesce(['new_status', 'status']).alias('status'),
+                pl.coalesce(['first_status', 'new_status']).alias('first_status'),
+                pl.coalesce([pl.col('first_seen'), pl.lit(step_date)]).alias('first_seen'),
+                pl.when(present).then(pl.lit(step_date)).otherwise(pl.col('last_seen')).alias('last_seen'),
+                present.alias('in_last_step')
+            ]).filter(
+                # Chỉ giữ đơn của bước hiện tại và đơn chưa match từ các bước trước
+                pl.col('in_last_step') | (pl.col('status') != RESOLVED_STATUS)
+            ).drop('new_status')
+
+        if state is None:
+            return {'steps': [], 'transitions': pl.DataFrame(), 'state': pl.DataFrame()}
+
+        if transitions:
+            transitions_df = (
+                pl.concat(transitions)
+                .group_by(['status', 'new_status']).agg(pl.col('count').sum())
+                .rename({'status': 'from_status', 'new_status': 'to_status'})
+                .sort('count', descending=True)
+            )
+        else:
+            transitions_df = pl.DataFrame(schema={'from_status': pl.Utf8, 'to_status': pl.Utf8, 'count': pl.UInt32})
+
+        return {'steps': steps, 'transitions': transitions_df, 'state': state}
+
+    @staticmethod
+    def transition_matrix(transitions: pl.DataFrame) -> pl.DataFrame:
+        """Ma trận from_status (dòng) x to_status (cột)"""
+        if transitions.is_empty():
+            return transitions
+
+        matrix = transitions.pivot(
+            values='count', index='from_status', columns='to_status', aggregate_function='sum'
+        ).fill_null(0).sort('from_status')
+
+        # Cột theo thứ tự tên trạng thái, 'absent' luôn ở cuối
+        status_cols = sorted(col for col in matrix.columns if col not in ('from_status', ABSENT_STATUS))
+        if ABSENT_STATUS in matrix.columns:
+            status_cols.append(ABSENT_STATUS)
+        return matrix.select(['from_status'] + status_cols)
+
+    @staticmethod
+    def unresolved_orders(state: pl.DataFrame) -> pl.DataFrame:
+        """Các đơn có trạng thái cuối cùng chưa phải match, kèm số ngày tồn tại"""
+        if state.is_empty():
+            return state
+
+        return (
+            state.filter(pl.col('status') != RESOLVED_STATUS)
+            .with_columns([
+                ((pl.col('last_seen') - pl.col('first_seen')).dt.total_days() + 1).alias('days_open')
+            ])
+            .select(['ORDER_ID', 'first_status', 'status', 'first_seen', 'last_seen', 'days_open', 'in_last_step'])
+            .sort(['days_open', 'ORDER_ID'], descending=[True, False])
+        )
+
+    @staticmethod
+    def summarize(result: Dict) -> Dict:
+        """
+        Sai lệch tạm thời (resolved_transitions: chuyển sang match ở lần xuất hiện sau)
+        và sai lệch thực (unresolved: vẫn chưa match ở lần xuất hiện cuối)
+        """
+        transitions = result['transitions']
+        state = result['state']
+        if state.is_empty():
+            return {}
+
+        def transition_count(condition: pl.Expr) -> int:
+            if transitions.is_empty():
+                return 0
+            return int(transitions.filter(condition)['count'].sum())
+
+        discrepant = pl.col('from_status') != RESOLVED_STATUS
+        return {
+            'steps': len(result['steps']),
+            'resolved_transitions': transition_count(discrepant & (pl.col('to_status') == RESOLVED_STATUS)),
+            'regressed_transitions': transition_count(
+                (pl.col('from_status') == RESOLVED_STATUS) &
+                (pl.col('to_status') != RESOLVED_STATUS) & (pl.col('to_status') != ABSENT_STATUS)
+            ),
+            'unresolved': int(state.filter(pl.col('status') != RESOLVED_STATUS).height),
+            'unresolved_by_status': dict(
+                state.filter(pl.col('status') != RESOLVED_STATUS)
+                .group_by('status').agg(pl.count().alias('count')).iter_rows()
+            )
+        }
@@ -0,0 +1,158 @@
+import os
+import streamlit as st
+import polars as pl
+from typing import Callable, Dict, Iterable, Optional
+
+from bulk_search import parse_order_id_file
+from csv_reader import MAX_RANGE_SIZE_MB
+from data_export import EXPORT_FORMATS, DataExporter, frame_chunks
+
+# Số dòng tối đa hiển thị trong bảng kết quả tìm hàng loạt (file tải xuống luôn đủ)
+BULK_PREVIEW_ROWS = 1000
+
+# File export tạm dùng chung cho mọi dashboard trong process
+EXPORTER = DataExporter()
+
+
+def file_date_label(info: Dict) -> str:
+    """Ngày của file_info (yyyymmdd), khoảng ngày hiển thị dạng 'date - date_end'"""
+    if info.get('date_end'):
+        return f"{info['date']} - {info['date_end']}"
+    return info.get('date', 'N/A')
+
+
+def range_too_large_message(range_info: Dict) -> str:
+    """Thông báo khi khoảng ngày vượt MAX_RANGE_SIZE_MB"""
+    return (f"❌ Khoảng ngày quá lớn ({range_info['size_mb']:,.0f} MB > {MAX_RANGE_SIZE_MB:,} MB), "
+            f"hãy chọn khoảng ngắn hơn")
+
+
+def read_order_id_file(uploaded_file) -> Optional[pl.DataFrame]:
+    """Đọc file Order ID upload; báo lỗi / file rỗng trên giao diện và trả về None"""
+    try:
+        order_ids = parse_order_id_file(uploaded_file.getvalue(), uploaded_file.name)
+    except Exception as e:
+        st.error(f"❌ Không đọc được file {uploaded_file.name}: {e}")
+        return None
+
+    if order_ids.is_empty():
+        st.warning("⚠️ File không có Order ID nào")
+        return None
+    return order_ids
+
+
+def render_file_download(df: pl.DataFrame, label: str, file_stem: str, key: str, fmt: str = 'csv'):
+    """
+    Nút tải xuống cho kết quả chỉ có trong lần chạy hiện tại (vd ngay sau khi bấm Tìm kiếm):
+    ghi file ngay qua EXPORTER theo chunk, file trước đó của cùng key được xóa
+    """
+    state_key = f"{key}_file"
+    EXPORTER.remove(st.session_state.pop(state_key, None))
+
+    _, extension, mime = EXPORT_FORMATS[fmt]
+    if df.is_empty():
+        st.download_button(label, b"", file_name=f"{file_stem}{extension}", mime=mime,
+                           key=f"{key}_download", disabled=True)
+        return
+
+    path = st.session_state[state_key] = EXPORTER.export(frame_chunks(df), fmt)
+    with open(path, 'rb') as f:
+        st.download_button(label, f, file_name=f"{file_stem}{extension}", mime=mime, key=f"{key}_download")
+
+
+def render_bulk_results(result: Dict, file_prefix: str, key_prefix: str):
+    """Kết quả tìm hàng loạt: số ID tìm thấy / không thấy, bảng kết quả và file tải xuống"""
+    if not result:
+        st.warning("⚠️ Không có dữ liệu (hoặc cột ORDER_ID) để tìm")
+        return
+
+    found, not_found = result['found'], result['not_found']
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("📋 Order ID trong file", f"{result['requested']:,}")
+    with col2:
+        st.metric("✅ Tìm thấy", f"{result['found_ids']:,}")
+    with col3:
+        st.metric("❌ Không tìm thấy", f"{not_found.height:,}")
+    with col4:
+        st.metric("📝 Số bản ghi", f"{found.height:,}")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        render_file_download(found, "📥 Tải các bản ghi tìm thấy (CSV)", f"{file_prefix}_found", f"{key_prefix}_found")
+    with col2:
+        render_file_download(
+            not_found, "📥 Tải Order ID không tìm thấy (CSV)", f"{file_prefix}_not_found", f"{key_prefix}_not_found"
+        )
+
+    if not found.is_empty():
+        st.dataframe(found.head(BULK_PREVIEW_ROWS).to_arrow(), use_container_width=True)
+        if found.height > BULK_PREVIEW_ROWS:
+            st.caption(f"Hiển thị {BULK_PREVIEW_ROWS:,} / {found.height:,} bản ghi, tải CSV để xem đầy đủ")
+
+    if not not_found.is_empty():
+        with st.expander(f"❌ Order ID không tìm thấy ({not_found.height:,})"):
+            st.dataframe(not_found.head(BULK_PREVIEW_ROWS).to_arrow(), use_container_width=True, hide_index=True)
+
+
+def render_export(chunks: Callable[[], Iterable[pl.DataFrame]], file_stem: str, key: str, version=None):
+    """
+    Export kết quả: chọn định dạng (CSV / CSV gzip / Parquet), "Tạo file" ghi dữ liệu theo chunk ra file tạm,
+    nút tải xuống đọc từ file đó. File chỉ dùng lại khi version (dữ liệu) và định dạng không đổi.
+    """
+    fmt = st.selectbox(
+        "Định dạng export:",
+        list(EXPORT_FORMATS),
+        format_func=lambda f: EXPORT_FORMATS[f][0],
+        key=f"{key}_format"
+    )
+    label, extension, mime = EXPORT_FORMATS[fmt]
+    signature = (version, fmt)
+
+    state_key = f"{key}_file"
+    prepared = st.session_state.get(state_key)
+    if prepared is not None and prepared[0] != signature:
+        EXPORTER.remove(prepared[1])
+        prepared = st.session_state[state_key] = None
+
+    if st.button(f"📦 Tạo file {label}", key=f"{key}_prepare"):
+        try:
+            with st.spinner("Đang ghi file export..."):
+                prepared = st.session_state[state_key] = (signature, EXPORTER.export(chunks(), fmt))
+        except Exception as e:
+            st.error(f"❌ Lỗi khi export: {e}")
+
+    if prepared is not None and os.path.exists(prepared[1]):
+        with open(prepared[1], 'rb') as f:
+            st.download_button(
+                label=f"📥 Tải {label}",
+                data=f,
+                file_name=f"{file_stem}{extension}",
+                mime=mime,
+                key=f"{key}_download"
+            )
+
+
+def render_pager_navigation(total_rows: int, page_size: int, row_key: str):
+    """Nút chuyển trang + ô nhảy tới dòng bất kỳ (giá trị lưu trong st.session_state[row_key], tính từ 1)"""
+    last_start = max(1, ((total_rows - 1) // page_size) * page_size + 1)
+
+    def move(delta: int = 0, to: int = None):
+        current = st.session_state.get(row_key, 1)
+        st.session_state[row_key] = max(1, min(last_start, to if to is not None else current + delta))
+
+    col1, col2, col3, col4, col5 = st.columns([1, 1, 3, 1, 1])
+    current = st.session_state.get(row_key, 1)
+    with col1:
+        st.button("⏮️", key=f"{row_key}_first", on_click=move, kwargs={'to': 1}, disabled=current <= 1)
+    with col2:
+        st.button("⬅️", key=f"{row_key}_prev", on_click=move, kwargs={'delta': -page_size}, disabled=current <= 1)
+    with col3:
+        st.number_input(
+            "Từ dòng:", min_value=1, max_value=max(total_rows, 1), step=page_size, key=row_key
+        )
+        st.caption(f"Trang {(current - 1) // page_size + 1:,} / {max(1, (total_rows + page_size - 1) // page_size):,}")
+    with col4:
+        st.button("➡️", key=f"{row_key}_next", on_click=move, kwargs={'delta': page_size}, disabled=current >= last_start)
+    with col5:
+        st.button("⏭️", key=f"{row_key}_last", on_click=move, kwargs={'to': last_start}, disabled=current >= last_start)
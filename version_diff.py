@@ -0,0 +1,161 @@
+import os
+import polars as pl
+from typing import Dict, List, Optional, Tuple
+
+from day_cache import DayCache
+
+# Các cột được so sánh giữa file gốc và file _2 (chỉ đọc các cột này)
+DIFF_STATUS_COLUMNS = ['RECONCILE_STATUS', 'INSURANCE_STATUS']
+DIFF_AMOUNT_COLUMNS = ['TOTAL_AMOUNT', 'AMOUNT', 'GSM_AMOUNT', 'PVI_AMOUNT']
+DIFF_INFO_COLUMNS = ['MERCHANT', 'SERVICE_TYPE']
+
+class VersionDiff:
+    """
+    So sánh file gốc và file _2 của cùng một ngày: hash join theo ORDER_ID trên các cột cần thiết.
+    Kết quả (chi tiết các đơn thay đổi + bảng tổng hợp) được lưu cùng các artifact khác trong DayCache.
+    """
+
+    def __init__(self, reader, file_type: str = 'reconciled'):
+        self.reader = reader
+        self.file_type = file_type
+
+    def get_version_files(self, date_str: str) -> Optional[Tuple[str, str]]:
+        """(file gốc, file _2) của ngày, None nếu ngày không có đủ hai file"""
+        base_name = self.reader.file_types.get(self.file_type, 'pvi_transaction_reconciled_')
+        folder = self.reader.get_day_folder(date_str)
+        original = os.path.join(folder, f"{base_name}{date_str}.csv")
+        version_2 = os.path.join(folder, f"{base_name}{date_str}_2.csv")
+
+        if os.path.exists(original) and os.path.exists(version_2):
+            return original, version_2
+        return None
+
+    def _scan_projected(self, file_path: str, columns: List[str]) -> pl.LazyFrame:
+        """Scan chỉ các cột cần so sánh, mỗi ORDER_ID một dòng (lấy dòng cuối)"""
+        return (
+            self.reader.scan_csv_polars(file_path)
+            .select([pl.col('ORDER_ID').cast(pl.Utf8)] + [pl.col(col) for col in columns])
+            .filter(pl.col('ORDER_ID').is_not_null())
+            .unique(subset=['ORDER_ID'], keep='last')
+        )
+
+    def compute_diff(self, original: str, version_2: str) -> Tuple[pl.DataFrame, pl.DataFrame]:
+        """
+        Trả về (details, summary):
+        - details: các đơn added / removed / status_changed / amount_changed với giá trị trước/sau
+        - summary: một dòng gồm số dòng mỗi file, số đơn theo từng loại thay đổi và tổng chênh lệch amount
+        """
+        columns_v1 = self.reader.scan_csv_polars(original).columns
+        columns_v2 = self.reader.scan_csv_polars(version_2).columns
+        shared = [col for col in columns_v1 if col in columns_v2 and col != 'ORDER_ID']
+        status_cols = [col for col in DIFF_STATUS_COLUMNS if col in shared]
+        amount_cols = [col for col in DIFF_AMOUNT_COLUMNS if col in shared]
+        info_cols = [col for col in DIFF_INFO_COLUMNS if col in shared]
+        projected = status_cols + amount_cols + info_cols
+
+        v1 = self._scan_projected(original, projected).with_columns([
+            pl.col(col).cast(pl.Float64) for col in amount_cols
+        ])
+        v2 = self._scan_projected(version_2, projected).with_columns([
+            pl.col(col).cast(pl.Float64) for col in amount_cols
+        ])
+
+        joined = v1.with_columns(pl.lit(True).alias('_in_v1')).join(
+            v2.with_columns(pl.lit(True).alias('_in_v2')),
+            on='ORDER_ID', how='outer_coalesce', suffix='_2'
+        )
+
+        in_v1 = pl.col('_in_v1').fill_null(False)
+        in_v2 = pl.col('_in_v2').fill_null(False)
+        status_changed = pl.any_horizontal([pl.col(col).ne_missing(pl.col(f"{col}_2")) for col in status_cols]) \
+            if status_cols else pl.lit(False)
+        amount_changed = pl.any_horizontal([pl.col(col).ne_missing(pl.col(f"{col}_2")) for col in amount_cols]) \
+            if amount_cols else pl.lit(False)
+
+        change_type = (
+            pl.when(in_v1 & ~in_v2).then(pl.lit('removed'))
+            .when(~in_v1 & in_v2).then(pl.lit('added'))
+            .when(status_changed).then(pl.lit('status_changed'))
+            .when(amount_changed).then(pl.lit('amount_changed'))
+            .otherwise(pl.lit('unchanged'))
+            .alias('change_type')
+        )
+
+        classified = joined.with_columns([change_type] + [
+            (pl.col(f"{col}_2").fill_null(0) - pl.col(col).fill_null(0)).alias(f"{col}_delta")
+            for col in amount_cols
+        ])
+
+        details_query = (
+            classified.filter(pl.col('change_type') != 'unchanged')
+            .select(
+                ['ORDER_ID', 'change_type'] +
+                [pl.coalesce([pl.col(f"{col}_2"), pl.col(col)]).alias(col) for col in info_cols] +
+                [name for col in status_cols for name in (col, f"{col}_2")] +
+                [name for col in amount_cols for name in (col, f"{col}_2", f"{col}_delta")]
+            )
+            .sort(['change_type', 'ORDER_ID'])
+        )
+        summary_query = classified.select(
+            [
+                in_v1.sum().alias('rows_original'),
+                in_v2.sum().alias('rows_version_2')
+            ] + [
+                (pl.col('change_type') == kind).sum().alias(kind)
+                for kind in ['added', 'removed', 'status_changed', 'amount_changed', 'unchanged']
+            ] + [
+                pl.col(f"{col}_delta").sum().alias(f"{col}_delta") for col in amount_cols
+            ]
+        )
+
+        details, summary = pl.collect_all([details_query, summary_query])
+        return details, summary
+
+    def get_diff(self, date_str: str) -> Optional[Dict]:
+        """
+        Diff của ngày (tính một lần, sau đó đọc từ DayCache).
+        Trả về {'details', 'summary', 'status_changes'} hoặc None nếu ngày không có file _2.
+        """
+        files = self.get_version_files(date_str)
+        if files is None:
+            return None
+
+        original, version_2 = files
+        cache = self.reader.get_day_cache()
+        # Fingerprint của ngày theo file được ưu tiên (_2); tên artifact gắn fingerprint file gốc
+        fingerprint = cache.file_fingerprint(version_2)
+        suffix = DayCache.file_fingerprint(original)[:8]
+        details_name = f"version_diff_{self.file_type}_{suffix}"
+        summary_name = f"version_diff_summary_{self.file_type}_{suffix}"
+
+        details = cache.load_frame(date_str, details_name, fingerprint)
+        summary = cache.load_frame(date_str, summary_name, fingerprint)
+        if details is None or summary is None:
+            try:
+                details, summary = self.compute_diff(original, version_2)
+            except Exception as e:
+                print(f"Error diffing {original} vs {version_2}: {e}")
+                return None
+            cache.save_frames(date_str, fingerprint, {details_name: details, summary_name: summary})
+
+        return {
+            'details': details,
+            'summary': summary.to_dicts()[0] if not summary.is_empty() else {},
+            'status_changes': self.status_changes(details)
+        }
+
+    @staticmethod
+    def status_changes(details: pl.DataFrame, status_col: str = 'RECONCILE_STATUS') -> pl.DataFrame:
+        """Số đơn đổi trạng thái theo cặp (trước, sau)"""
+        if details.is_empty() or f"{status_col}_2" not in details.columns:
+            return pl.DataFrame()
+
+        return (
+            details.filter(pl.col('change_type') == 'status_changed')
+            .group_by([
+                pl.col(status_col).alias('from_status'),
+                pl.col(f"{status_col}_2").alias('to_status')
+            ])
+            .agg(pl.count().alias('count'))
+            .sort('count', descending=True)
+        )